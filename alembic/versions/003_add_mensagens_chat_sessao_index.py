@@ -0,0 +1,21 @@
+"""add composite index (sessao_id, id) on mensagens_chat
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Keyset pagination do histórico: WHERE sessao_id = ? AND id < ? ORDER BY id DESC
+    op.create_index('ix_mensagens_chat_sessao_id_id', 'mensagens_chat', ['sessao_id', 'id'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_mensagens_chat_sessao_id_id', table_name='mensagens_chat')
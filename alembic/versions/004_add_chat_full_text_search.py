@@ -0,0 +1,23 @@
+"""add full-text search over mensagens_chat (FTS5 on SQLite, GIN on PostgreSQL)
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+from app.chat_search import create_search_index, drop_search_index
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # rebuild indexa as mensagens já existentes; novas entram pelos triggers
+    create_search_index(op.get_bind(), rebuild=True)
+
+def downgrade():
+    drop_search_index(op.get_bind())
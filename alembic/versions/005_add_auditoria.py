@@ -0,0 +1,37 @@
+"""add auditoria table
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'auditoria',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), nullable=True),
+        sa.Column('sessao_id', sa.Integer(), nullable=True),
+        sa.Column('acao', sa.String(length=64), nullable=False),
+        sa.Column('detalhes', sa.Text(), nullable=True),
+    )
+    op.create_index('ix_auditoria_criado_em', 'auditoria', ['criado_em'], unique=False)
+    op.create_index('ix_auditoria_usuario_id_id', 'auditoria', ['usuario_id', 'id'], unique=False)
+    op.create_index('ix_auditoria_sessao_id_id', 'auditoria', ['sessao_id', 'id'], unique=False)
+    op.create_index('ix_auditoria_acao_id', 'auditoria', ['acao', 'id'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_auditoria_acao_id', table_name='auditoria')
+    op.drop_index('ix_auditoria_sessao_id_id', table_name='auditoria')
+    op.drop_index('ix_auditoria_usuario_id_id', table_name='auditoria')
+    op.drop_index('ix_auditoria_criado_em', table_name='auditoria')
+    op.drop_table('auditoria')
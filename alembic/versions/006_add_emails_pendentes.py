@@ -0,0 +1,35 @@
+"""add emails_pendentes outbound queue
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'emails_pendentes',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('destinatario', sa.String(length=255), nullable=False),
+        sa.Column('assunto', sa.String(length=255), nullable=False),
+        sa.Column('corpo', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='pendente'),
+        sa.Column('tentativas', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('proxima_tentativa', sa.DateTime(), nullable=False),
+        sa.Column('ultimo_erro', sa.Text(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=True),
+        sa.Column('enviado_em', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_emails_pendentes_status_proxima', 'emails_pendentes', ['status', 'proxima_tentativa'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_emails_pendentes_status_proxima', table_name='emails_pendentes')
+    op.drop_table('emails_pendentes')
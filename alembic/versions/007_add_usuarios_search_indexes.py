@@ -0,0 +1,36 @@
+"""add indexes for /admin/usuarios filters and prefix search
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+def _lower(column):
+    # text_pattern_ops: LIKE 'abc%' usa o índice no PostgreSQL com qualquer collation
+    if op.get_bind().dialect.name == 'postgresql':
+        return sa.text(f'lower({column}) text_pattern_ops')
+    return sa.text(f'lower({column})')
+
+def upgrade():
+    op.create_index('ix_usuarios_email_lower', 'usuarios', [_lower('email')], unique=False)
+    op.create_index('ix_usuarios_nome_lower', 'usuarios', [_lower('nome')], unique=False)
+    op.create_index('ix_usuarios_cnpj', 'usuarios', ['cnpj'], unique=False,
+                    postgresql_ops={'cnpj': 'text_pattern_ops'})
+    op.create_index('ix_usuarios_tipo_usuario_id', 'usuarios', ['tipo_usuario', 'id'], unique=False)
+    op.create_index('ix_usuarios_empresa_id', 'usuarios', ['empresa', 'id'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_usuarios_empresa_id', table_name='usuarios')
+    op.drop_index('ix_usuarios_tipo_usuario_id', table_name='usuarios')
+    op.drop_index('ix_usuarios_cnpj', table_name='usuarios')
+    op.drop_index('ix_usuarios_nome_lower', table_name='usuarios')
+    op.drop_index('ix_usuarios_email_lower', table_name='usuarios')
@@ -0,0 +1,39 @@
+"""add estatisticas_sessoes daily rollups
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'estatisticas_sessoes',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('analista_id', sa.Integer(), sa.ForeignKey('usuarios.id'), nullable=False),
+        sa.Column('empresa', sa.String(length=200), nullable=False, server_default=''),
+        sa.Column('sessoes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('duracao_total_segundos', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('duracao_max_segundos', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('histograma_duracao', sa.Text(), nullable=False),
+        sa.Column('trafego_bytes', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('mensagens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('dia', 'analista_id', 'empresa', name='uq_estatisticas_sessoes_grupo'),
+    )
+    op.create_index('ix_estatisticas_sessoes_analista_dia', 'estatisticas_sessoes', ['analista_id', 'dia'], unique=False)
+    op.create_index('ix_sessoes_remotas_inicio', 'sessoes_remotas', ['inicio'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_sessoes_remotas_inicio', table_name='sessoes_remotas')
+    op.drop_index('ix_estatisticas_sessoes_analista_dia', table_name='estatisticas_sessoes')
+    op.drop_table('estatisticas_sessoes')
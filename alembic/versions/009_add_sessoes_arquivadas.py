@@ -0,0 +1,38 @@
+"""add sessoes_arquivadas for archived sessions
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'sessoes_arquivadas',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('analista_id', sa.Integer(), nullable=False),
+        sa.Column('cliente_id', sa.Integer(), nullable=False),
+        sa.Column('codigo_acesso', sa.String(length=10), nullable=False),
+        sa.Column('maquina_cliente', sa.String(length=255), nullable=True),
+        sa.Column('inicio', sa.DateTime(), nullable=True),
+        sa.Column('termino', sa.DateTime(), nullable=True),
+        sa.Column('trafego_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('mensagens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('segmento', sa.String(length=255), nullable=False),
+        sa.Column('arquivada_em', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_sessoes_arquivadas_analista_id', 'sessoes_arquivadas', ['analista_id', 'id'], unique=False)
+    op.create_index('ix_sessoes_arquivadas_cliente_id', 'sessoes_arquivadas', ['cliente_id', 'id'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_sessoes_arquivadas_cliente_id', table_name='sessoes_arquivadas')
+    op.drop_index('ix_sessoes_arquivadas_analista_id', table_name='sessoes_arquivadas')
+    op.drop_table('sessoes_arquivadas')
@@ -0,0 +1,30 @@
+"""add conexoes_sessoes for cross-worker session liveness
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'conexoes_sessoes',
+        sa.Column('worker_id', sa.String(length=64), primary_key=True),
+        sa.Column('sessao_id', sa.Integer(), primary_key=True),
+        sa.Column('conexoes', sa.Integer(), nullable=False),
+        sa.Column('ultima_atividade', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat_em', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_conexoes_sessoes_sessao_id', 'conexoes_sessoes', ['sessao_id', 'heartbeat_em'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_conexoes_sessoes_sessao_id', table_name='conexoes_sessoes')
+    op.drop_table('conexoes_sessoes')
@@ -0,0 +1,38 @@
+"""add codigos_acesso and permissoes_sessao so workers share access codes and grants
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'codigos_acesso',
+        sa.Column('codigo', sa.String(length=10), primary_key=True),
+        sa.Column('cliente_id', sa.Integer(), nullable=False),
+        sa.Column('expira_em', sa.DateTime(), nullable=False),
+        sa.Column('usado', sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.create_index('ix_codigos_acesso_expira_em', 'codigos_acesso', ['expira_em'], unique=False)
+    op.create_index('ix_codigos_acesso_cliente_id', 'codigos_acesso', ['cliente_id'], unique=False)
+    op.create_table(
+        'permissoes_sessao',
+        sa.Column('sessao_id', sa.Integer(), primary_key=True),
+        sa.Column('usuario_id', sa.Integer(), primary_key=True),
+        sa.Column('permissao', sa.String(length=32), primary_key=True),
+    )
+
+def downgrade():
+    op.drop_table('permissoes_sessao')
+    op.drop_index('ix_codigos_acesso_cliente_id', table_name='codigos_acesso')
+    op.drop_index('ix_codigos_acesso_expira_em', table_name='codigos_acesso')
+    op.drop_table('codigos_acesso')
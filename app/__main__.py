@@ -0,0 +1,7 @@
+"""python -m app: launcher de produção (ver app/server.py)"""
+import sys
+
+from .server import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,66 +1,63 @@
 import random
 import string
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Optional
 
-# Storage em memória para códigos temporários
-# Em produção, considere usar Redis ou banco de dados
-access_codes_storage: Dict[str, dict] = {}
+from sqlalchemy.orm import Session
+
+from .metrics import ACCESS_CODES_STORED
+from .models import CodigoAcessoTemporario
+
+# Códigos no banco (tabela codigos_acesso): o cliente gera num worker e o analista
+# pode usar em outro
 
 def generate_access_code() -> str:
     """Gera código alfanumérico de 10 caracteres"""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
 
-def create_temporary_code(cliente_id: int) -> dict:
+def create_temporary_code(db: Session, cliente_id: int) -> dict:
     """Cria código temporário para cliente"""
     codigo = generate_access_code()
     expira_em = datetime.utcnow() + timedelta(minutes=10)
-    
+
     # Remove códigos expirados do cliente
-    remove_expired_codes_for_user(cliente_id)
-    
-    access_codes_storage[codigo] = {
-        "cliente_id": cliente_id,
-        "expira_em": expira_em,
-        "usado": False
-    }
-    
+    remove_expired_codes_for_user(db, cliente_id)
+
+    db.add(CodigoAcessoTemporario(codigo=codigo, cliente_id=cliente_id, expira_em=expira_em, usado=False))
+    db.commit()
+
     return {
         "codigo": codigo,
         "expira_em": expira_em
     }
 
-def validate_access_code(codigo: str) -> Optional[int]:
-    """Valida código de acesso e retorna cliente_id se válido"""
-    if codigo not in access_codes_storage:
-        return None
-    
-    code_data = access_codes_storage[codigo]
-    
-    # Verifica se não expirou
-    if datetime.utcnow() > code_data["expira_em"]:
-        del access_codes_storage[codigo]
-        return None
-    
-    # Verifica se não foi usado
-    if code_data["usado"]:
-        return None
-    
-    return code_data["cliente_id"]
+def claim_access_code(db: Session, codigo: str) -> Optional[int]:
+    """Marca código válido como usado e retorna cliente_id; None se inválido, expirado ou já usado
 
-def mark_code_as_used(codigo: str):
-    """Marca código como usado"""
-    if codigo in access_codes_storage:
-        access_codes_storage[codigo]["usado"] = True
+    Um único UPDATE condicional: dois analistas (em workers diferentes) com o mesmo código
+    não iniciam duas sessões. Efetivado no commit da transação corrente, junto com a sessão.
+    """
+    marcados = db.query(CodigoAcessoTemporario).filter(
+        CodigoAcessoTemporario.codigo == codigo,
+        CodigoAcessoTemporario.usado.is_(False),
+        CodigoAcessoTemporario.expira_em >= datetime.utcnow()
+    ).update({CodigoAcessoTemporario.usado: True}, synchronize_session=False)
+    if not marcados:
+        return None
+    return db.query(CodigoAcessoTemporario.cliente_id).filter(CodigoAcessoTemporario.codigo == codigo).scalar()
 
-def remove_expired_codes_for_user(cliente_id: int):
+def remove_expired_codes_for_user(db: Session, cliente_id: int):
     """Remove códigos expirados de um usuário específico"""
-    current_time = datetime.utcnow()
-    codes_to_remove = []
-    
-    for codigo, data in access_codes_storage.items():
-        if data["cliente_id"] == cliente_id and current_time > data["expira_em"]:
-            codes_to_remove.append(codigo)
-    
-    for codigo in codes_to_remove:
-        del access_codes_storage[codigo]
\ No newline at end of file
+    db.query(CodigoAcessoTemporario).filter(
+        CodigoAcessoTemporario.cliente_id == cliente_id,
+        CodigoAcessoTemporario.expira_em < datetime.utcnow()
+    ).delete(synchronize_session=False)
+
+def purge_expired_codes(db: Session) -> int:
+    """Remove todos os códigos expirados (varredura periódica)"""
+    removidos = db.query(CodigoAcessoTemporario).filter(
+        CodigoAcessoTemporario.expira_em < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    ACCESS_CODES_STORED.set(db.query(CodigoAcessoTemporario).count())
+    return removidos
@@ -0,0 +1,201 @@
+"""
+Estatísticas de sessões pré-agregadas por dia, analista e empresa do cliente.
+
+Cada grupo é recalculado a partir das sessões encerradas (idempotente): ao encerrar uma
+sessão só o grupo dela, e pela tarefa de manutenção os últimos dias inteiros (o tráfego
+é gravado em lote e pode chegar depois do encerramento).
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import os
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from .database import SessionLocal
+from .models import EstatisticaSessao, MensagemChat, SessaoRemota, Usuario
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CATCHUP_DAYS = int(os.getenv("ANALYTICS_CATCHUP_DAYS", "2"))
+
+# Limites superiores (segundos) das faixas do histograma de duração; a última é aberta
+DURATION_BUCKETS = (30, 60, 120, 300, 600, 900, 1200, 1800, 2700, 3600, 5400, 7200, 10800, 14400, 28800)
+
+def _bucket(segundos: float) -> int:
+    for i, limite in enumerate(DURATION_BUCKETS):
+        if segundos <= limite:
+            return i
+    return len(DURATION_BUCKETS)
+
+def percentile(histograma: List[int], q: float, maximo: float) -> Optional[float]:
+    """Percentil aproximado pelo limite superior da faixa (nunca acima do máximo observado)"""
+    total = sum(histograma)
+    if not total:
+        return None
+    alvo = q * total
+    acumulado = 0
+    for i, contagem in enumerate(histograma):
+        acumulado += contagem
+        if acumulado >= alvo:
+            return min(DURATION_BUCKETS[i], maximo) if i < len(DURATION_BUCKETS) else maximo
+    return maximo
+
+def _empty_group() -> dict:
+    return {
+        "sessoes": 0, "duracao_total_segundos": 0.0, "duracao_max_segundos": 0.0,
+        "histograma": [0] * (len(DURATION_BUCKETS) + 1), "trafego_bytes": 0, "mensagens": 0
+    }
+
+def _day_bounds(inicio: date, fim: date) -> Tuple[datetime, datetime]:
+    return datetime.combine(inicio, time.min), datetime.combine(fim + timedelta(days=1), time.min)
+
+def recompute(db: Session, inicio: date, fim: date, analista_id: Optional[int] = None,
+              empresa: Optional[str] = None) -> int:
+    """Recalcular os grupos de [inicio, fim] (opcionalmente só um analista/empresa); retorna grupos gravados"""
+    Cliente = aliased(Usuario)
+    # Subconsulta correlacionada: usa o índice (sessao_id, id) só para as sessões do intervalo
+    mensagens = (
+        db.query(func.count(MensagemChat.id))
+        .filter(MensagemChat.sessao_id == SessaoRemota.id)
+        .correlate(SessaoRemota)
+        .scalar_subquery()
+    )
+    desde, ate = _day_bounds(inicio, fim)
+    query = (
+        db.query(
+            SessaoRemota.inicio, SessaoRemota.termino, SessaoRemota.analista_id,
+            func.coalesce(Cliente.empresa, ""), func.coalesce(SessaoRemota.trafego_bytes, 0),
+            mensagens
+        )
+        .join(Cliente, SessaoRemota.cliente_id == Cliente.id)
+        .filter(SessaoRemota.inicio >= desde, SessaoRemota.inicio < ate, SessaoRemota.termino.isnot(None))
+    )
+    existentes = db.query(EstatisticaSessao).filter(EstatisticaSessao.dia >= inicio, EstatisticaSessao.dia <= fim)
+    if analista_id is not None:
+        query = query.filter(SessaoRemota.analista_id == analista_id)
+        existentes = existentes.filter(EstatisticaSessao.analista_id == analista_id)
+    if empresa is not None:
+        query = query.filter(func.coalesce(Cliente.empresa, "") == empresa)
+        existentes = existentes.filter(EstatisticaSessao.empresa == empresa)
+
+    grupos: Dict[tuple, dict] = defaultdict(_empty_group)
+    for sessao_inicio, termino, analista, empresa_cliente, trafego, total_mensagens in query:
+        duracao = max((termino - sessao_inicio).total_seconds(), 0.0)
+        grupo = grupos[(sessao_inicio.date(), analista, empresa_cliente)]
+        grupo["sessoes"] += 1
+        grupo["duracao_total_segundos"] += duracao
+        grupo["duracao_max_segundos"] = max(grupo["duracao_max_segundos"], duracao)
+        grupo["histograma"][_bucket(duracao)] += 1
+        grupo["trafego_bytes"] += trafego
+        grupo["mensagens"] += total_mensagens
+
+    # Substituir o intervalo inteiro na mesma transação: recalcular é idempotente
+    existentes.delete(synchronize_session=False)
+    db.add_all([
+        EstatisticaSessao(
+            dia=dia, analista_id=analista, empresa=empresa_cliente,
+            sessoes=g["sessoes"], duracao_total_segundos=g["duracao_total_segundos"],
+            duracao_max_segundos=g["duracao_max_segundos"], histograma_duracao=json.dumps(g["histograma"]),
+            trafego_bytes=g["trafego_bytes"], mensagens=g["mensagens"]
+        )
+        for (dia, analista, empresa_cliente), g in grupos.items()
+    ])
+    db.commit()
+    return len(grupos)
+
+def recompute_session_group(sessao_id: int, session_factory=SessionLocal, attempts: int = 2):
+    """Atualizar o grupo (dia, analista, empresa) de uma sessão recém-encerrada"""
+    db = session_factory()
+    try:
+        row = (
+            db.query(SessaoRemota.inicio, SessaoRemota.analista_id, func.coalesce(Usuario.empresa, ""))
+            .join(Usuario, SessaoRemota.cliente_id == Usuario.id)
+            .filter(SessaoRemota.id == sessao_id)
+            .first()
+        )
+        if not row or not row[0]:
+            return
+        dia = row[0].date()
+        for _ in range(attempts):
+            try:
+                recompute(db, dia, dia, analista_id=row[1], empresa=row[2])
+                return
+            except IntegrityError:
+                # Outro worker recalculou o mesmo grupo ao mesmo tempo: repetir
+                db.rollback()
+        logger.warning(f"Session statistics for session {sessao_id} left to the catch-up job")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error updating session statistics for session {sessao_id}: {e}")
+    finally:
+        db.close()
+
+def catch_up(db: Session, days: int = ANALYTICS_CATCHUP_DAYS) -> int:
+    """Tarefa periódica: recalcular os últimos dias (tráfego tardio, sessões encerradas pela manutenção)"""
+    hoje = datetime.utcnow().date()
+    return recompute(db, hoje - timedelta(days=days), hoje)
+
+_pending: Set[asyncio.Task] = set()
+
+def sessions_ended(sessao_ids: Iterable[int]):
+    """Agendar a atualização das estatísticas fora do caminho da requisição"""
+    for sessao_id in sessao_ids:
+        task = asyncio.create_task(asyncio.to_thread(recompute_session_group, sessao_id))
+        # Manter referência até terminar (o event loop guarda só referências fracas)
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+
+# agrupar -> (coluna, chave na resposta)
+GROUP_COLUMNS = {
+    "dia": (EstatisticaSessao.dia, "dia"),
+    "analista": (EstatisticaSessao.analista_id, "analista_id"),
+    "empresa": (EstatisticaSessao.empresa, "empresa"),
+}
+
+def query_statistics(db: Session, inicio: date, fim: date, agrupar: str = "dia",
+                     analista_id: Optional[int] = None, empresa: Optional[str] = None) -> List[dict]:
+    """Somar os agregados do intervalo por dia, analista ou empresa"""
+    chave, nome_chave = GROUP_COLUMNS[agrupar]
+    query = db.query(
+        chave, EstatisticaSessao.sessoes, EstatisticaSessao.duracao_total_segundos,
+        EstatisticaSessao.duracao_max_segundos, EstatisticaSessao.histograma_duracao,
+        EstatisticaSessao.trafego_bytes, EstatisticaSessao.mensagens
+    ).filter(EstatisticaSessao.dia >= inicio, EstatisticaSessao.dia <= fim)
+    if analista_id is not None:
+        query = query.filter(EstatisticaSessao.analista_id == analista_id)
+    if empresa is not None:
+        query = query.filter(EstatisticaSessao.empresa == empresa)
+
+    grupos: Dict = {}
+    for valor, sessoes, duracao_total, duracao_max, histograma, trafego, mensagens in query:
+        g = grupos.setdefault(valor, _empty_group())
+        g["sessoes"] += sessoes
+        g["duracao_total_segundos"] += duracao_total
+        g["duracao_max_segundos"] = max(g["duracao_max_segundos"], duracao_max)
+        g["histograma"] = [a + b for a, b in zip(g["histograma"], json.loads(histograma))]
+        g["trafego_bytes"] += trafego
+        g["mensagens"] += mensagens
+
+    resultado = []
+    for valor in sorted(grupos, key=lambda v: (v is None, v)):
+        g = grupos[valor]
+        maximo = g["duracao_max_segundos"]
+        resultado.append({
+            nome_chave: valor.isoformat() if isinstance(valor, date) else valor,
+            "sessoes": g["sessoes"],
+            "duracao_total_segundos": g["duracao_total_segundos"],
+            "duracao_media_segundos": g["duracao_total_segundos"] / g["sessoes"] if g["sessoes"] else None,
+            "duracao_p50_segundos": percentile(g["histograma"], 0.5, maximo),
+            "duracao_p90_segundos": percentile(g["histograma"], 0.9, maximo),
+            "duracao_p99_segundos": percentile(g["histograma"], 0.99, maximo),
+            "duracao_max_segundos": maximo,
+            "trafego_bytes": g["trafego_bytes"],
+            "mensagens": g["mensagens"]
+        })
+    return resultado
@@ -0,0 +1,221 @@
+"""
+Arquivamento de sessões antigas e suas mensagens.
+
+Os metadados da sessão vão para sessoes_arquivadas (consultas por usuário continuam no
+banco); as mensagens vão para segmentos append-only em ARCHIVE_DIR: JSONL comprimido em
+blocos independentes (zstd, ou gzip sem o pacote zstandard), com um índice esparso
+(primeiro/último id de sessão, offset e tamanho de cada bloco) ao lado do segmento.
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional
+import gzip
+import json
+import logging
+import os
+import threading
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .models import MensagemChat, SessaoArquivada, SessaoRemota, Usuario
+from .session_roster import session_roster
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+# Sessões por segmento (uma execução pode gerar vários) e por bloco comprimido
+ARCHIVE_SEGMENT_SESSIONS = int(os.getenv("ARCHIVE_SEGMENT_SESSIONS", "2000"))
+# Teto por execução: um acúmulo grande é arquivado ao longo de várias execuções do job
+ARCHIVE_MAX_SESSIONS_PER_RUN = int(os.getenv("ARCHIVE_MAX_SESSIONS_PER_RUN", "20000"))
+ARCHIVE_BLOCK_SESSIONS = 64
+ARCHIVE_DELETE_CHUNK = 500
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def write_segment(name: str, transcripts: List[dict], directory: str = ARCHIVE_DIR) -> str:
+    """Gravar segmento + índice (ordenados por id de sessão); retorna o caminho do segmento"""
+    codec = "zstd" if zstandard is not None else "gzip"
+    os.makedirs(directory, exist_ok=True)
+    transcripts = sorted(transcripts, key=lambda t: t["sessao_id"])
+    path = os.path.join(directory, name + (".jsonl.zst" if codec == "zstd" else ".jsonl.gz"))
+
+    blocks = []
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for start in range(0, len(transcripts), ARCHIVE_BLOCK_SESSIONS):
+            block = transcripts[start:start + ARCHIVE_BLOCK_SESSIONS]
+            data = "".join(json.dumps(t, ensure_ascii=False) + "\n" for t in block).encode("utf-8")
+            compressed = _compress(data, codec)
+            blocks.append([block[0]["sessao_id"], block[-1]["sessao_id"], f.tell(), len(compressed)])
+            f.write(compressed)
+        f.flush()
+        os.fsync(f.fileno())
+
+    index_tmp = path + ".idx.tmp"
+    with open(index_tmp, "w", encoding="utf-8") as f:
+        json.dump({"codec": codec, "blocks": blocks}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    # Índice primeiro: um segmento visível sempre tem índice
+    os.replace(index_tmp, path + ".idx")
+    os.replace(tmp_path, path)
+    return path
+
+class ArchiveReader:
+    """Leitura de transcrições arquivadas: índice em cache, um bloco descomprimido por leitura"""
+
+    def __init__(self, directory: str = ARCHIVE_DIR, max_indexes: int = 256):
+        self.directory = directory
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, segment: str) -> dict:
+        with self._lock:
+            index = self._indexes.get(segment)
+            if index is not None:
+                self._indexes.move_to_end(segment)
+                return index
+        with open(os.path.join(self.directory, segment) + ".idx", encoding="utf-8") as f:
+            index = json.load(f)
+        index["first_ids"] = [block[0] for block in index["blocks"]]
+        with self._lock:
+            self._indexes[segment] = index
+            if len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
+
+    def transcript(self, segment: str, sessao_id: int) -> Optional[dict]:
+        index = self._index(segment)
+        pos = bisect_right(index["first_ids"], sessao_id) - 1
+        if pos < 0:
+            return None
+        first_id, last_id, offset, length = index["blocks"][pos]
+        if sessao_id > last_id:
+            return None
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            data = _decompress(f.read(length), index["codec"])
+        for line in data.decode("utf-8").splitlines():
+            transcript = json.loads(line)
+            if transcript["sessao_id"] == sessao_id:
+                return transcript
+        return None
+
+archive_reader = ArchiveReader()
+
+def _delete_hot(db: Session, ids: List[int]):
+    """Apagar das tabelas quentes em lotes curtos (sem locks longos)"""
+    for start in range(0, len(ids), ARCHIVE_DELETE_CHUNK):
+        chunk = ids[start:start + ARCHIVE_DELETE_CHUNK]
+        db.query(MensagemChat).filter(MensagemChat.sessao_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(SessaoRemota).filter(SessaoRemota.id.in_(chunk)).delete(synchronize_session=False)
+        db.commit()
+    # Roster em cache apontaria o histórico para a tabela quente, agora vazia
+    for sessao_id in ids:
+        session_roster.invalidate(sessao_id)
+
+def archive_sessions(db: Session, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                     segment_sessions: int = ARCHIVE_SEGMENT_SESSIONS, directory: str = ARCHIVE_DIR,
+                     max_sessions: int = ARCHIVE_MAX_SESSIONS_PER_RUN) -> int:
+    """Mover sessões encerradas há mais de older_than_days para o arquivo; retorna quantas
+
+    Um segmento a cada segment_sessions sessões, no máximo max_sessions por execução. O chat
+    não grava em sessões encerradas (chat_history.insert_message), então nada chega entre a
+    leitura das mensagens e a remoção das tabelas quentes.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    # Execução anterior interrompida depois de arquivar: concluir a remoção
+    pendentes = [row[0] for row in db.query(SessaoRemota.id).join(SessaoArquivada, SessaoArquivada.id == SessaoRemota.id)]
+    if pendentes:
+        _delete_hot(db, pendentes)
+    total = 0
+    while total < max_sessions:
+        sessoes = (
+            db.query(SessaoRemota)
+            .filter(SessaoRemota.termino.isnot(None), SessaoRemota.termino < cutoff)
+            .order_by(SessaoRemota.id)
+            .limit(min(segment_sessions, max_sessions - total))
+            .all()
+        )
+        if not sessoes:
+            return total
+        ids = [sessao.id for sessao in sessoes]
+
+        rows = (
+            db.query(MensagemChat.sessao_id, MensagemChat.id, MensagemChat.usuario_id, Usuario.nome,
+                     MensagemChat.mensagem, MensagemChat.timestamp)
+            .join(Usuario, Usuario.id == MensagemChat.usuario_id)
+            .filter(MensagemChat.sessao_id.in_(ids))
+            .order_by(MensagemChat.sessao_id, MensagemChat.id)
+            .all()
+        )
+        mensagens: Dict[int, List[dict]] = {
+            sessao_id: [
+                {
+                    "id": row.id,
+                    "usuario_id": row.usuario_id,
+                    "usuario_nome": row.nome,
+                    "mensagem": row.mensagem,
+                    "timestamp": row.timestamp.isoformat() if row.timestamp else None
+                }
+                for row in grupo
+            ]
+            for sessao_id, grupo in groupby(rows, key=lambda row: row.sessao_id)
+        }
+
+        segment_name = f"sessoes-{ids[0]:010d}-{ids[-1]:010d}-{datetime.utcnow():%Y%m%d%H%M%S}"
+        path = write_segment(segment_name, [
+            {"sessao_id": sessao_id, "mensagens": mensagens.get(sessao_id, [])} for sessao_id in ids
+        ], directory)
+        segment = os.path.basename(path)
+
+        # Segmento já está em disco: só agora mover os metadados e apagar das tabelas quentes
+        db.execute(insert(SessaoArquivada), [
+            {
+                "id": sessao.id, "analista_id": sessao.analista_id, "cliente_id": sessao.cliente_id,
+                "codigo_acesso": sessao.codigo_acesso, "maquina_cliente": sessao.maquina_cliente,
+                "inicio": sessao.inicio, "termino": sessao.termino, "trafego_bytes": sessao.trafego_bytes,
+                "mensagens": len(mensagens.get(sessao.id, [])), "segmento": segment,
+                "arquivada_em": datetime.utcnow()
+            }
+            for sessao in sessoes
+        ])
+        db.commit()
+        db.expunge_all()
+        _delete_hot(db, ids)
+        total += len(ids)
+        logger.info(f"Archived {len(ids)} sessions into {segment}")
+    return total
+
+def archived_session(db: Session, sessao_id: int) -> Optional[SessaoArquivada]:
+    return db.query(SessaoArquivada).filter(SessaoArquivada.id == sessao_id).first()
+
+def fetch_archived_messages(sessao: SessaoArquivada, before: Optional[int] = None,
+                            after: Optional[int] = None, limit: int = 50,
+                            reader: Optional[ArchiveReader] = None) -> List[dict]:
+    """Mesmo contrato de chat_history.fetch_messages, lendo do segmento"""
+    transcript = (reader or archive_reader).transcript(sessao.segmento, sessao.id)
+    mensagens = transcript["mensagens"] if transcript else []
+    if after is not None:
+        return [m for m in mensagens if m["id"] > after][:limit]
+    if before is not None:
+        mensagens = [m for m in mensagens if m["id"] < before]
+    return mensagens[-limit:]
@@ -1,27 +1,226 @@
-from fastapi import Request
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from datetime import datetime
+import asyncio
 import json
+import logging
+import os
+import shutil
+import threading
+
+from .database import SessionLocal
+from .models import Auditoria
+
+logger = logging.getLogger("audit")
+
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "2"))
+AUDIT_SPILL_PATH = os.getenv("AUDIT_SPILL_PATH", os.path.join("logs", "audit_spill.jsonl"))
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "365"))
+
+class AuditWriter:
+    """Buffer em memória gravado em lote; excedente e falhas vão para um arquivo de spill"""
+
+    def __init__(self, session_factory=SessionLocal, buffer_size: int = AUDIT_BUFFER_SIZE,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+                 spill_path: str = AUDIT_SPILL_PATH):
+        self.session_factory = session_factory
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.buffer: deque = deque()
+        # Excedente do buffer cheio: add() só enfileira, a thread de escrita leva para o disco
+        self._overflow: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # _run e flush_pending podem gravar/reprocessar o spill ao mesmo tempo (threads
+        # diferentes): todo acesso aos arquivos passa por este lock (reentrante: o replay
+        # com falha devolve os eventos ao spill)
+        self._file_lock = threading.RLock()
+
+    @property
+    def _replay_path(self) -> str:
+        return self.spill_path + ".replay"
+
+    def add(self, event: dict):
+        """Enfileirar evento (chamado no event loop; não bloqueia)"""
+        if len(self.buffer) >= self.buffer_size:
+            # Banco lento: não descartar nem fazer I/O aqui; a thread de escrita grava em disco
+            self._overflow.append(event)
+            if self._wakeup is not None:
+                self._wakeup.set()
+            return
+        self.buffer.append(event)
+        if self._wakeup is not None and len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _take_batch(self) -> List[dict]:
+        batch = list(self.buffer)
+        self.buffer.clear()
+        return batch
+
+    def _spill(self, events: List[dict]):
+        with self._file_lock:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps(event, default=str) + "\n")
+
+    def _spill_overflow(self):
+        """Levar para o disco o excedente acumulado por add() (na thread de escrita)"""
+        events = []
+        while True:
+            try:
+                events.append(self._overflow.popleft())
+            except IndexError:
+                break
+        if events:
+            self._spill(events)
+
+    def _insert(self, db: Session, events: List[dict]):
+        for start in range(0, len(events), self.batch_size):
+            db.execute(insert(Auditoria), events[start:start + self.batch_size])
+
+    def _read_replay(self, replay_path: str) -> List[dict]:
+        """Eventos do arquivo; linhas corrompidas (ex.: escrita interrompida) vão para .bad"""
+        events, bad = [], []
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                    event["criado_em"] = datetime.fromisoformat(event["criado_em"])
+                except (ValueError, KeyError, TypeError):
+                    bad.append(line if line.endswith("\n") else line + "\n")
+                    continue
+                events.append(event)
+        if bad:
+            logger.warning(f"Skipping {len(bad)} corrupt audit spill lines, moved to {self.spill_path}.bad")
+            with open(self.spill_path + ".bad", "a", encoding="utf-8") as f:
+                f.writelines(bad)
+        return events
+
+    def _replay_spill(self, db: Session):
+        """Reinserir eventos que foram para o disco enquanto o banco estava indisponível"""
+        with self._file_lock:
+            self._replay_spill_locked(db)
+
+    def _replay_spill_locked(self, db: Session):
+        replay_path = self._replay_path
+        if os.path.exists(self.spill_path):
+            if os.path.exists(replay_path):
+                # Sobra de um replay interrompido: juntar em vez de sobrescrever
+                with open(self.spill_path, "rb") as src, open(replay_path, "ab") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.spill_path)
+            else:
+                os.replace(self.spill_path, replay_path)
+        if not os.path.exists(replay_path):
+            return
+        events = self._read_replay(replay_path)
+        try:
+            self._insert(db, events)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._spill(events)
+            raise
+        finally:
+            os.remove(replay_path)
+
+    def _write(self, events: List[dict]) -> int:
+        self._spill_overflow()
+        db = self.session_factory()
+        try:
+            if events:
+                try:
+                    self._insert(db, events)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error writing audit batch, spilling to disk: {e}")
+                    self._spill(events)
+                    return 0
+            try:
+                self._replay_spill(db)
+            except Exception as e:
+                logger.error(f"Error replaying audit spill file: {e}")
+            return len(events)
+        finally:
+            db.close()
+
+    def flush(self) -> int:
+        return self._write(self._take_batch())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            batch = self._take_batch()
+            if batch or self._overflow or os.path.exists(self.spill_path) or os.path.exists(self._replay_path):
+                await asyncio.to_thread(self._write, batch)
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def flush_pending(self) -> int:
+        """Gravar agora o que está no buffer (troca no event loop, escrita na thread)"""
+        return await asyncio.to_thread(self._write, self._take_batch())
+
+    async def stop(self):
+        """Parar o flush periódico e gravar o que restou"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+            self._wakeup = None
+        await self.flush_pending()
+
+audit_writer = AuditWriter()
+
+def purge_old_events(db: Session, retention_days: int = AUDIT_RETENTION_DAYS, chunk_size: int = 5000) -> int:
+    """Política de retenção: apagar eventos antigos em lotes curtos (sem locks longos)"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    total = 0
+    while True:
+        ids = [row[0] for row in db.query(Auditoria.id).filter(Auditoria.criado_em < cutoff).limit(chunk_size).all()]
+        if not ids:
+            return total
+        db.query(Auditoria).filter(Auditoria.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        total += len(ids)
 
 class AuditLogger:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session = None, writer: AuditWriter = audit_writer):
         self.db = db
-    
-    def log_action(self, user_id: int, action: str, details: dict = None):
+        self.writer = writer
+
+    def log_action(self, user_id: int, action: str, details: dict = None, session_id: int = None):
         """Registrar ação para auditoria"""
-        # Em produção, salvar em tabela separada de auditoria
-        print(f"AUDIT: User {user_id} - {action} - {json.dumps(details, default=str)}")
-    
+        logger.info(action, extra={"user_id": user_id, "action": action, "details": details})
+        self.writer.add({
+            "criado_em": datetime.utcnow(),
+            "usuario_id": user_id,
+            "sessao_id": session_id,
+            "acao": action,
+            "detalhes": json.dumps(details, default=str) if details is not None else None
+        })
+
     def log_session_event(self, session_id: int, event_type: str, user_id: int, details: dict = None):
         """Registrar evento de sessão"""
-        self.log_action(user_id, f"SESSION_{event_type}", {
-            "session_id": session_id,
-            "details": details
-        })
-    
+        self.log_action(user_id, f"SESSION_{event_type}", details, session_id=session_id)
+
     def log_file_transfer(self, session_id: int, user_id: int, filename: str, action: str):
         """Registrar transferência de arquivo"""
-        self.log_action(user_id, f"FILE_{action}", {
-            "session_id": session_id,
-            "filename": filename
-        })
\ No newline at end of file
+        self.log_action(user_id, f"FILE_{action}", {"filename": filename}, session_id=session_id)
+
+audit_logger = AuditLogger()
@@ -5,7 +5,9 @@ from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from .models import Usuario
 from .schemas import TokenData
+from .metrics import BCRYPT_HASH_SECONDS, BCRYPT_VERIFY_SECONDS
 import os
+import time
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -14,10 +16,18 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    start = time.perf_counter()
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    finally:
+        BCRYPT_VERIFY_SECONDS.observe(time.perf_counter() - start)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    start = time.perf_counter()
+    try:
+        return pwd_context.hash(password)
+    finally:
+        BCRYPT_HASH_SECONDS.observe(time.perf_counter() - start)
 
 def get_user_by_email(db: Session, email: str):
     return db.query(Usuario).filter(Usuario.email == email).first()
@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import exists, insert, literal, select
+from sqlalchemy.orm import Session
+
+from .models import MensagemChat, SessaoRemota, Usuario
+
+# Limite de mensagens reenviadas ao reconectar o chat
+MAX_REPLAY_MESSAGES = 500
+
+def fetch_messages(db: Session, sessao_id: int, before: Optional[int] = None,
+                   after: Optional[int] = None, limit: int = 50) -> List[dict]:
+    """Buscar mensagens por keyset (id) usando o índice (sessao_id, id), em ordem cronológica"""
+    query = db.query(
+        MensagemChat.id,
+        MensagemChat.usuario_id,
+        Usuario.nome,
+        MensagemChat.mensagem,
+        MensagemChat.timestamp
+    ).join(Usuario, Usuario.id == MensagemChat.usuario_id).filter(MensagemChat.sessao_id == sessao_id)
+
+    if after is not None:
+        # Retomada: mensagens mais novas que a última vista
+        rows = query.filter(MensagemChat.id > after).order_by(MensagemChat.id.asc()).limit(limit).all()
+    else:
+        if before is not None:
+            query = query.filter(MensagemChat.id < before)
+        rows = query.order_by(MensagemChat.id.desc()).limit(limit).all()
+        rows.reverse()
+
+    return [
+        {
+            "id": row.id,
+            "usuario_id": row.usuario_id,
+            "usuario_nome": row.nome,
+            "mensagem": row.mensagem,
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None
+        }
+        for row in rows
+    ]
+
+def insert_message(db: Session, sessao_id: int, usuario_id: int, mensagem: str,
+                   timestamp: datetime) -> Optional[int]:
+    """Gravar mensagem só se a sessão ainda estiver aberta; retorna o id ou None
+
+    A condição vai no próprio INSERT (sem leitura antes): uma sessão encerrada pode estar
+    sendo arquivada, e uma mensagem gravada depois do segmento seria apagada sem arquivo.
+    """
+    aberta = exists().where(SessaoRemota.id == sessao_id, SessaoRemota.termino.is_(None))
+    stmt = insert(MensagemChat).from_select(
+        ["sessao_id", "usuario_id", "mensagem", "timestamp"],
+        select(literal(sessao_id), literal(usuario_id), literal(mensagem), literal(timestamp)).where(aberta)
+    ).returning(MensagemChat.id)
+    return db.execute(stmt).scalar()
@@ -0,0 +1,136 @@
+"""
+Busca textual nas mensagens do chat.
+
+SQLite: tabela virtual FTS5 (external content) mantida por triggers.
+PostgreSQL: índice GIN sobre to_tsvector(mensagem), mantido pelo próprio banco.
+Ambos são atualizados incrementalmente a cada INSERT/UPDATE/DELETE em mensagens_chat.
+"""
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import DateTime, event, text
+from sqlalchemy.orm import Session
+
+from .models import MensagemChat
+
+FTS_TABLE = "mensagens_chat_fts"
+TS_CONFIG = "portuguese"
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"mensagem, content='mensagens_chat', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"""CREATE TRIGGER IF NOT EXISTS mensagens_chat_fts_ai AFTER INSERT ON mensagens_chat BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, mensagem) VALUES (new.id, new.mensagem);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS mensagens_chat_fts_ad AFTER DELETE ON mensagens_chat BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, mensagem) VALUES ('delete', old.id, old.mensagem);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS mensagens_chat_fts_au AFTER UPDATE OF mensagem ON mensagens_chat BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, mensagem) VALUES ('delete', old.id, old.mensagem);
+        INSERT INTO {FTS_TABLE}(rowid, mensagem) VALUES (new.id, new.mensagem);
+    END""",
+]
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_mensagens_chat_fts ON mensagens_chat "
+    f"USING GIN (to_tsvector('{TS_CONFIG}', mensagem))",
+]
+
+def create_search_index(connection, rebuild: bool = False):
+    """Criar estruturas de busca do dialeto atual (idempotente)"""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for ddl in SQLITE_DDL:
+            connection.exec_driver_sql(ddl)
+        if rebuild:
+            # Indexar mensagens já existentes (migração de bancos antigos)
+            connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        for ddl in POSTGRES_DDL:
+            connection.exec_driver_sql(ddl)
+
+def drop_search_index(connection):
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for trigger in ("mensagens_chat_fts_ai", "mensagens_chat_fts_ad", "mensagens_chat_fts_au"):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif dialect == "postgresql":
+        connection.exec_driver_sql("DROP INDEX IF EXISTS ix_mensagens_chat_fts")
+
+# Manter a busca junto com a tabela em create_all/drop_all
+event.listen(MensagemChat.__table__, "after_create", lambda target, connection, **kw: create_search_index(connection))
+event.listen(MensagemChat.__table__, "before_drop", lambda target, connection, **kw: drop_search_index(connection))
+
+def _fts5_query(termos: str) -> str:
+    """Cada palavra vira um termo entre aspas: evita erros de sintaxe do FTS5 com texto livre"""
+    return " ".join('"{}"'.format(t.replace('"', '""')) for t in termos.split())
+
+def search_messages(db: Session, termos: str, analista_id: Optional[int] = None,
+                    inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+                    limit: int = 20) -> List[dict]:
+    """Buscar mensagens por relevância, com trecho destacado"""
+    params = {"limit": limit, "analista_id": analista_id, "inicio": inicio, "fim": fim}
+    filtros = ""
+    if analista_id is not None:
+        filtros += " AND s.analista_id = :analista_id"
+    if inicio is not None:
+        filtros += " AND m.timestamp >= :inicio"
+    if fim is not None:
+        filtros += " AND m.timestamp < :fim"
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        params["q"] = _fts5_query(termos)
+        sql = f"""
+            SELECT m.id, m.sessao_id, m.usuario_id, s.analista_id, m.timestamp,
+                   snippet({FTS_TABLE}, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 16) AS trecho,
+                   -bm25({FTS_TABLE}) AS relevancia
+            FROM {FTS_TABLE}
+            JOIN mensagens_chat m ON m.id = {FTS_TABLE}.rowid
+            JOIN sessoes_remotas s ON s.id = m.sessao_id
+            WHERE {FTS_TABLE} MATCH :q{filtros}
+            ORDER BY bm25({FTS_TABLE})
+            LIMIT :limit
+        """
+    elif dialect == "postgresql":
+        params["q"] = termos
+        sql = f"""
+            SELECT m.id, m.sessao_id, m.usuario_id, s.analista_id, m.timestamp,
+                   ts_headline('{TS_CONFIG}', m.mensagem, q,
+                               'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=30, MinWords=10') AS trecho,
+                   ts_rank(to_tsvector('{TS_CONFIG}', m.mensagem), q) AS relevancia
+            FROM mensagens_chat m
+            JOIN sessoes_remotas s ON s.id = m.sessao_id,
+                 plainto_tsquery('{TS_CONFIG}', :q) q
+            WHERE to_tsvector('{TS_CONFIG}', m.mensagem) @@ q{filtros}
+            ORDER BY relevancia DESC
+            LIMIT :limit
+        """
+    else:
+        # Outros bancos: varredura simples, sem ranking
+        params["q"] = f"%{termos}%"
+        sql = f"""
+            SELECT m.id, m.sessao_id, m.usuario_id, s.analista_id, m.timestamp,
+                   m.mensagem AS trecho, 0 AS relevancia
+            FROM mensagens_chat m
+            JOIN sessoes_remotas s ON s.id = m.sessao_id
+            WHERE m.mensagem LIKE :q{filtros}
+            ORDER BY m.id DESC
+            LIMIT :limit
+        """
+
+    rows = db.execute(text(sql).columns(timestamp=DateTime), params).mappings().all()
+    return [
+        {
+            "id": row["id"],
+            "sessao_id": row["sessao_id"],
+            "usuario_id": row["usuario_id"],
+            "analista_id": row["analista_id"],
+            "timestamp": row["timestamp"],
+            "trecho": row["trecho"],
+            "relevancia": row["relevancia"]
+        }
+        for row in rows
+    ]
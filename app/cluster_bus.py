@@ -0,0 +1,105 @@
+"""
+Barramento entre workers (Redis pub/sub) para o chat e a sinalização WebRTC.
+
+Os dois peers de uma sessão podem estar em workers diferentes (SO_REUSEPORT distribui as
+conexões): cada mensagem é publicada no canal e todo worker entrega aos sockets que tem.
+Sem REDIS_URL (ou com a assinatura caída) a entrega é só local, o que basta com um worker.
+"""
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import json
+import logging
+import os
+import uuid
+
+from .optional import optional_import
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_CHANNEL_PREFIX = os.getenv("CLUSTER_CHANNEL_PREFIX", "csremote:")
+CLUSTER_RECONNECT_MAX_SECONDS = float(os.getenv("CLUSTER_RECONNECT_MAX_SECONDS", "30"))
+
+Handler = Callable[[dict], Awaitable[None]]
+
+class ClusterBus:
+    def __init__(self, redis_url: Optional[str] = None):
+        self.redis_url = redis_url
+        # Identifica este worker nos eventos (ex.: ignorar o próprio aviso de substituição)
+        self.worker_id = uuid.uuid4().hex
+        self.handlers: Dict[str, Handler] = {}
+        self._client = None
+        # Só definido enquanto os canais estão assinados: publish usa o Redis apenas nesse caso
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, handler: Handler):
+        """Registrar o handler local de um canal (antes do start)"""
+        self.handlers[CLUSTER_CHANNEL_PREFIX + channel] = handler
+
+    async def start(self):
+        if not self.redis_url or self._listener:
+            return
+        aioredis = optional_import("redis.asyncio")
+        if aioredis is None:
+            logger.warning("REDIS_URL is set but the redis package is not installed, chat and signaling stay local")
+            return
+        # Id novo por processo: com APP_PRELOAD os workers herdam o objeto do supervisor
+        self.worker_id = uuid.uuid4().hex
+        self._client = aioredis.from_url(self.redis_url)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        self._redis = None
+        if self._client:
+            await self._client.close()
+            self._client = None
+
+    async def _listen(self):
+        """Entregar localmente o que qualquer worker publicou; reassinar com backoff se cair"""
+        delay = 1.0
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(*self.handlers)
+                self._redis = self._client
+                delay = 1.0
+                logger.info("Subscribed to cluster channels")
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    channel = item["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    try:
+                        await self.handlers[channel](json.loads(item["data"]))
+                    except Exception as e:
+                        logger.error(f"Error handling cluster message on {channel}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cluster subscription lost, delivering locally until it is back: {e}")
+            finally:
+                self._redis = None
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CLUSTER_RECONNECT_MAX_SECONDS)
+
+    async def publish(self, channel: str, event: dict):
+        """Distribuir para todos os workers (este incluído, pelo próprio canal)"""
+        channel = CLUSTER_CHANNEL_PREFIX + channel
+        event = {**event, "worker_id": self.worker_id}
+        if self._redis:
+            try:
+                await self._redis.publish(channel, json.dumps(event))
+                return
+            except Exception as e:
+                logger.error(f"Error publishing on {channel}, delivering locally: {e}")
+        await self.handlers[channel](event)
+
+cluster_bus = ClusterBus(os.getenv("REDIS_URL"))
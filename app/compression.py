@@ -0,0 +1,171 @@
+"""
+Compressão das respostas HTTP (brotli/gzip) com limite de tamanho e lista de tipos permitidos.
+
+WebSockets, respostas já codificadas e downloads de arquivos comprimidos passam direto.
+"""
+from typing import Dict
+import os
+import re
+import zlib
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Qualidade baixa/média: respostas dinâmicas, o custo de CPU importa mais que no build de estáticos
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+# Arquivos enviados pelo FileManager que já são comprimidos
+COMPRESSED_EXTENSIONS = (
+    ".zip", ".7z", ".rar", ".gz", ".bz2", ".xz", ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".mp4", ".pdf", ".docx", ".xlsx",
+)
+
+_FILENAME_RE = re.compile(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)', re.IGNORECASE)
+
+def parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    """{codificação: q} do header Accept-Encoding; q=0 significa "não aceito" """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name.strip():
+            continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    return accepted
+
+def accepts(accepted: Dict[str, float], encoding: str) -> bool:
+    return accepted.get(encoding, accepted.get("*", 0)) > 0
+
+def choose_encoding(accept_encoding: str):
+    """br quando disponível e aceito; senão gzip; None se o cliente não aceita nenhum"""
+    accepted = parse_accept_encoding(accept_encoding)
+    if brotli is not None and accepts(accepted, "br"):
+        return "br"
+    if accepts(accepted, "gzip"):
+        return "gzip"
+    return None
+
+def should_compress(headers, minimum_size: int = COMPRESSION_MIN_SIZE) -> bool:
+    """Decidir pelos headers da resposta (lista de tuplas em bytes)"""
+    values = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in headers}
+    if "content-encoding" in values:
+        return False
+    content_type = values.get("content-type", "").split(";")[0].strip().lower()
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return False
+    match = _FILENAME_RE.search(values.get("content-disposition", ""))
+    if match and match.group(1).lower().endswith(COMPRESSED_EXTENSIONS):
+        return False
+    content_length = values.get("content-length")
+    if content_length is not None and int(content_length) < minimum_size:
+        return False
+    return True
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits=31: formato gzip (cabeçalho + trailer)
+            self._obj = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, more_body: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._obj.process(data)
+            return out + (self._obj.flush() if more_body else self._obj.finish())
+        out = self._obj.compress(data)
+        # Em streaming, liberar o que já foi comprimido para o navegador renderizar aos poucos
+        return out + self._obj.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+class CompressionMiddleware:
+    """Middleware ASGI puro: só atua em HTTP; WebSockets passam direto"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                encoding = choose_encoding(value.decode("latin-1"))
+                break
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                if should_compress(message.get("headers", []), self.minimum_size):
+                    # Segurar o início até ver o primeiro pedaço do corpo
+                    start_message = message
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers = []
+                for name, value in start_message.get("headers", []):
+                    if name.lower() == b"content-length":
+                        continue
+                    if name.lower() == b"etag" and not value.startswith(b"W/"):
+                        # Representação comprimida não é idêntica byte a byte: ETag fraco
+                        value = b"W/" + value
+                    headers.append((name, value))
+                headers.append((b"content-encoding", encoding.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+                if not more_body:
+                    compressed = compressor.compress(body, more_body=False)
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start_message, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressed, "more_body": False})
+                    return
+                await send({**start_message, "headers": headers})
+
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, more_body=more_body),
+                "more_body": more_body
+            })
+
+        await self.app(scope, receive, send_wrapper)
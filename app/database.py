@@ -1,11 +1,21 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from .models import Base
+from pathlib import Path
+from typing import Optional
+import logging
 import os
+import re
+
 from dotenv import load_dotenv
+from sqlalchemy import Column, MetaData, String, Table, create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from .models import Base
+from . import chat_search  # noqa: F401 - registra índices de busca no create_all
+from .metrics import instrument_engine
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./csremote.db")
 
 # Configuração especial para SQLite
@@ -17,8 +27,25 @@ if DATABASE_URL.startswith("sqlite"):
 else:
     engine = create_engine(DATABASE_URL)
 
+instrument_engine(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplica de leitura opcional (ver app/replica.py); sem ela as leituras vão ao primário
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+if DATABASE_READ_URL:
+    read_engine = create_engine(
+        DATABASE_READ_URL,
+        connect_args={"check_same_thread": False} if DATABASE_READ_URL.startswith("sqlite") else {},
+        pool_pre_ping=True
+    )
+    instrument_engine(read_engine)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    read_engine = None
+    ReadSessionLocal = None
+
 def get_db():
     db = SessionLocal()
     try:
@@ -26,25 +53,55 @@ def get_db():
     finally:
         db.close()
 
-def create_tables():
-    # Cria tabelas novas (não altera colunas existentes em tabelas já criadas)
-    Base.metadata.create_all(bind=engine)
+# Migrações do Alembic: a head é lida dos arquivos, sem importar o Alembic (~300 ms)
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "alembic" / "versions"
+_REVISION_RE = re.compile(r"^(down_revision|revision)\s*=\s*['\"]([^'\"]+)['\"]", re.M)
 
-    # Ajuste simples de esquema para dev: adicionar coluna email_confirmado em usuarios se não existir
-    try:
-        from sqlalchemy import text
-        with engine.connect() as conn:
-            # If Alembic has been used (alembic_version table exists), skip runtime ALTERs
-            tbls = [r[0] for r in conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'")).fetchall()]
-            if 'alembic_version' in tbls:
-                return
-
-            # Use exec_driver_sql/text para statements driver-specific (PRAGMA/ALTER)
-            res = conn.execute(text("PRAGMA table_info(usuarios)"))
-            cols = [row[1] for row in res.fetchall()]
-            if 'email_confirmado' not in cols:
-                # ALTER TABLE is supported by SQLite to add a new column
-                conn.exec_driver_sql("ALTER TABLE usuarios ADD COLUMN email_confirmado BOOLEAN DEFAULT 0")
-    except Exception:
-        # Não bloquear inicialização em caso de erro; em produção use alembic
-        pass
\ No newline at end of file
+def migration_head() -> Optional[str]:
+    """Revisão head das migrações; None se não houver uma única head"""
+    revisions, parents = set(), set()
+    for path in MIGRATIONS_DIR.glob("*.py"):
+        for kind, revision in _REVISION_RE.findall(path.read_text(encoding="utf-8")):
+            (revisions if kind == "revision" else parents).add(revision)
+    heads = revisions - parents
+    return heads.pop() if len(heads) == 1 else None
+
+def _stamp(conn, revision: str):
+    """Equivalente a `alembic stamp`: o esquema recém-criado pelo create_all já é o da head"""
+    version = Table("alembic_version", MetaData(), Column("version_num", String(32), primary_key=True))
+    version.create(conn)
+    conn.execute(version.insert().values(version_num=revision))
+
+def create_tables(bind=None):
+    """Bootstrap do esquema; não faz nada (uma consulta) quando o Alembic já está na head"""
+    bind = bind if bind is not None else engine
+    head = migration_head()
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        if inspector.has_table("alembic_version"):
+            versions = set(conn.execute(text("SELECT version_num FROM alembic_version")).scalars())
+            if head is not None and head not in versions:
+                # Esquema gerenciado pelo Alembic: não misturar com create_all
+                logger.warning(
+                    f"Database schema at revision {', '.join(sorted(versions)) or 'none'}, "
+                    f"expected {head}; run 'alembic upgrade head'"
+                )
+            return
+
+        novo = not inspector.get_table_names()
+        # Cria tabelas novas (não altera colunas existentes em tabelas já criadas)
+        Base.metadata.create_all(bind=conn)
+        if novo and head:
+            _stamp(conn, head)
+            return
+
+        colunas = {column["name"] for column in inspector.get_columns("usuarios")}
+
+    # Banco de desenvolvimento anterior às migrações: adicionar colunas que faltam
+    if "email_confirmado" not in colunas:
+        try:
+            with bind.begin() as conn:
+                conn.execute(text("ALTER TABLE usuarios ADD COLUMN email_confirmado BOOLEAN DEFAULT FALSE"))
+        except Exception as e:
+            # Não bloquear inicialização em caso de erro; em produção use alembic
+            logger.warning(f"Could not add usuarios.email_confirmado: {e}")
@@ -1,4 +1,4 @@
-from fastapi import Depends, HTTPException, status, Request
+from fastapi import Depends, HTTPException, status, Request, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from .database import get_db
@@ -46,6 +46,42 @@ def get_current_user_from_request(request: Request, db: Session = Depends(get_db
         raise credentials_exception
     return user
 
+
+# Subprotocolo usado por clientes sem cookie: new WebSocket(url, ["bearer", token])
+WS_BEARER_SUBPROTOCOL = "bearer"
+
+def get_websocket_credentials(websocket: WebSocket):
+    """Return (token, subprotocol) from the 'token' cookie or the bearer subprotocol."""
+    protocols = [p.strip() for p in websocket.headers.get('sec-websocket-protocol', '').split(',') if p.strip()]
+    subprotocol = None
+    token = None
+    if len(protocols) >= 2 and protocols[0].lower() == WS_BEARER_SUBPROTOCOL:
+        # The server must echo the chosen subprotocol or browsers abort the handshake
+        subprotocol = protocols[0]
+        token = protocols[1]
+    return websocket.cookies.get('token') or token, subprotocol
+
+
+def get_current_user_from_websocket(websocket: WebSocket, db: Session):
+    """Validate the handshake once and bind the identity to websocket.state; returns None if invalid."""
+    token, subprotocol = get_websocket_credentials(websocket)
+    if not token:
+        return None
+
+    try:
+        token_data = verify_token(token, HTTPException(status_code=status.HTTP_401_UNAUTHORIZED))
+    except HTTPException:
+        return None
+    user = get_user_by_email(db, email=token_data.email)
+    if user is None:
+        return None
+
+    websocket.state.usuario_id = user.id
+    websocket.state.usuario_nome = user.nome
+    websocket.state.tipo_usuario = user.tipo_usuario
+    websocket.state.subprotocol = subprotocol
+    return user
+
 def get_current_analyst(current_user: Usuario = Depends(get_current_user)):
     if current_user.tipo_usuario != "analista":
         raise HTTPException(
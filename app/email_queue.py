@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import logging
+import os
+import random
+
+from .database import SessionLocal
+from .email_utils import get_default_sender
+from .models import EmailPendente
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_POLL_INTERVAL_SECONDS = float(os.getenv("EMAIL_POLL_INTERVAL_SECONDS", "5"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+# Tempo de posse de um lote; se o worker morrer, os emails voltam à fila depois disso
+EMAIL_LEASE_SECONDS = int(os.getenv("EMAIL_LEASE_SECONDS", "300"))
+EMAIL_SEND_CONCURRENCY = int(os.getenv("EMAIL_SEND_CONCURRENCY", "8"))
+
+def retry_delay(tentativas: int) -> timedelta:
+    """Backoff exponencial com jitter: base * 2^(n-1), +/- 20%"""
+    delay = EMAIL_RETRY_BASE_SECONDS * (2 ** max(tentativas - 1, 0))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+class EmailWorker:
+    def __init__(self, session_factory=SessionLocal, sender=None, batch_size: int = EMAIL_BATCH_SIZE,
+                 poll_interval: float = EMAIL_POLL_INTERVAL_SECONDS, max_attempts: int = EMAIL_MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        # Lote em andamento na thread: stop() espera por ele antes de desligar o executor
+        self._batch: Optional[asyncio.Future] = None
+
+    def _claim_batch(self, db):
+        """Reservar emails vencidos; SKIP LOCKED evita que dois workers peguem o mesmo"""
+        agora = datetime.utcnow()
+        emails = (
+            db.query(EmailPendente)
+            .filter(EmailPendente.status.in_(["pendente", "enviando"]))
+            .filter(EmailPendente.proxima_tentativa <= agora)
+            .order_by(EmailPendente.proxima_tentativa)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for email in emails:
+            email.status = "enviando"
+            email.proxima_tentativa = agora + timedelta(seconds=EMAIL_LEASE_SECONDS)
+        db.commit()
+        return emails
+
+    def _send_one(self, email: EmailPendente) -> Optional[str]:
+        try:
+            self.sender.send(email.destinatario, email.assunto, email.corpo)
+            return None
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+
+    def process_batch(self) -> int:
+        """Enviar um lote; retorna quantos emails foram processados"""
+        if self.sender is None:
+            self.sender = get_default_sender()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=EMAIL_SEND_CONCURRENCY, thread_name_prefix="email")
+
+        db = self.session_factory()
+        # Objetos continuam carregados após o commit da reserva: as threads de envio
+        # só leem atributos em memória, sem tocar na sessão
+        db.expire_on_commit = False
+        try:
+            emails = self._claim_batch(db)
+            if not emails:
+                return 0
+
+            erros = list(self._executor.map(self._send_one, emails))
+
+            agora = datetime.utcnow()
+            for email, erro in zip(emails, erros):
+                email.tentativas += 1
+                if erro is None:
+                    email.status = "enviado"
+                    email.enviado_em = agora
+                    email.ultimo_erro = None
+                elif email.tentativas >= self.max_attempts:
+                    # Dead letter: fica registrado para análise, sem novas tentativas
+                    email.status = "falhou"
+                    email.ultimo_erro = erro
+                    logger.error(f"Email {email.id} dead-lettered after {email.tentativas} attempts: {erro}")
+                else:
+                    email.status = "pendente"
+                    email.ultimo_erro = erro
+                    email.proxima_tentativa = agora + retry_delay(email.tentativas)
+            db.commit()
+            return len(emails)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error processing email queue: {e}")
+            return 0
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            # shield: cancelar o laço não abandona o lote no meio (a thread segue rodando)
+            self._batch = asyncio.ensure_future(asyncio.to_thread(self.process_batch))
+            processed = await asyncio.shield(self._batch)
+            self._batch = None
+            # Lote cheio: provavelmente há mais na fila, continuar sem esperar
+            if processed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            # Resolver o backend já na inicialização: configuração inválida falha aqui,
+            # não como dead letter de cada email
+            if self.sender is None:
+                self.sender = get_default_sender()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._batch is not None:
+            # Terminar o lote em andamento: o executor não pode sair de baixo dele
+            await asyncio.gather(self._batch, return_exceptions=True)
+            self._batch = None
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+email_worker = EmailWorker()
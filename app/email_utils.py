@@ -3,55 +3,109 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
-from .database import SessionLocal
-from .models import EmailConfirmation, Usuario
+from sqlalchemy.orm import Session
 
-try:
-    import boto3
-except Exception:
-    boto3 = None
+from .database import SessionLocal
+from .models import EmailConfirmation, EmailPendente, Usuario
+from .optional import is_installed, optional_import
 
 DEFAULT_EXPIRATION_MINUTES = int(os.getenv('EMAIL_CONFIRMATION_EXPIRATION_MINUTES', '60'))
 
 def generate_confirmation_token() -> str:
     return uuid.uuid4().hex
 
-def create_email_confirmation(usuario_id: int) -> str:
-    db = SessionLocal()
+def create_email_confirmation(usuario_id: int, db: Optional[Session] = None) -> str:
+    """Criar token de confirmação; com db informado, apenas adiciona à transação corrente"""
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
     try:
         token = generate_confirmation_token()
         expira_em = datetime.utcnow() + timedelta(minutes=DEFAULT_EXPIRATION_MINUTES)
         conf = EmailConfirmation(usuario_id=usuario_id, token=token, expira_em=expira_em)
         db.add(conf)
-        db.commit()
+        if own_session:
+            db.commit()
         return token
     finally:
-        db.close()
+        if own_session:
+            db.close()
+
+class ConsoleSender:
+    """Envio para o console (desenvolvimento e testes)"""
+
+    def send(self, to_email: str, subject: str, body: str):
+        print('--- EMAIL SEND (console) ---')
+        print('To:', to_email)
+        print('Subject:', subject)
+        print('Body:', body)
+        print('--- END EMAIL ---')
+
+class SesSender:
+    """Envio via AWS SES com um único client reaproveitado (boto3 clients são thread-safe)"""
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            # SES_ENDPOINT_URL permite apontar para um SES local (moto server, localstack)
+            boto3 = optional_import('boto3')
+            self._client = boto3.client(
+                'ses',
+                region_name=os.getenv('AWS_REGION', 'us-east-1'),
+                endpoint_url=os.getenv('SES_ENDPOINT_URL') or None
+            )
+        return self._client
+
+    def send(self, to_email: str, subject: str, body: str):
+        return self.client.send_email(
+            Source=os.getenv('EMAIL_FROM', 'no-reply@example.com'),
+            Destination={'ToAddresses': [to_email]},
+            Message={
+                'Subject': {'Data': subject},
+                'Body': {'Html': {'Data': body}}
+            }
+        )
+
+def get_default_sender():
+    """EMAIL_BACKEND=ses|console; padrão: SES se boto3 e credenciais AWS disponíveis"""
+    backend = os.getenv('EMAIL_BACKEND')
+    if backend == 'console':
+        return ConsoleSender()
+    if backend == 'ses' and not is_installed('boto3'):
+        raise RuntimeError('EMAIL_BACKEND=ses requires boto3 (pip install boto3)')
+    if backend == 'ses' or (
+        os.getenv('AWS_ACCESS_KEY_ID') and os.getenv('AWS_SECRET_ACCESS_KEY') and is_installed('boto3')
+    ):
+        return SesSender()
+    return ConsoleSender()
 
 def send_email(to_email: str, subject: str, body: str):
-    """Enviar email: primeiro tenta AWS SES se configurado, senão loga no console."""
-    # Tentar SES se boto3 disponível e AWS credenciais configuradas
-    if boto3 and os.getenv('AWS_ACCESS_KEY_ID') and os.getenv('AWS_SECRET_ACCESS_KEY'):
+    """Enviar email imediatamente: primeiro tenta AWS SES se configurado, senão loga no console."""
+    sender = get_default_sender()
+    if isinstance(sender, SesSender):
         try:
-            client = boto3.client('ses', region_name=os.getenv('AWS_REGION', 'us-east-1'))
-            resp = client.send_email(
-                Source=os.getenv('EMAIL_FROM', 'no-reply@example.com'),
-                Destination={'ToAddresses': [to_email]},
-                Message={
-                    'Subject': {'Data': subject},
-                    'Body': {'Html': {'Data': body}}
-                }
-            )
-            return resp
+            return sender.send(to_email, subject, body)
         except Exception as e:
             print('SES send failed, falling back to console:', e)
+    ConsoleSender().send(to_email, subject, body)
+
+def queue_email(db: Session, to_email: str, subject: str, body: str) -> EmailPendente:
+    """Adicionar email à fila de envio (gravado no commit da transação corrente)"""
+    email = EmailPendente(destinatario=to_email, assunto=subject, corpo=body, proxima_tentativa=datetime.utcnow())
+    db.add(email)
+    return email
 
-    # Fallback: console
-    print('--- EMAIL SEND (console) ---')
-    print('To:', to_email)
-    print('Subject:', subject)
-    print('Body:', body)
-    print('--- END EMAIL ---')
+def queue_confirmation_email(db: Session, usuario: Usuario):
+    """Criar token e enfileirar email de confirmação na mesma transação"""
+    token = create_email_confirmation(usuario.id, db)
+    confirm_url = f"{os.getenv('APP_BASE_URL','http://127.0.0.1:8000')}/confirm_email?token={token}"
+    subject = 'Confirme seu e-mail - CSRemote'
+    body = f"<p>Olá {usuario.nome},</p><p>Clique no link abaixo para confirmar seu e-mail:</p><p><a href=\"{confirm_url}\">Confirmar e-mail</a></p>"
+    queue_email(db, usuario.email, subject, body)
+    db.commit()
 
 def send_confirmation_email(usuario_id: int):
     db = SessionLocal()
@@ -59,10 +113,6 @@ def send_confirmation_email(usuario_id: int):
         usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
         if not usuario:
             return
-        token = create_email_confirmation(usuario_id)
-        confirm_url = f"{os.getenv('APP_BASE_URL','http://127.0.0.1:8000')}/confirm_email?token={token}"
-        subject = 'Confirme seu e-mail - CSRemote'
-        body = f"<p>Olá {usuario.nome},</p><p>Clique no link abaixo para confirmar seu e-mail:</p><p><a href=\"{confirm_url}\">Confirmar e-mail</a></p>"
-        send_email(usuario.email, subject, body)
+        queue_confirmation_email(db, usuario)
     finally:
         db.close()
@@ -1,39 +1,235 @@
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import random
 import sys
+import uuid
 from datetime import datetime
-import os
+from typing import Optional
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "14"))
+# Fração dos eventos DEBUG mantidos (eventos de alto volume, ex.: sinalização WebRTC)
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+# Id de correlação da requisição HTTP ou da conexão WebSocket em andamento
+correlation_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("correlation_id", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+# Fila do supervisor (launcher): herdada pelos workers no fork, só o supervisor grava o arquivo
+_shared_queue = None
+_shared_listener: Optional[logging.handlers.QueueListener] = None
+
+class CorrelationIdFilter(logging.Filter):
+    """Anexa o id de correlação ao registro (executa na thread que gerou o log)"""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+class DebugSamplingFilter(logging.Filter):
+    """Mantém apenas uma amostra dos eventos DEBUG; demais níveis passam sempre"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
 
-def setup_logging():
-    """Configurar sistema de logs"""
-    
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por evento"""
+
+    # Atributos padrão de LogRecord; o restante veio de extra={...}
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "correlation_id"}
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Traceback já formatado pelo StructuredQueueHandler
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que não funde o traceback na mensagem
+
+    O prepare padrão formata o registro inteiro em msg e descarta exc_info; aqui o traceback
+    vira texto em exc_text (o objeto traceback prende frames e não atravessa a fila) e o
+    JsonFormatter o emite no campo exc_info.
+    """
+
+    def prepare(self, record):
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        message = record.getMessage()
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotação diária (à meia-noite) ou ao atingir max_bytes, o que ocorrer primeiro"""
+
+    def __init__(self, filename, max_bytes: int, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0 and self.stream is not None:
+            self.stream.seek(0, 2)
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+def _build_handlers(log_dir: Optional[str] = None):
+    """Handlers de destino (arquivo rotativo + console), usados só pela thread do listener"""
     # Criar diretório de logs
-    os.makedirs("logs", exist_ok=True)
-    
-    # Configurar formato
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Handler para arquivo
-    file_handler = logging.FileHandler(
-        f"logs/csremote_{datetime.now().strftime('%Y%m%d')}.log"
+    log_dir = log_dir or os.getenv("LOG_DIR", LOG_DIR)
+    os.makedirs(log_dir, exist_ok=True)
+
+    formatter = JsonFormatter()
+
+    # Handler para arquivo (nome fixo; arquivos rotacionados recebem sufixo de data)
+    file_handler = SizedTimedRotatingFileHandler(
+        os.path.join(log_dir, "csremote.log"),
+        max_bytes=LOG_MAX_BYTES,
+        when="midnight",
+        backupCount=LOG_BACKUP_COUNT,
+        encoding="utf-8",
+        delay=True
     )
     file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
-    
+
     # Handler para console
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.INFO)
-    
+    return file_handler, console_handler
+
+def setup_logging(log_dir: Optional[str] = None):
+    """Configurar sistema de logs: QueueHandler no processo, escrita em thread própria
+
+    log_dir: diretório dos arquivos (padrão: variável LOG_DIR lida agora, não no import)
+
+    A rotação do RotatingFileHandler não é segura entre processos (cada um renomeia o arquivo
+    sob os outros). Sob o launcher, os workers só enfileiram na fila do supervisor (ver
+    start_shared_listener) e um único processo grava LOG_DIR; fora dele, cada processo
+    precisa do seu próprio LOG_DIR.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        return logging.getLogger()
+
+    # O event loop só enfileira; a thread do listener formata e grava
+    if _shared_queue is not None:
+        log_queue = _shared_queue
+    else:
+        log_queue = queue.Queue(-1)
+        _listener = logging.handlers.QueueListener(
+            log_queue, *_build_handlers(log_dir), respect_handler_level=True
+        )
+        _listener.start()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationIdFilter())
+    queue_handler.addFilter(DebugSamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+
     # Configurar logger raiz
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
-    # Logger específico para WebRTC
-    webrtc_logger = logging.getLogger("webrtc")
+    root_logger.setLevel(LOG_LEVEL)
+    root_logger.addHandler(queue_handler)
+    _queue_handler = queue_handler
+
+    # Logger do módulo app.webrtc (DEBUG amostrado)
+    webrtc_logger = logging.getLogger("app.webrtc")
     webrtc_logger.setLevel(logging.DEBUG)
-    
-    return root_logger
\ No newline at end of file
+
+    return root_logger
+
+def start_shared_listener(log_dir: Optional[str] = None):
+    """Supervisor: criar a fila entre processos antes do fork dos workers e gravar por eles"""
+    global _shared_queue, _shared_listener
+    if _shared_listener is not None:
+        return
+    _shared_queue = multiprocessing.get_context("fork").Queue(-1)
+    _shared_listener = logging.handlers.QueueListener(
+        _shared_queue, *_build_handlers(log_dir), respect_handler_level=True
+    )
+    _shared_listener.start()
+
+def stop_shared_listener():
+    """Supervisor: esvaziar a fila depois que os workers saíram"""
+    global _shared_queue, _shared_listener
+    if _shared_listener is not None:
+        _shared_listener.stop()
+        _shared_listener = None
+    if _shared_queue is not None:
+        _shared_queue.close()
+        _shared_queue.join_thread()
+        _shared_queue = None
+
+def shutdown_logging():
+    """Esvaziar a fila e parar a thread de escrita"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        # Sem listener ninguém consome a fila: remover o handler para não acumular registros
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class CorrelationIdMiddleware:
+    """Define o id de correlação por requisição HTTP ou conexão WebSocket (header X-Request-ID)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+        token = correlation_id.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper if scope["type"] == "http" else send)
+        finally:
+            correlation_id.reset(token)
@@ -1,31 +1,60 @@
-from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, UploadFile, Response
+from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, UploadFile, Response, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from pathlib import Path
 from fastapi.responses import HTMLResponse
 from fastapi import Request
-from sqlalchemy.orm import Session
-from datetime import timedelta, datetime
-from typing import List, Dict
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, aliased
+from datetime import date, timedelta, datetime
+from typing import List, Dict, Optional
+import asyncio
 import json
+import logging
+import os
+import time
 
 from .database import get_db, create_tables
-from .models import Usuario, SessaoRemota, MensagemChat
+from .replica import get_read_db, ReadYourWritesMiddleware
+from .models import Usuario, SessaoRemota, SessaoArquivada, Auditoria
 from .schemas import (
     UsuarioCreate, Usuario as UsuarioSchema, Token, CodigoAcesso,
-    IniciarSessao, MensagemChatCreate, UsuarioCriarAnalista
+    IniciarSessao, MensagemChatCreate, UsuarioCriarAnalista, TrafegoMidia
 )
 from .auth import (
     authenticate_user, create_access_token, get_password_hash,
     ACCESS_TOKEN_EXPIRE_MINUTES, is_valid_analyst_email
 )
-from .access_codes import create_temporary_code, validate_access_code, mark_code_as_used
-from .email_utils import send_confirmation_email
-from .dependencies import get_current_user, get_current_analyst, get_current_admin, get_current_client, get_current_user_from_request
+from .access_codes import create_temporary_code, claim_access_code
+from .email_utils import queue_confirmation_email
+from .email_queue import email_worker
+from .maintenance import maintenance_scheduler
+from .session_liveness import session_liveness
+from .shutdown import shutdown_coordinator
+from . import analytics
+from .archive import archived_session, fetch_archived_messages
+from .dependencies import get_current_user, get_current_analyst, get_current_admin, get_current_client, get_current_user_from_request, get_current_user_from_websocket
 from .webrtc import webrtc_manager
+from .notifications import notification_manager
+from .cluster_bus import cluster_bus
+from .session_roster import session_roster
+from .chat_history import fetch_messages, insert_message, MAX_REPLAY_MESSAGES
+from .chat_search import search_messages
+from .traffic import media_report_limiter, traffic_counter
+from .audit import audit_logger, audit_writer
+from .logging_config import setup_logging, shutdown_logging, CorrelationIdMiddleware
+from .metrics import (
+    MetricsMiddleware, render_metrics, mark_process_dead,
+    CHAT_CONNECTIONS, CHAT_BROADCAST_SECONDS, UPLOAD_BYTES, UPLOAD_SECONDS
+)
 from .file_manager import file_manager
+from .rendering import TemplateRenderer
+from .static_assets import StaticAssets, PrecompressedStaticFiles
+from .compression import CompressionMiddleware
+from .serialization import FastJSONResponse
+from .user_directory import fetch_users
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="CSRemote", description="Sistema de Suporte Remoto", version="1.0.0")
 
@@ -38,16 +67,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compressão gzip/brotli das respostas HTTP (WebSockets e downloads comprimidos passam direto)
+app.add_middleware(CompressionMiddleware)
+# Latência por rota (middleware ASGI puro; ignora WebSockets)
+app.add_middleware(MetricsMiddleware)
+# Quem acabou de escrever lê do primário (réplica de leitura)
+app.add_middleware(ReadYourWritesMiddleware)
+# Id de correlação por requisição/WebSocket nos logs
+app.add_middleware(CorrelationIdMiddleware)
+
 # Templates e arquivos estáticos
 BASE_DIR = Path(__file__).resolve().parent.parent
 # Use absolute paths to avoid issues when the reloader changes working directory
-app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+app.mount("/static", PrecompressedStaticFiles(directory=str(BASE_DIR / "static")), name="static")
+static_assets = StaticAssets(str(BASE_DIR / "static"))
+templates = TemplateRenderer(str(BASE_DIR / "templates"))
+templates.env.globals["static_url"] = static_assets.url
+
+async def sessoes_encerradas_por_inatividade(encerradas):
+    """Mesmo efeito de /sessao/{id}/encerrar para sessões fechadas pelo session_liveness"""
+    analytics.sessions_ended(sessao_id for sessao_id, _, _ in encerradas)
+    for sessao_id, analista_id, cliente_id in encerradas:
+        session_roster.invalidate(sessao_id)
+        audit_logger.log_session_event(sessao_id, "END", None, {"motivo": "sem conexões"})
+        await notification_manager.notify_session_users(analista_id, cliente_id, {
+            "event": "sessao_encerrada",
+            "sessao_id": sessao_id
+        })
 
 # Criar tabelas na inicialização
 @app.on_event("startup")
 async def startup_event():
+    setup_logging()
+    # Manifesto antes dos templates: as páginas em cache já saem com as URLs com hash
+    static_assets.build()
+    templates.precompile()
     create_tables()
+    await notification_manager.start()
+    await cluster_bus.start()
+    traffic_counter.start()
+    audit_writer.start()
+    email_worker.start()
+    maintenance_scheduler.start()
+    session_liveness.start(on_closed=sessoes_encerradas_por_inatividade)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Avisar os clientes e gravar os buffers antes de parar os componentes
+    await shutdown_coordinator.drain()
+    await notification_manager.stop()
+    await cluster_bus.stop()
+    await traffic_counter.stop()
+    await audit_writer.stop()
+    await email_worker.stop()
+    await maintenance_scheduler.stop()
+    await session_liveness.stop()
+    mark_process_dead()
+    shutdown_logging()
+    # Testes reutilizam o mesmo app em vários ciclos de startup/shutdown
+    shutdown_coordinator.reset()
 
 # ==========================================
 # WEBSOCKET MANAGER PARA CHAT
@@ -57,27 +135,56 @@ class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[int, List[WebSocket]] = {}
 
-    async def connect(self, websocket: WebSocket, session_id: int):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, session_id: int, subprotocol: Optional[str] = None):
+        await websocket.accept(subprotocol=subprotocol)
         if session_id not in self.active_connections:
             self.active_connections[session_id] = []
         self.active_connections[session_id].append(websocket)
+        CHAT_CONNECTIONS.inc()
+        session_liveness.connected(session_id)
 
     def disconnect(self, websocket: WebSocket, session_id: int):
-        if session_id in self.active_connections:
+        # Idempotente: chamado no finally do handler, qualquer que seja a saída
+        if websocket in self.active_connections.get(session_id, []):
             self.active_connections[session_id].remove(websocket)
+            CHAT_CONNECTIONS.dec()
+            session_liveness.disconnected(session_id)
             if not self.active_connections[session_id]:
                 del self.active_connections[session_id]
 
     async def send_message_to_session(self, message: str, session_id: int):
+        # Peers da sessão podem estar em outros workers: cada um entrega aos seus sockets
+        await cluster_bus.publish("chat", {"sessao_id": session_id, "message": message})
+
+    async def deliver_local(self, event: dict):
+        session_id, message = event["sessao_id"], event["message"]
         if session_id in self.active_connections:
+            start = time.perf_counter()
+            enviados = 0
             for connection in self.active_connections[session_id]:
                 try:
                     await connection.send_text(message)
+                    enviados += 1
                 except:
                     pass
+            CHAT_BROADCAST_SECONDS.observe(time.perf_counter() - start)
+            session_liveness.touch(session_id)
+            traffic_counter.add(session_id, bytes_out=len(message.encode()) * enviados)
 
 manager = ConnectionManager()
+cluster_bus.subscribe("chat", manager.deliver_local)
+
+shutdown_coordinator.register_sockets(
+    "chat", lambda: [ws for conexoes in manager.active_connections.values() for ws in conexoes]
+)
+shutdown_coordinator.register_sockets(
+    "signaling", lambda: [ws for conexoes in webrtc_manager.active_connections.values() for ws in conexoes.values()]
+)
+shutdown_coordinator.register_sockets(
+    "notificacoes", lambda: [ws for conexoes in notification_manager.user_connections.values() for ws in conexoes]
+)
+shutdown_coordinator.register_flush("traffic", traffic_counter.flush_pending)
+shutdown_coordinator.register_flush("audit", audit_writer.flush_pending)
 
 # ==========================================
 # ROTAS DE AUTENTICAÇÃO
@@ -120,11 +227,13 @@ async def cadastrar_cliente(usuario: UsuarioCreate, db: Session = Depends(get_db
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
-    # Enviar email de confirmação (assíncrono no próximo passo; aqui chamamos diretamente)
+    # Email de confirmação vai para a fila; o envio (SES) é feito pelo email_worker
     try:
-        send_confirmation_email(db_user.id)
-    except Exception:
-        pass
+        queue_confirmation_email(db, db_user)
+    except SQLAlchemyError:
+        # Conta já criada: registrar a falha em vez de perder o email em silêncio
+        db.rollback()
+        logger.exception(f"Failed to queue confirmation email for user {db_user.id}")
     return db_user
 
 
@@ -179,6 +288,7 @@ async def criar_analista(
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    audit_logger.log_action(current_admin.id, "ADMIN_CREATE_ANALYST", {"usuario_id": db_user.id})
     return db_user
 
 # ==========================================
@@ -190,7 +300,7 @@ async def gerar_codigo_acesso(
     current_client: Usuario = Depends(get_current_client),
     db: Session = Depends(get_db)
 ):
-    code_data = create_temporary_code(current_client.id)
+    code_data = create_temporary_code(db, current_client.id)
     return CodigoAcesso(codigo=code_data["codigo"], expira_em=code_data["expira_em"])
 
 @app.post("/analista/iniciar-sessao")
@@ -199,19 +309,17 @@ async def iniciar_sessao_remota(
     current_analyst: Usuario = Depends(get_current_analyst),
     db: Session = Depends(get_db)
 ):
-    # Validar código de acesso
-    cliente_id = validate_access_code(sessao_data.codigo_acesso)
+    # Validar e marcar o código como usado (efetivado no commit, junto com a sessão)
+    cliente_id = claim_access_code(db, sessao_data.codigo_acesso)
     if not cliente_id:
         raise HTTPException(status_code=400, detail="Invalid or expired access code")
     
     # Buscar cliente
     cliente = db.query(Usuario).filter(Usuario.id == cliente_id).first()
     if not cliente:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Client not found")
     
-    # Marcar código como usado
-    mark_code_as_used(sessao_data.codigo_acesso)
-    
     # Criar sessão remota
     db_sessao = SessaoRemota(
         analista_id=current_analyst.id,
@@ -222,6 +330,12 @@ async def iniciar_sessao_remota(
     db.add(db_sessao)
     db.commit()
     db.refresh(db_sessao)
+    audit_logger.log_session_event(db_sessao.id, "START", current_analyst.id, {"cliente_id": cliente.id})
+
+    await notification_manager.notify_session_users(current_analyst.id, cliente.id, {
+        "event": "sessao_iniciada",
+        "sessao_id": db_sessao.id
+    })
     
     return {
         "sessao_id": db_sessao.id,
@@ -251,6 +365,15 @@ async def encerrar_sessao(
     # Encerrar sessão
     sessao.termino = datetime.utcnow()
     db.commit()
+    session_roster.invalidate(sessao_id)
+    session_liveness.forget(sessao_id)
+    analytics.sessions_ended([sessao_id])
+    audit_logger.log_session_event(sessao_id, "END", current_user.id)
+
+    await notification_manager.notify_session_users(sessao.analista_id, sessao.cliente_id, {
+        "event": "sessao_encerrada",
+        "sessao_id": sessao.id
+    })
     
     return {"message": "Session ended successfully"}
 
@@ -264,86 +387,273 @@ async def websocket_chat(
     sessao_id: int,
     db: Session = Depends(get_db)
 ):
-    # Verificar se sessão existe
-    sessao = db.query(SessaoRemota).filter(SessaoRemota.id == sessao_id).first()
-    if not sessao:
+    # Autenticar uma única vez no handshake
+    if not get_current_user_from_websocket(websocket, db):
+        await websocket.close(code=4001)
+        return
+
+    # Verificar se sessão existe (roster em cache compartilhado com sinalização e arquivos)
+    roster = session_roster.get(sessao_id, db)
+    if not roster:
         await websocket.close(code=4004)
         return
-    
-    await manager.connect(websocket, sessao_id)
-    
+
+    # Verificar se usuário pertence à sessão; identidade fica presa à conexão
+    participante = roster.get(websocket.state.usuario_id)
+    if not participante:
+        await websocket.close(code=4003)
+        return
+    usuario_id = participante["id"]
+
+    if shutdown_coordinator.draining:
+        await shutdown_coordinator.reject(websocket, websocket.state.subprotocol)
+        return
+    await manager.connect(websocket, sessao_id, websocket.state.subprotocol)
+
+    # Qualquer saída (desconexão, erro de banco, falha no envio) libera a conexão
     try:
+        # Reconexão: reenviar apenas as mensagens posteriores à última vista
+        last_id = websocket.query_params.get("last_id")
+        if last_id and last_id.isdigit():
+            for mensagem in fetch_messages(db, sessao_id, after=int(last_id), limit=MAX_REPLAY_MESSAGES):
+                payload = json.dumps(mensagem)
+                await websocket.send_text(payload)
+                traffic_counter.add(sessao_id, bytes_out=len(payload.encode()))
+            db.commit()
+
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
-            
-            # Verificar se usuário pertence à sessão
-            usuario_id = message_data.get("usuario_id")
-            if usuario_id not in [sessao.analista_id, sessao.cliente_id]:
+            traffic_counter.add(sessao_id, bytes_in=len(data.encode()))
+            try:
+                message_data = json.loads(data)
+            except ValueError:
+                logger.warning(f"Ignoring undecodable chat frame: session={sessao_id}")
                 continue
-            
-            # Salvar mensagem no banco
-            db_mensagem = MensagemChat(
-                sessao_id=sessao_id,
-                usuario_id=usuario_id,
-                mensagem=message_data.get("mensagem", "")
-            )
-            db.add(db_mensagem)
-            db.commit()
-            db.refresh(db_mensagem)
-            
-            # Buscar dados do usuário para enviar com a mensagem
-            usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
-            
-            # Broadcast para todos os conectados na sessão
-            response_data = {
-                "id": db_mensagem.id,
-                "usuario_id": usuario.id,
-                "usuario_nome": usuario.nome,
-                "mensagem": db_mensagem.mensagem,
-                "timestamp": db_mensagem.timestamp.isoformat()
-            }
-            
-            await manager.send_message_to_session(json.dumps(response_data), sessao_id)
-            
+            if not isinstance(message_data, dict):
+                continue
+
+            # Mensagem recebida é gravada e distribuída mesmo durante o desligamento
+            with shutdown_coordinator.track():
+                # Salvar mensagem no banco (sem leituras: id via RETURNING, timestamp local)
+                mensagem = message_data.get("mensagem", "")
+                timestamp = datetime.utcnow()
+                mensagem_id = insert_message(db, sessao_id, usuario_id, mensagem, timestamp)
+                db.commit()
+                if mensagem_id is None:
+                    # Sessão encerrada (e possivelmente sendo arquivada): não aceitar mais mensagens
+                    await websocket.close(code=4004)
+                    return
+
+                # Broadcast para todos os conectados na sessão
+                response_data = {
+                    "id": mensagem_id,
+                    "usuario_id": participante["id"],
+                    "usuario_nome": participante["nome"],
+                    "mensagem": mensagem,
+                    "timestamp": timestamp.isoformat()
+                }
+
+                await manager.send_message_to_session(json.dumps(response_data), sessao_id)
     except WebSocketDisconnect:
+        pass
+    finally:
+        db.rollback()
         manager.disconnect(websocket, sessao_id)
 
+@app.get("/sessao/{sessao_id}/mensagens")
+async def historico_mensagens(
+    sessao_id: int,
+    before: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Usuario = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Histórico do chat paginado por keyset (mensagens anteriores a 'before')"""
+    roster = session_roster.get(sessao_id, db)
+    if roster:
+        if not roster.is_member(current_user.id):
+            raise HTTPException(status_code=403, detail="Access denied")
+        mensagens = fetch_messages(db, sessao_id, before=before, limit=limit)
+        if not mensagens and archived_session(db, sessao_id):
+            # Roster em cache de antes do arquivamento (feito por outro worker)
+            session_roster.invalidate(sessao_id)
+            roster = None
+    if not roster:
+        # Sessão antiga: transcrição lida do arquivo
+        arquivada = archived_session(db, sessao_id)
+        if not arquivada or current_user.id not in (arquivada.analista_id, arquivada.cliente_id):
+            raise HTTPException(status_code=403, detail="Access denied")
+        mensagens = await asyncio.to_thread(fetch_archived_messages, arquivada, before=before, limit=limit)
+    return {
+        "mensagens": mensagens,
+        "next_before": mensagens[0]["id"] if len(mensagens) == limit else None
+    }
+
+# ==========================================
+# WEBSOCKET PARA NOTIFICAÇÕES
+# ==========================================
+
+@app.websocket("/ws/notificacoes")
+async def websocket_notificacoes(
+    websocket: WebSocket,
+    db: Session = Depends(get_db)
+):
+    """Notificações em tempo real (início/fim de sessão) para os dashboards"""
+    if not get_current_user_from_websocket(websocket, db):
+        await websocket.close(code=4001)
+        return
+    usuario_id = websocket.state.usuario_id
+    # Conexão de longa duração: liberar a conexão do banco após autenticar
+    db.close()
+
+    if shutdown_coordinator.draining:
+        await shutdown_coordinator.reject(websocket, websocket.state.subprotocol)
+        return
+    await notification_manager.connect_user(usuario_id, websocket, websocket.state.subprotocol)
+
+    try:
+        while True:
+            # Mensagens do cliente servem apenas como keepalive
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        notification_manager.disconnect_user(usuario_id, websocket)
+
 # ==========================================
 # ROTAS ADMINISTRATIVAS
 # ==========================================
 
-@app.get("/admin/usuarios", response_model=List[UsuarioSchema])
+@app.get("/admin/usuarios")
 async def listar_usuarios(
+    tipo_usuario: Optional[str] = None,
+    administrador: Optional[bool] = None,
+    email_confirmado: Optional[bool] = None,
+    empresa: Optional[str] = None,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
     current_admin: Usuario = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    return db.query(Usuario).all()
+    """Usuários paginados por id (keyset), com filtros e busca por prefixo em nome/email/CNPJ"""
+    usuarios = fetch_users(
+        db, tipo_usuario=tipo_usuario, administrador=administrador, email_confirmado=email_confirmado,
+        empresa=empresa, busca=q, after=after, limit=limit
+    )
+    return FastJSONResponse({
+        "usuarios": usuarios,
+        "next_after": usuarios[-1]["id"] if len(usuarios) == limit else None
+    })
 
 @app.get("/admin/sessoes")
 async def relatorio_sessoes(
+    current_admin: Usuario = Depends(get_current_admin),
+    db: Session = Depends(get_read_db)
+):
+    Analista = aliased(Usuario)
+    Cliente = aliased(Usuario)
+    rows = (
+        db.query(
+            SessaoRemota.id, Analista.nome, Cliente.nome,
+            SessaoRemota.inicio, SessaoRemota.termino, SessaoRemota.trafego_bytes
+        )
+        .join(Analista, SessaoRemota.analista_id == Analista.id)
+        .join(Cliente, SessaoRemota.cliente_id == Cliente.id)
+        .all()
+    )
+
+    relatorio = [
+        {
+            "id": sessao_id,
+            "analista": analista,
+            "cliente": cliente,
+            "inicio": inicio,
+            "termino": termino,
+            "duracao_segundos": (termino - inicio).total_seconds() if termino else None,
+            "trafego_bytes": trafego_bytes
+        }
+        for sessao_id, analista, cliente, inicio, termino, trafego_bytes in rows
+    ]
+    return FastJSONResponse(relatorio)
+
+@app.get("/admin/sessoes/ativas")
+async def sessoes_ativas(current_admin: Usuario = Depends(get_current_admin), db: Session = Depends(get_db)):
+    """Sessões com peers conectados em todos os workers (heartbeat em conexoes_sessoes)"""
+    sessoes = session_liveness.active_sessions(db)
+    return FastJSONResponse({"total": len(sessoes), "sessoes": sessoes})
+
+@app.get("/admin/estatisticas")
+async def estatisticas_sessoes(
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+    agrupar: str = Query("dia", pattern="^(dia|analista|empresa)$"),
+    analista_id: Optional[int] = None,
+    empresa: Optional[str] = None,
     current_admin: Usuario = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    sessoes = db.query(SessaoRemota).all()
-    relatorio = []
-    
-    for sessao in sessoes:
-        duracao = None
-        if sessao.termino:
-            duracao = (sessao.termino - sessao.inicio).total_seconds()
-        
-        relatorio.append({
-            "id": sessao.id,
-            "analista": sessao.analista.nome,
-            "cliente": sessao.cliente.nome,
-            "inicio": sessao.inicio,
-            "termino": sessao.termino,
-            "duracao_segundos": duracao,
-            "trafego_bytes": sessao.trafego_bytes
-        })
-    
-    return relatorio
+    """Totais e percentis de duração por dia, analista ou empresa, lidos dos agregados diários"""
+    fim = fim or datetime.utcnow().date()
+    inicio = inicio or fim - timedelta(days=30)
+    if inicio > fim:
+        raise HTTPException(status_code=400, detail="inicio must not be after fim")
+    return FastJSONResponse({
+        "inicio": inicio.isoformat(),
+        "fim": fim.isoformat(),
+        "grupos": analytics.query_statistics(db, inicio, fim, agrupar, analista_id=analista_id, empresa=empresa)
+    })
+
+@app.get("/admin/auditoria")
+async def consultar_auditoria(
+    usuario_id: Optional[int] = None,
+    sessao_id: Optional[int] = None,
+    acao: Optional[str] = None,
+    before: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    current_admin: Usuario = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Eventos de auditoria mais recentes primeiro, paginados por id (keyset)"""
+    query = db.query(Auditoria)
+    if usuario_id is not None:
+        query = query.filter(Auditoria.usuario_id == usuario_id)
+    if sessao_id is not None:
+        query = query.filter(Auditoria.sessao_id == sessao_id)
+    if acao:
+        query = query.filter(Auditoria.acao == acao)
+    if before is not None:
+        query = query.filter(Auditoria.id < before)
+
+    eventos = query.order_by(Auditoria.id.desc()).limit(limit).all()
+    return {
+        "eventos": [
+            {
+                "id": evento.id,
+                "criado_em": evento.criado_em,
+                "usuario_id": evento.usuario_id,
+                "sessao_id": evento.sessao_id,
+                "acao": evento.acao,
+                "detalhes": json.loads(evento.detalhes) if evento.detalhes else None
+            }
+            for evento in eventos
+        ],
+        "next_before": eventos[-1].id if len(eventos) == limit else None
+    }
+
+@app.get("/mensagens/busca")
+async def buscar_mensagens(
+    q: str = Query(..., min_length=2, max_length=200),
+    analista_id: Optional[int] = None,
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_analyst: Usuario = Depends(get_current_analyst),
+    db: Session = Depends(get_db)
+):
+    """Busca textual nos chats (administradores veem todos; analistas, apenas os seus)"""
+    if not current_analyst.administrador:
+        analista_id = current_analyst.id
+
+    return search_messages(db, q, analista_id=analista_id, inicio=inicio, fim=fim, limit=limit)
 
 @app.post("/admin/resetar-senha/{usuario_id}")
 async def resetar_senha_usuario(
@@ -359,6 +669,7 @@ async def resetar_senha_usuario(
     nova_senha = "TempPass123!"
     usuario.senha_hash = get_password_hash(nova_senha)
     db.commit()
+    audit_logger.log_action(current_admin.id, "ADMIN_PASSWORD_RESET", {"usuario_id": usuario.id})
     
     return {"message": f"Password reset for user {usuario.nome}", "temporary_password": nova_senha}
 
@@ -373,24 +684,49 @@ async def get_user_info(current_user: Usuario = Depends(get_current_user)):
 @app.get("/sessoes/minhas")
 async def minhas_sessoes(
     current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    if current_user.tipo_usuario == "analista":
-        sessoes = db.query(SessaoRemota).filter(SessaoRemota.analista_id == current_user.id).all()
-    else:
-        sessoes = db.query(SessaoRemota).filter(SessaoRemota.cliente_id == current_user.id).all()
-    
-    return [
+    Analista = aliased(Usuario)
+    Cliente = aliased(Usuario)
+    is_analista = current_user.tipo_usuario == "analista"
+    consultas = []
+    for tabela in (SessaoRemota, SessaoArquivada):
+        query = (
+            db.query(tabela.id, Analista.nome, Cliente.nome, tabela.inicio, tabela.termino, tabela.codigo_acesso)
+            .join(Analista, tabela.analista_id == Analista.id)
+            .join(Cliente, tabela.cliente_id == Cliente.id)
+        )
+        if is_analista:
+            query = query.filter(tabela.analista_id == current_user.id)
+        else:
+            query = query.filter(tabela.cliente_id == current_user.id)
+        consultas.append(query)
+
+    # Sessões arquivadas vêm da tabela de metadados; só as mensagens ficam nos segmentos
+    return FastJSONResponse([
         {
-            "id": sessao.id,
-            "analista": sessao.analista.nome,
-            "cliente": sessao.cliente.nome,
-            "inicio": sessao.inicio,
-            "termino": sessao.termino,
-            "codigo_acesso": sessao.codigo_acesso if current_user.tipo_usuario == "analista" else None
+            "id": sessao_id,
+            "analista": analista,
+            "cliente": cliente,
+            "inicio": inicio,
+            "termino": termino,
+            "codigo_acesso": codigo_acesso if is_analista else None
         }
-        for sessao in sessoes
-    ]
+        for sessao_id, analista, cliente, inicio, termino, codigo_acesso in consultas[0].union_all(consultas[1]).all()
+    ])
+
+# ==========================================
+# MÉTRICAS
+# ==========================================
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Exposição no formato Prometheus"""
+    rendered = render_metrics()
+    if rendered is None:
+        raise HTTPException(status_code=503, detail="Metrics unavailable (prometheus_client not installed)")
+    content, content_type = rendered
+    return Response(content=content, media_type=content_type)
 
 # ==========================================
 # ROTA PARA ARQUIVOS WEBRTC/FRONTEND
@@ -398,34 +734,30 @@ async def minhas_sessoes(
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.static_page(request, "index.html")
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return templates.static_page(request, "login.html")
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request, current_user: Usuario = Depends(get_current_user_from_request)):
     # Render server-side different dashboards to avoid exposing analyst UI to clients
     ctx = {"request": request, "user": current_user}
     if current_user.tipo_usuario == 'analista':
-        return templates.TemplateResponse("dashboard_analista.html", ctx)
+        return templates.stream("dashboard_analista.html", ctx)
     else:
-        return templates.TemplateResponse("dashboard_cliente.html", ctx)
+        return templates.stream("dashboard_cliente.html", ctx)
 
 
 @app.get("/cadastro", response_class=HTMLResponse)
 async def cadastro_page(request: Request):
-    return templates.TemplateResponse("cadastro.html", {"request": request})
+    return templates.static_page(request, "cadastro.html")
 
 @app.get("/sessao/{sessao_id}", response_class=HTMLResponse)
 async def sessao_page(request: Request, sessao_id: int):
     return templates.TemplateResponse("sessao.html", {"request": request, "sessao_id": sessao_id})
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
 @app.websocket("/ws/signaling/{sessao_id}")
 async def websocket_signaling(
     websocket: WebSocket,
@@ -433,36 +765,50 @@ async def websocket_signaling(
     db: Session = Depends(get_db)
 ):
     """WebSocket para sinalização WebRTC"""
+    # Autenticar uma única vez no handshake
+    if not get_current_user_from_websocket(websocket, db):
+        await websocket.close(code=4001)
+        return
+
     # Verificar se sessão existe
-    sessao = db.query(SessaoRemota).filter(SessaoRemota.id == sessao_id).first()
-    if not sessao:
+    roster = session_roster.get(sessao_id, db)
+    if not roster:
         await websocket.close(code=4004)
         return
     
-    # Determinar tipo de usuário (seria melhor obter do token, mas para simplicidade...)
-    user_type = "cliente"  # Será determinado pela primeira mensagem
-    
+    # Papel na sessão vem do roster, não do cliente
+    participante = roster.get(websocket.state.usuario_id)
+    if not participante:
+        await websocket.close(code=4003)
+        return
+    user_type = participante["tipo"]
+
+    if shutdown_coordinator.draining:
+        await shutdown_coordinator.reject(websocket, websocket.state.subprotocol)
+        return
     try:
-        await webrtc_manager.connect(websocket, sessao_id, user_type)
+        await webrtc_manager.connect(websocket, sessao_id, user_type, websocket.state.subprotocol)
         
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
+            traffic_counter.add(sessao_id, bytes_in=len(data.encode()))
+            try:
+                message = json.loads(data)
+            except ValueError:
+                logger.warning(f"Ignoring undecodable signaling frame: session={sessao_id}")
+                continue
             
-            # Primeira mensagem define o tipo
-            if "user_type" in message:
-                # Atualizar tipo se necessário
-                if user_type != message["user_type"]:
-                    webrtc_manager.disconnect(sessao_id, user_type)
-                    user_type = message["user_type"]
-                    await webrtc_manager.connect(websocket, sessao_id, user_type)
+            # Clientes antigos ainda anunciam o tipo; já definido no handshake
+            if not isinstance(message, dict) or "user_type" in message:
                 continue
             
             # Retransmitir sinais WebRTC
             await webrtc_manager.relay_signal(sessao_id, user_type, message)
-            
     except WebSocketDisconnect:
-        webrtc_manager.disconnect(sessao_id, user_type)
+        pass
+    finally:
+        # Qualquer saída libera o registro (no-op se o socket já foi substituído)
+        webrtc_manager.disconnect(sessao_id, user_type, websocket)
 
 @app.post("/sessao/{sessao_id}/upload")
 async def upload_file(
@@ -473,12 +819,17 @@ async def upload_file(
 ):
     """Upload de arquivo durante sessão"""
     # Verificar se usuário pertence à sessão
-    sessao = db.query(SessaoRemota).filter(SessaoRemota.id == sessao_id).first()
-    if not sessao or current_user.id not in [sessao.analista_id, sessao.cliente_id]:
+    roster = session_roster.get(sessao_id, db)
+    if not roster or not roster.is_member(current_user.id):
         raise HTTPException(status_code=403, detail="Access denied")
     
     try:
+        start = time.perf_counter()
         file_info = await file_manager.save_file(file, sessao_id)
+        UPLOAD_SECONDS.observe(time.perf_counter() - start)
+        UPLOAD_BYTES.inc(file_info["size"])
+        traffic_counter.add(sessao_id, bytes_in=file_info["size"])
+        audit_logger.log_file_transfer(sessao_id, current_user.id, file_info["filename"], "UPLOAD")
         return {
             "message": "File uploaded successfully",
             "file": file_info
@@ -495,21 +846,45 @@ async def download_file(
 ):
     """Download de arquivo da sessão"""
     # Verificar permissões
-    sessao = db.query(SessaoRemota).filter(SessaoRemota.id == sessao_id).first()
-    if not sessao or current_user.id not in [sessao.analista_id, sessao.cliente_id]:
+    roster = session_roster.get(sessao_id, db)
+    if not roster or not roster.is_member(current_user.id):
         raise HTTPException(status_code=403, detail="Access denied")
     
-    return await file_manager.get_file(sessao_id, file_id)
+    response = await file_manager.get_file(sessao_id, file_id)
+    traffic_counter.add(sessao_id, bytes_out=os.path.getsize(response.path))
+    audit_logger.log_file_transfer(sessao_id, current_user.id, response.filename, "DOWNLOAD")
+    return response
+
+@app.post("/sessao/{sessao_id}/trafego")
+async def reportar_trafego_midia(
+    sessao_id: int,
+    trafego: TrafegoMidia,
+    current_user: Usuario = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Bytes de mídia WebRTC (peer-to-peer) informados pelo cliente via getStats"""
+    roster = session_roster.get(sessao_id, db)
+    if not roster or not roster.is_member(current_user.id):
+        raise HTTPException(status_code=403, detail="Access denied")
+    if db.query(SessaoRemota.termino).filter(SessaoRemota.id == sessao_id).scalar() is not None:
+        raise HTTPException(status_code=409, detail="Session already ended")
+
+    # Valores acima da taxa máxima no intervalo são truncados
+    limite = media_report_limiter.allowed(sessao_id, current_user.id)
+    bytes_out = min(trafego.bytes_enviados, limite)
+    bytes_in = min(trafego.bytes_recebidos, limite - bytes_out)
+    traffic_counter.add(sessao_id, bytes_in=bytes_in, bytes_out=bytes_out)
+    return {"message": "Traffic recorded"}
 
 @app.get("/sessao/{sessao_id}/files")
 async def list_session_files(
     sessao_id: int,
     current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Listar arquivos da sessão"""
-    sessao = db.query(SessaoRemota).filter(SessaoRemota.id == sessao_id).first()
-    if not sessao or current_user.id not in [sessao.analista_id, sessao.cliente_id]:
+    roster = session_roster.get(sessao_id, db)
+    if not roster or not roster.is_member(current_user.id):
         raise HTTPException(status_code=403, detail="Access denied")
     
     files = file_manager.list_session_files(sessao_id)
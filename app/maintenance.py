@@ -0,0 +1,249 @@
+"""
+Agendador de manutenção: varreduras periódicas do estado que expira.
+
+Todas as tarefas são sobre o banco (códigos de acesso e permissões por sessão também ficam
+lá, compartilhados entre workers) e rodam só no worker que detém o lock de líder; o registro
+aceita leader_only=False para tarefas sobre a memória do processo.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import exists, text
+
+from .access_codes import purge_expired_codes
+from .analytics import catch_up as catch_up_statistics
+from .archive import archive_sessions
+from .audit import purge_old_events
+from .database import SessionLocal, engine
+from .metrics import MAINTENANCE_JOB_SECONDS, MAINTENANCE_ROWS
+from .models import EmailConfirmation, PermissaoSessao, SessaoRemota
+from .session_liveness import SessionLivenessTracker, session_liveness
+
+try:
+    import fcntl
+except Exception:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "true").lower() in ("1", "true", "yes")
+MAINTENANCE_CHUNK_SIZE = int(os.getenv("MAINTENANCE_CHUNK_SIZE", "1000"))
+MAINTENANCE_JITTER = float(os.getenv("MAINTENANCE_JITTER", "0.1"))
+MAINTENANCE_LOCK_PATH = os.getenv("MAINTENANCE_LOCK_PATH", os.path.join("logs", "maintenance.lock"))
+# Chave do pg_advisory_lock (qualquer inteiro fixo, único na aplicação)
+MAINTENANCE_LOCK_KEY = 0x435352
+# Confirmações de email expiradas/usadas são mantidas alguns dias para suporte
+EMAIL_CONFIRMATION_RETENTION_DAYS = int(os.getenv("EMAIL_CONFIRMATION_RETENTION_DAYS", "7"))
+# Última linha de defesa: sessão aberta há mais tempo que isso é encerrada
+STALE_SESSION_MAX_HOURS = float(os.getenv("STALE_SESSION_MAX_HOURS", "12"))
+
+def _chunked(db, query_ids: Callable, apply: Callable, chunk_size: int = MAINTENANCE_CHUNK_SIZE) -> int:
+    """Processar em lotes curtos, com commit por lote (nenhum lock longo)"""
+    total = 0
+    while True:
+        ids = [row[0] for row in query_ids().limit(chunk_size).all()]
+        if not ids:
+            return total
+        apply(ids)
+        db.commit()
+        total += len(ids)
+
+def sweep_email_confirmations(db, retention_days: int = EMAIL_CONFIRMATION_RETENTION_DAYS) -> int:
+    """Remover tokens de confirmação expirados ou já usados"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    return _chunked(
+        db,
+        lambda: db.query(EmailConfirmation.id).filter(
+            (EmailConfirmation.expira_em < cutoff)
+            | ((EmailConfirmation.confirmado == True) & (EmailConfirmation.criado_em < cutoff))  # noqa: E712
+        ),
+        lambda ids: db.query(EmailConfirmation).filter(EmailConfirmation.id.in_(ids)).delete(synchronize_session=False)
+    )
+
+def sweep_stale_sessions(db, max_hours: float = STALE_SESSION_MAX_HOURS,
+                         tracker: Optional[SessionLivenessTracker] = None) -> int:
+    """Encerrar sessões que ficaram abertas além do limite (peers sumiram sem encerrar)
+
+    O encerramento passa pelo session_liveness: mantém as sessões com peers em algum worker
+    e dispara o mesmo hook (roster, notificação, auditoria, estatísticas).
+    """
+    tracker = tracker or session_liveness
+    cutoff = datetime.utcnow() - timedelta(hours=max_hours)
+    total = 0
+    last_id = 0
+    while True:
+        # Paginação por id: sessões mantidas abertas continuam casando com o filtro
+        ids = [
+            row[0] for row in db.query(SessaoRemota.id)
+            .filter(SessaoRemota.termino.is_(None), SessaoRemota.inicio < cutoff, SessaoRemota.id > last_id)
+            .order_by(SessaoRemota.id)
+            .limit(MAINTENANCE_CHUNK_SIZE)
+        ]
+        if not ids:
+            return total
+        last_id = ids[-1]
+        total += tracker.close_sessions(ids)
+
+def sweep_session_permissions(db) -> int:
+    """Descartar permissões de sessões encerradas (ou já arquivadas)"""
+    aberta = exists().where(SessaoRemota.id == PermissaoSessao.sessao_id, SessaoRemota.termino.is_(None))
+    removidas = db.query(PermissaoSessao).filter(~aberta).delete(synchronize_session=False)
+    db.commit()
+    return removidas
+
+class LeaderLock:
+    """Lock entre workers: pg_try_advisory_lock no PostgreSQL, flock em arquivo nos demais"""
+
+    def __init__(self, lock_path: str = MAINTENANCE_LOCK_PATH):
+        self.lock_path = lock_path
+        self._conn = None
+        self._file = None
+        self._single_worker = False
+        # As tarefas rodam em threads diferentes e podem tentar adquirir ao mesmo tempo
+        self._mutex = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._conn is not None or self._file is not None or self._single_worker
+
+    def try_acquire(self) -> bool:
+        with self._mutex:
+            if self.held:
+                return self._still_held()
+            if engine.dialect.name == "postgresql":
+                return self._acquire_advisory()
+            if fcntl is None:
+                # Sem flock (Windows): execução com um único worker, sempre líder
+                self._single_worker = True
+                return True
+            return self._acquire_file()
+
+    def _acquire_advisory(self) -> bool:
+        # AUTOCOMMIT: a conexão fica aberta sem deixar uma transação pendente
+        conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        if conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": MAINTENANCE_LOCK_KEY}).scalar():
+            # Lock de sessão: mantido enquanto esta conexão estiver aberta
+            self._conn = conn
+            return True
+        conn.close()
+        return False
+
+    def _acquire_file(self) -> bool:
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        f = open(self.lock_path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        # Liberado pelo sistema operacional se o processo morrer
+        self._file = f
+        return True
+
+    def _still_held(self) -> bool:
+        if self._conn is None:
+            return True
+        try:
+            self._conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            # Conexão caiu: o PostgreSQL já liberou o lock, outro worker pode assumir
+            self._release()
+            return False
+
+    def _release(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._single_worker = False
+
+    def release(self):
+        with self._mutex:
+            self._release()
+
+@dataclass
+class MaintenanceJob:
+    name: str
+    func: Callable
+    interval: float
+    leader_only: bool = True
+    uses_db: bool = True
+
+class MaintenanceScheduler:
+    def __init__(self, session_factory=SessionLocal, lock: Optional[LeaderLock] = None):
+        self.session_factory = session_factory
+        self.lock = lock or LeaderLock()
+        self.jobs: Dict[str, MaintenanceJob] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, name: str, func: Callable, interval: float, leader_only: bool = True, uses_db: bool = True):
+        self.jobs[name] = MaintenanceJob(name, func, interval, leader_only, uses_db)
+
+    def run_job(self, job: MaintenanceJob) -> Optional[int]:
+        """Executar uma vez (em thread); retorna itens afetados, ou None se não for o líder"""
+        start = None
+        db = None
+        try:
+            # Dentro do try: uma falha ao conectar para o lock não pode derrubar a tarefa
+            if job.leader_only and not self.lock.try_acquire():
+                return None
+            start = time.perf_counter()
+            db = self.session_factory() if job.uses_db else None
+            affected = job.func(db) if job.uses_db else job.func()
+            if affected:
+                MAINTENANCE_ROWS.labels(job.name).inc(affected)
+                logger.info(f"Maintenance job {job.name} affected {affected} items")
+            return affected
+        except Exception as e:
+            if db is not None:
+                db.rollback()
+            logger.error(f"Maintenance job {job.name} failed: {e}")
+            return 0
+        finally:
+            if db is not None:
+                db.close()
+            if start is not None:
+                MAINTENANCE_JOB_SECONDS.labels(job.name).observe(time.perf_counter() - start)
+
+    async def _loop(self, job: MaintenanceJob):
+        # Primeira execução espalhada no intervalo: workers não disparam todos juntos
+        await asyncio.sleep(job.interval * random.random())
+        while True:
+            try:
+                await asyncio.to_thread(self.run_job, job)
+            except Exception as e:
+                logger.error(f"Maintenance job {job.name} crashed: {e}")
+            await asyncio.sleep(job.interval * random.uniform(1 - MAINTENANCE_JITTER, 1 + MAINTENANCE_JITTER))
+
+    def start(self):
+        if self._tasks or not MAINTENANCE_ENABLED:
+            return
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self.lock.release()
+
+maintenance_scheduler = MaintenanceScheduler()
+maintenance_scheduler.register("access_codes", purge_expired_codes, interval=60)
+maintenance_scheduler.register("session_permissions", sweep_session_permissions, interval=300)
+maintenance_scheduler.register("email_confirmations", sweep_email_confirmations, interval=3600)
+maintenance_scheduler.register("stale_sessions", sweep_stale_sessions, interval=900)
+maintenance_scheduler.register("audit_retention", purge_old_events, interval=6 * 3600)
+maintenance_scheduler.register("session_statistics", catch_up_statistics, interval=6 * 3600)
+maintenance_scheduler.register("archive_sessions", archive_sessions, interval=24 * 3600)
@@ -0,0 +1,152 @@
+"""
+Métricas no formato Prometheus (/metrics).
+
+Com vários workers, defina PROMETHEUS_MULTIPROC_DIR (diretório vazio, compartilhado
+pelos processos) antes de iniciar: cada worker grava seus valores em arquivos mmap e
+a exposição agrega todos eles.
+"""
+import os
+import time
+from typing import Optional
+
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+    )
+except Exception:
+    Counter = Gauge = Histogram = None
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_ENABLED = Counter is not None
+
+class _NoopMetric:
+    """Substituto quando prometheus_client não está instalado"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+def _metric(kind, name: str, documentation: str, labelnames=(), **kwargs):
+    if kind is None:
+        return _NoopMetric()
+    return kind(name, documentation, labelnames, **kwargs)
+
+# Latências curtas (rotas, banco, bcrypt): buckets em segundos
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_SECONDS = _metric(
+    Histogram, "csremote_http_request_duration_seconds", "Latência das requisições HTTP por rota",
+    ("method", "route", "status"), buckets=LATENCY_BUCKETS
+)
+WEBSOCKET_CONNECTIONS = _metric(
+    Gauge, "csremote_websocket_connections", "Conexões WebSocket ativas", ("canal",), multiprocess_mode="livesum"
+)
+BROADCAST_SECONDS = _metric(
+    Histogram, "csremote_broadcast_duration_seconds", "Tempo de fan-out de mensagens", ("canal",),
+    buckets=LATENCY_BUCKETS
+)
+DB_QUERY_SECONDS = _metric(
+    Histogram, "csremote_db_query_duration_seconds", "Duração das consultas ao banco", buckets=LATENCY_BUCKETS
+)
+PASSWORD_HASH_SECONDS = _metric(
+    Histogram, "csremote_password_hash_duration_seconds", "Tempo gasto com bcrypt", ("operacao",),
+    buckets=LATENCY_BUCKETS
+)
+UPLOAD_BYTES = _metric(Counter, "csremote_upload_bytes", "Bytes recebidos em uploads")
+UPLOAD_SECONDS = _metric(
+    Histogram, "csremote_upload_duration_seconds", "Duração dos uploads", buckets=LATENCY_BUCKETS
+)
+ACCESS_CODES_STORED = _metric(
+    Gauge, "csremote_access_codes_stored", "Códigos de acesso no banco (medido pela varredura)", multiprocess_mode="max"
+)
+MAINTENANCE_JOB_SECONDS = _metric(
+    Histogram, "csremote_maintenance_job_duration_seconds", "Duração das tarefas de manutenção", ("job",),
+    buckets=LATENCY_BUCKETS
+)
+MAINTENANCE_ROWS = _metric(
+    Counter, "csremote_maintenance_items", "Itens removidos/encerrados pelas tarefas de manutenção", ("job",)
+)
+REPLICA_READS = _metric(
+    Counter, "csremote_replica_reads", "Leituras roteáveis por destino (réplica ou primário e motivo)", ("destino",)
+)
+REPLICA_LAG_SECONDS = _metric(
+    Gauge, "csremote_replica_lag_seconds", "Último atraso de replicação medido", multiprocess_mode="max"
+)
+
+# Filhos com labels fixos resolvidos uma única vez (evita lookup por chamada)
+CHAT_CONNECTIONS = WEBSOCKET_CONNECTIONS.labels("chat")
+SIGNALING_CONNECTIONS = WEBSOCKET_CONNECTIONS.labels("signaling")
+NOTIFICATION_CONNECTIONS = WEBSOCKET_CONNECTIONS.labels("notificacoes")
+CHAT_BROADCAST_SECONDS = BROADCAST_SECONDS.labels("chat")
+NOTIFICATION_BROADCAST_SECONDS = BROADCAST_SECONDS.labels("notificacoes")
+BCRYPT_HASH_SECONDS = PASSWORD_HASH_SECONDS.labels("hash")
+BCRYPT_VERIFY_SECONDS = PASSWORD_HASH_SECONDS.labels("verify")
+
+class MetricsMiddleware:
+    """Middleware ASGI puro: mede apenas requisições HTTP, WebSockets passam direto"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Rota (template) em vez do path, para não explodir a cardinalidade
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], route.path if route is not None else "unmatched", str(status_code)
+            ).observe(time.perf_counter() - start)
+
+def instrument_engine(engine):
+    """Medir a duração de cada consulta executada pelo engine"""
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_SECONDS.observe(time.perf_counter() - context._query_start)
+
+def render_metrics() -> Optional[tuple]:
+    """Retorna (conteúdo, content-type) ou None se as métricas estiverem indisponíveis"""
+    if not METRICS_ENABLED:
+        return None
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: Optional[int] = None):
+    """Liberar os arquivos de gauges 'live' de um worker (padrão: este) ao encerrar"""
+    if METRICS_ENABLED and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, BigInteger, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Float, Text, BigInteger, ForeignKey, Index, UniqueConstraint, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -25,6 +25,18 @@ class Usuario(Base):
     sessoes_como_cliente = relationship("SessaoRemota", foreign_keys="SessaoRemota.cliente_id", back_populates="cliente")
     mensagens = relationship("MensagemChat", back_populates="usuario")
 
+    __table_args__ = (
+        # Busca por prefixo em /admin/usuarios (text_pattern_ops: LIKE 'abc%' usa o índice no PostgreSQL)
+        Index("ix_usuarios_email_lower", func.lower(email).label("email_lower"),
+              postgresql_ops={"email_lower": "text_pattern_ops"}),
+        Index("ix_usuarios_nome_lower", func.lower(nome).label("nome_lower"),
+              postgresql_ops={"nome_lower": "text_pattern_ops"}),
+        Index("ix_usuarios_cnpj", cnpj, postgresql_ops={"cnpj": "text_pattern_ops"}),
+        # Filtros combinados com a paginação por id
+        Index("ix_usuarios_tipo_usuario_id", tipo_usuario, id),
+        Index("ix_usuarios_empresa_id", empresa, id),
+    )
+
 class SessaoRemota(Base):
     __tablename__ = "sessoes_remotas"
     
@@ -42,6 +54,11 @@ class SessaoRemota(Base):
     cliente = relationship("Usuario", foreign_keys=[cliente_id], back_populates="sessoes_como_cliente")
     mensagens = relationship("MensagemChat", back_populates="sessao")
 
+    __table_args__ = (
+        # Recalcular estatísticas por intervalo de dias
+        Index("ix_sessoes_remotas_inicio", "inicio"),
+    )
+
 class MensagemChat(Base):
     __tablename__ = "mensagens_chat"
     
@@ -55,6 +72,10 @@ class MensagemChat(Base):
     sessao = relationship("SessaoRemota", back_populates="mensagens")
     usuario = relationship("Usuario", back_populates="mensagens")
 
+    __table_args__ = (
+        Index("ix_mensagens_chat_sessao_id_id", "sessao_id", "id"),
+    )
+
 
 class EmailConfirmation(Base):
     __tablename__ = "email_confirmations"
@@ -66,4 +87,130 @@ class EmailConfirmation(Base):
     expira_em = Column(DateTime, nullable=False)
     confirmado = Column(Boolean, default=False)
 
-    usuario = relationship("Usuario")
\ No newline at end of file
+    usuario = relationship("Usuario")
+
+
+class Auditoria(Base):
+    __tablename__ = "auditoria"
+
+    id = Column(Integer, primary_key=True)
+    criado_em = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    usuario_id = Column(Integer, nullable=True)
+    sessao_id = Column(Integer, nullable=True)
+    acao = Column(String(64), nullable=False)
+    detalhes = Column(Text)
+
+    # Sem FKs: o registro de auditoria sobrevive à remoção de usuários/sessões
+    __table_args__ = (
+        Index("ix_auditoria_usuario_id_id", "usuario_id", "id"),
+        Index("ix_auditoria_sessao_id_id", "sessao_id", "id"),
+        Index("ix_auditoria_acao_id", "acao", "id"),
+    )
+
+
+class EmailPendente(Base):
+    __tablename__ = "emails_pendentes"
+
+    id = Column(Integer, primary_key=True)
+    destinatario = Column(String(255), nullable=False)
+    assunto = Column(String(255), nullable=False)
+    corpo = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pendente")  # pendente, enviando, enviado, falhou
+    tentativas = Column(Integer, nullable=False, default=0)
+    proxima_tentativa = Column(DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_erro = Column(Text)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    enviado_em = Column(DateTime, nullable=True)
+
+    # Fila: WHERE status IN (...) AND proxima_tentativa <= agora ORDER BY proxima_tentativa
+    __table_args__ = (
+        Index("ix_emails_pendentes_status_proxima", "status", "proxima_tentativa"),
+    )
+
+
+class EstatisticaSessao(Base):
+    """Agregado diário por analista e empresa do cliente (dia = data UTC do início da sessão)"""
+    __tablename__ = "estatisticas_sessoes"
+
+    id = Column(Integer, primary_key=True)
+    dia = Column(Date, nullable=False)
+    analista_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    empresa = Column(String(200), nullable=False, default="")
+    sessoes = Column(Integer, nullable=False, default=0)
+    duracao_total_segundos = Column(Float, nullable=False, default=0)
+    duracao_max_segundos = Column(Float, nullable=False, default=0)
+    # Contagens por faixa de duração (JSON): somáveis entre linhas para calcular percentis
+    histograma_duracao = Column(Text, nullable=False)
+    trafego_bytes = Column(BigInteger, nullable=False, default=0)
+    mensagens = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("dia", "analista_id", "empresa", name="uq_estatisticas_sessoes_grupo"),
+        Index("ix_estatisticas_sessoes_analista_dia", "analista_id", "dia"),
+    )
+
+
+class SessaoArquivada(Base):
+    """Sessão movida para o arquivo; as mensagens ficam no segmento comprimido indicado"""
+    __tablename__ = "sessoes_arquivadas"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # mesmo id de sessoes_remotas
+    analista_id = Column(Integer, nullable=False)
+    cliente_id = Column(Integer, nullable=False)
+    codigo_acesso = Column(String(10), nullable=False)
+    maquina_cliente = Column(String(255))
+    inicio = Column(DateTime)
+    termino = Column(DateTime)
+    trafego_bytes = Column(BigInteger, default=0)
+    mensagens = Column(Integer, nullable=False, default=0)
+    segmento = Column(String(255), nullable=False)
+    arquivada_em = Column(DateTime, default=datetime.utcnow)
+
+    # Sem FKs, como auditoria: o arquivo sobrevive à remoção de usuários
+    __table_args__ = (
+        Index("ix_sessoes_arquivadas_analista_id", "analista_id", "id"),
+        Index("ix_sessoes_arquivadas_cliente_id", "cliente_id", "id"),
+    )
+
+
+class ConexaoSessao(Base):
+    """Peers conectados a uma sessão em cada worker, publicados periodicamente pelo session_liveness"""
+    __tablename__ = "conexoes_sessoes"
+
+    worker_id = Column(String(64), primary_key=True)
+    sessao_id = Column(Integer, primary_key=True)
+    conexoes = Column(Integer, nullable=False)
+    ultima_atividade = Column(DateTime, nullable=False)
+    # Linhas de um worker que morreu param de ser renovadas e deixam de contar
+    heartbeat_em = Column(DateTime, nullable=False)
+
+    # Sem FKs: estado efêmero, não deve bloquear o arquivamento de sessões
+    __table_args__ = (
+        Index("ix_conexoes_sessoes_sessao_id", "sessao_id", "heartbeat_em"),
+    )
+
+
+class CodigoAcessoTemporario(Base):
+    """Código de acesso gerado pelo cliente; no banco para valer em qualquer worker"""
+    __tablename__ = "codigos_acesso"
+
+    codigo = Column(String(10), primary_key=True)
+    cliente_id = Column(Integer, nullable=False)
+    expira_em = Column(DateTime, nullable=False)
+    usado = Column(Boolean, nullable=False, default=False)
+
+    # Sem FKs: estado efêmero, removido pela varredura de manutenção
+    __table_args__ = (
+        Index("ix_codigos_acesso_expira_em", "expira_em"),
+        Index("ix_codigos_acesso_cliente_id", "cliente_id"),
+    )
+
+
+class PermissaoSessao(Base):
+    """Permissão concedida a um usuário numa sessão, além das permissões do seu papel"""
+    __tablename__ = "permissoes_sessao"
+
+    sessao_id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, primary_key=True)
+    permissao = Column(String(32), primary_key=True)
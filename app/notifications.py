@@ -1,51 +1,150 @@
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
+import asyncio
 import json
+import logging
+import os
+import time
 from datetime import datetime
 from fastapi import WebSocket
 
+from .metrics import NOTIFICATION_CONNECTIONS, NOTIFICATION_BROADCAST_SECONDS
+from .optional import optional_import
+
+logger = logging.getLogger(__name__)
+
+# Canal Redis usado para distribuir notificações entre workers
+NOTIFICATION_CHANNEL = os.getenv("NOTIFICATION_CHANNEL", "csremote:notificacoes")
+# Backoff da reassinatura quando a conexão com o Redis cai
+NOTIFICATION_RECONNECT_MAX_SECONDS = float(os.getenv("NOTIFICATION_RECONNECT_MAX_SECONDS", "30"))
+
 class NotificationManager:
-    def __init__(self):
+    def __init__(self, redis_url: Optional[str] = None):
         self.user_connections: Dict[int, List[WebSocket]] = {}
-    
-    async def connect_user(self, user_id: int, websocket: WebSocket):
+        self.redis_url = redis_url
+        self._client = None
+        # Só definido enquanto o canal está assinado: publish usa o Redis apenas nesse caso
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Iniciar assinatura do canal entre workers (se Redis configurado)"""
+        if not self.redis_url or self._listener:
+            return
+        # Só importado com REDIS_URL configurado
+        aioredis = optional_import("redis.asyncio")
+        if aioredis is None:
+            logger.warning("REDIS_URL is set but the redis package is not installed, using local delivery")
+            return
+        self._client = aioredis.from_url(self.redis_url)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Encerrar assinatura do canal"""
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        self._redis = None
+        if self._client:
+            await self._client.close()
+            self._client = None
+
+    async def _listen(self):
+        """Receber notificações publicadas por qualquer worker e entregar localmente
+
+        Se a assinatura cair (Redis reiniciado, conexão resetada), reassina com backoff;
+        enquanto isso publish entrega só às conexões deste worker.
+        """
+        delay = 1.0
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(NOTIFICATION_CHANNEL)
+                self._redis = self._client
+                delay = 1.0
+                logger.info("Subscribed to notification channel")
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        envelope = json.loads(item["data"])
+                        await self._deliver_local(envelope["user_ids"], envelope["message"])
+                    except Exception as e:
+                        logger.error(f"Invalid notification envelope: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification subscription lost, using local delivery until it is back: {e}")
+            finally:
+                self._redis = None
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, NOTIFICATION_RECONNECT_MAX_SECONDS)
+
+    async def connect_user(self, user_id: int, websocket: WebSocket, subprotocol: Optional[str] = None):
         """Conectar usuário para receber notificações"""
-        await websocket.accept()
-        
+        await websocket.accept(subprotocol=subprotocol)
+
         if user_id not in self.user_connections:
             self.user_connections[user_id] = []
-        
+
         self.user_connections[user_id].append(websocket)
-    
+        NOTIFICATION_CONNECTIONS.inc()
+
     def disconnect_user(self, user_id: int, websocket: WebSocket):
         """Desconectar usuário"""
         if user_id in self.user_connections:
-            self.user_connections[user_id].remove(websocket)
+            if websocket in self.user_connections[user_id]:
+                self.user_connections[user_id].remove(websocket)
+                NOTIFICATION_CONNECTIONS.dec()
             if not self.user_connections[user_id]:
                 del self.user_connections[user_id]
-    
-    async def notify_user(self, user_id: int, notification: dict):
-        """Enviar notificação para usuário específico"""
-        if user_id in self.user_connections:
-            message = json.dumps({
-                "type": "notification",
-                "timestamp": datetime.utcnow().isoformat(),
-                **notification
-            })
-            
+
+    async def _deliver_local(self, user_ids: Iterable[int], message: str):
+        """Entregar mensagem já serializada às conexões deste worker"""
+        start = time.perf_counter()
+        for user_id in user_ids:
             disconnected = []
-            for websocket in self.user_connections[user_id]:
+            for websocket in self.user_connections.get(user_id, []):
                 try:
                     await websocket.send_text(message)
                 except:
                     disconnected.append(websocket)
-            
+
             # Remover conexões mortas
             for ws in disconnected:
-                self.user_connections[user_id].remove(ws)
-    
+                self.disconnect_user(user_id, ws)
+        NOTIFICATION_BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+    async def publish(self, user_ids: Iterable[int], notification: dict):
+        """Serializar uma vez e distribuir para todos os workers"""
+        user_ids = list(dict.fromkeys(user_ids))
+        message = json.dumps({
+            "type": "notification",
+            "timestamp": datetime.utcnow().isoformat(),
+            **notification
+        }, default=str)
+
+        if self._redis:
+            try:
+                await self._redis.publish(NOTIFICATION_CHANNEL, json.dumps({
+                    "user_ids": user_ids,
+                    "message": message
+                }))
+                return
+            except Exception as e:
+                logger.error(f"Error publishing notification, delivering locally: {e}")
+
+        await self._deliver_local(user_ids, message)
+
+    async def notify_user(self, user_id: int, notification: dict):
+        """Enviar notificação para usuário específico"""
+        await self.publish([user_id], notification)
+
     async def notify_session_users(self, analyst_id: int, client_id: int, notification: dict):
         """Notificar usuários de uma sessão"""
-        await self.notify_user(analyst_id, notification)
-        await self.notify_user(client_id, notification)
+        await self.publish([analyst_id, client_id], notification)
 
-notification_manager = NotificationManager()
+notification_manager = NotificationManager(os.getenv("REDIS_URL"))
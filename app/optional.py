@@ -0,0 +1,23 @@
+"""
+Dependências opcionais pesadas (boto3, redis) carregadas no primeiro uso.
+
+Importar no topo do módulo custava centenas de ms em cada worker na inicialização, mesmo
+quando o recurso nem está configurado. Use is_installed para decidir sem importar.
+"""
+from functools import lru_cache
+from types import ModuleType
+from typing import Optional
+import importlib
+import importlib.util
+
+def is_installed(name: str) -> bool:
+    """Pacote disponível? (find_spec do pacote raiz não executa o import)"""
+    return importlib.util.find_spec(name.split(".")[0]) is not None
+
+@lru_cache(maxsize=None)
+def optional_import(name: str) -> Optional[ModuleType]:
+    """Importar sob demanda; None se o pacote não estiver instalado ou falhar ao importar"""
+    try:
+        return importlib.import_module(name)
+    except Exception:
+        return None
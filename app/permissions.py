@@ -1,6 +1,10 @@
 from enum import Enum
 from typing import Dict, Set
 
+from sqlalchemy.orm import Session
+
+from .models import PermissaoSessao
+
 class Permission(Enum):
     VIEW_SCREEN = "view_screen"
     CONTROL_MOUSE = "control_mouse"
@@ -33,9 +37,7 @@ class PermissionManager:
                 Permission.ADMIN_PANEL
             }
         }
-        
-        # Permissões específicas por sessão
-        self.session_permissions: Dict[int, Dict[int, Set[Permission]]] = {}
+        # Permissões específicas por sessão ficam em permissoes_sessao (compartilhadas entre workers)
     
     def get_user_permissions(self, user_type: str, is_admin: bool = False) -> Set[Permission]:
         """Obter permissões base do usuário"""
@@ -43,28 +45,33 @@ class PermissionManager:
             return self.default_permissions["admin"]
         return self.default_permissions.get(user_type, set())
     
-    def set_session_permission(self, session_id: int, user_id: int, permission: Permission, granted: bool):
-        """Conceder/revogar permissão específica para sessão"""
-        if session_id not in self.session_permissions:
-            self.session_permissions[session_id] = {}
-        
-        if user_id not in self.session_permissions[session_id]:
-            self.session_permissions[session_id][user_id] = set()
-        
+    def _grant(self, db: Session, session_id: int, user_id: int, permission: Permission):
+        return db.query(PermissaoSessao).filter(
+            PermissaoSessao.sessao_id == session_id,
+            PermissaoSessao.usuario_id == user_id,
+            PermissaoSessao.permissao == permission.value
+        )
+
+    def set_session_permission(self, db: Session, session_id: int, user_id: int, permission: Permission, granted: bool):
+        """Conceder/revogar permissão específica para sessão (efetivado no commit da transação)"""
         if granted:
-            self.session_permissions[session_id][user_id].add(permission)
+            if self._grant(db, session_id, user_id, permission).first() is None:
+                db.add(PermissaoSessao(sessao_id=session_id, usuario_id=user_id, permissao=permission.value))
         else:
-            self.session_permissions[session_id][user_id].discard(permission)
+            self._grant(db, session_id, user_id, permission).delete(synchronize_session=False)
     
-    def has_permission(self, user_type: str, user_id: int, session_id: int, 
+    def has_permission(self, db: Session, user_type: str, user_id: int, session_id: int,
                       permission: Permission, is_admin: bool = False) -> bool:
         """Verificar se usuário tem permissão específica"""
-        # Permissões base
-        base_permissions = self.get_user_permissions(user_type, is_admin)
+        # Permissões base (sem consulta ao banco)
+        if permission in self.get_user_permissions(user_type, is_admin):
+            return True
         
         # Permissões específicas da sessão
-        session_perms = self.session_permissions.get(session_id, {}).get(user_id, set())
-        
-        return permission in base_permissions or permission in session_perms
+        return self._grant(db, session_id, user_id, permission).first() is not None
+
+    def clear_session(self, db: Session, session_id: int):
+        """Descartar permissões de uma sessão encerrada"""
+        db.query(PermissaoSessao).filter(PermissaoSessao.sessao_id == session_id).delete(synchronize_session=False)
 
 permission_manager = PermissionManager()
\ No newline at end of file
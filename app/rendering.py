@@ -0,0 +1,69 @@
+"""
+Renderização de templates: compilação na inicialização (com cache de bytecode em disco,
+compartilhado entre workers), páginas estáticas em memória com ETag/304 e streaming.
+"""
+import hashlib
+import os
+import tempfile
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "csremote_jinja_cache"))
+# Em desenvolvimento (--reload) manter a checagem de alteração dos arquivos
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+
+# Páginas que só dependem de 'request' (que nenhuma delas usa): renderizadas uma vez
+STATIC_PAGES = ("index.html", "login.html", "cadastro.html")
+
+class TemplateRenderer:
+    def __init__(self, directory: str):
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        self.templates = Jinja2Templates(
+            directory=directory,
+            bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+            auto_reload=TEMPLATES_AUTO_RELOAD,
+        )
+        self.env = self.templates.env
+        self._pages: Dict[str, Tuple[bytes, str]] = {}
+
+    def precompile(self):
+        """Compilar todos os templates (ou carregar o bytecode) antes da primeira requisição"""
+        for name in self.env.list_templates(extensions=["html"]):
+            self.env.get_template(name)
+        self._pages.clear()
+        for name in STATIC_PAGES:
+            self._render_page(name)
+
+    def _render_page(self, name: str) -> Tuple[bytes, str]:
+        body = self.env.get_template(name).render().encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self._pages[name] = (body, etag)
+        return body, etag
+
+    def static_page(self, request: Request, name: str) -> Response:
+        """Página estática servida da memória; 304 quando o navegador já tem a versão atual"""
+        page = self._pages.get(name)
+        if page is None or TEMPLATES_AUTO_RELOAD:
+            page = self._render_page(name)
+        body, etag = page
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(content=body, headers=headers)
+
+    def stream(self, name: str, context: dict, status_code: int = 200) -> StreamingResponse:
+        """Enviar o HTML em partes à medida que é gerado (templates grandes)"""
+        return StreamingResponse(
+            self.env.get_template(name).generate(context),
+            status_code=status_code,
+            media_type="text/html; charset=utf-8"
+        )
+
+    def TemplateResponse(self, name: str, context: dict, status_code: int = 200,
+                         headers: Optional[dict] = None) -> Response:
+        return self.templates.TemplateResponse(name, context, status_code=status_code, headers=headers)
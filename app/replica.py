@@ -0,0 +1,179 @@
+"""
+Roteamento de leituras pesadas para a réplica (DATABASE_READ_URL).
+
+A réplica só é usada enquanto responde e o atraso de replicação medido fica abaixo de
+REPLICA_MAX_LAG_SECONDS; caso contrário as leituras voltam ao primário. Quem acabou de
+escrever lê do primário por READ_YOUR_WRITES_SECONDS (cookie, vale entre workers).
+
+Para testar localmente, aponte DATABASE_READ_URL para uma segunda instância: uma réplica
+física do PostgreSQL, ou, só para exercitar o roteamento, uma cópia do arquivo SQLite.
+"""
+from dataclasses import dataclass
+from typing import Optional
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from fastapi import Depends
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from starlette.requests import cookie_parser
+
+from .database import ReadSessionLocal, get_db, read_engine
+from .metrics import REPLICA_LAG_SECONDS, REPLICA_READS
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+# Nunca menor que o atraso tolerado: depois da janela a réplica já tem a escrita
+READ_YOUR_WRITES_SECONDS = max(float(os.getenv("READ_YOUR_WRITES_SECONDS", "10")), REPLICA_MAX_LAG_SECONDS)
+READ_YOUR_WRITES_COOKIE = "csremote_rw"
+
+# Réplica em dia (WAL recebido == aplicado) tem atraso zero mesmo sem escrita recente no primário
+PG_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+@dataclass
+class _RequestWrites:
+    wrote: bool = False
+    primary_until: float = 0.0
+
+_request_writes: contextvars.ContextVar[Optional[_RequestWrites]] = contextvars.ContextVar(
+    "request_writes", default=None
+)
+
+def _mark_write():
+    # Objeto mutável: a marcação feita no threadpool é vista pelo middleware
+    state = _request_writes.get()
+    if state is not None:
+        state.wrote = True
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    _mark_write()
+
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(orm_execute_state):
+    # query.update()/delete() e insert() em lote não passam pelo flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+class ReplicaRouter:
+    def __init__(self, session_factory=ReadSessionLocal, engine=read_engine,
+                 max_lag: float = REPLICA_MAX_LAG_SECONDS, check_interval: float = REPLICA_LAG_CHECK_SECONDS):
+        self.session_factory = session_factory
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag: Optional[float] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.session_factory is not None
+
+    def measure_lag(self) -> Optional[float]:
+        """Atraso de replicação em segundos; None se a réplica não responder"""
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name != "postgresql":
+                    conn.execute(text("SELECT 1"))
+                    return 0.0
+                return float(conn.execute(PG_LAG_SQL).scalar() or 0.0)
+        except Exception as e:
+            logger.warning(f"Read replica unavailable: {e}")
+            return None
+
+    def lag(self) -> Optional[float]:
+        """Último atraso medido; remede no máximo a cada check_interval (uma thread por vez)"""
+        if time.monotonic() - self._checked_at >= self.check_interval and self._lock.acquire(blocking=False):
+            try:
+                self._lag = self.measure_lag()
+                self._checked_at = time.monotonic()
+                if self._lag is not None:
+                    REPLICA_LAG_SECONDS.set(self._lag)
+            finally:
+                self._lock.release()
+        return self._lag
+
+    def mark_unavailable(self):
+        """Erro de conexão durante uma leitura: usar o primário até a próxima medição"""
+        self._lag = None
+        self._checked_at = time.monotonic()
+
+    def use_replica(self) -> bool:
+        if not self.enabled:
+            return False
+        state = _request_writes.get()
+        if state is not None and (state.wrote or state.primary_until > time.time()):
+            REPLICA_READS.labels("primario_leitura_propria").inc()
+            return False
+        lag = self.lag()
+        if lag is None or lag > self.max_lag:
+            REPLICA_READS.labels("primario_atraso").inc()
+            return False
+        REPLICA_READS.labels("replica").inc()
+        return True
+
+replica_router = ReplicaRouter()
+
+def get_read_db(db: Session = Depends(get_db)):
+    """Sessão para consultas pesadas: réplica se disponível, senão a sessão do primário"""
+    router = replica_router
+    if not router.use_replica():
+        yield db
+        return
+    read_db = router.session_factory()
+    try:
+        yield read_db
+    except OperationalError:
+        router.mark_unavailable()
+        raise
+    finally:
+        read_db.close()
+
+class ReadYourWritesMiddleware:
+    """Middleware ASGI puro: requisição que escreveu marca o cliente para ler do primário"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = _RequestWrites()
+        for name, value in scope.get("headers", []):
+            if name == b"cookie":
+                try:
+                    state.primary_until = float(cookie_parser(value.decode("latin-1")).get(READ_YOUR_WRITES_COOKIE, 0))
+                except ValueError:
+                    pass
+                break
+        token = _request_writes.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state.wrote and replica_router.enabled:
+                until = time.time() + READ_YOUR_WRITES_SECONDS
+                cookie = (
+                    f"{READ_YOUR_WRITES_COOKIE}={until:.0f}; Max-Age={READ_YOUR_WRITES_SECONDS:.0f}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_writes.reset(token)
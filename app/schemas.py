@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -39,6 +39,11 @@ class CodigoAcesso(BaseModel):
 class IniciarSessao(BaseModel):
     codigo_acesso: str
 
+class TrafegoMidia(BaseModel):
+    # Deltas desde o último relatório (limite por relatório evita valores absurdos)
+    bytes_enviados: int = Field(0, ge=0, le=10 * 1024 ** 3)
+    bytes_recebidos: int = Field(0, ge=0, le=10 * 1024 ** 3)
+
 class MensagemChatCreate(BaseModel):
     mensagem: str
 
@@ -0,0 +1,36 @@
+"""
+Caminho rápido de serialização para listagens: colunas projetadas direto em tuplas,
+sem objetos ORM nem validação pydantic, codificadas com orjson quando disponível.
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, List, Sequence
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        # Datetimes sem timezone saem como isoformat(), igual ao encoder padrão do FastAPI
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """Resposta JSON sem jsonable_encoder: o conteúdo já deve ser composto de tipos simples"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def rows_to_dicts(keys: Sequence[str], rows: Iterable[tuple]) -> List[dict]:
+    """Linhas de uma consulta por colunas -> dicts com as chaves informadas"""
+    return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,312 @@
+"""
+Launcher de produção (python -m app): um processo supervisor e N workers uvicorn.
+
+Configuração por ambiente:
+  HOST, PORT                  endereço de escuta (0.0.0.0:8000)
+  WEB_CONCURRENCY             workers (padrão: CPUs disponíveis com REDIS_URL; sem ele, 1)
+  APP_PRELOAD                 importar o app no supervisor antes do fork (workers sobem mais
+                              rápido e compartilham memória; SIGHUP não recarrega o código)
+  REUSE_PORT                  um socket por worker com SO_REUSEPORT (o kernel distribui as
+                              conexões); senão, um socket compartilhado criado pelo supervisor
+  GRACEFUL_TIMEOUT            segundos para um worker terminar as requisições em andamento
+  KEEPALIVE_TIMEOUT, BACKLOG, FORWARDED_ALLOW_IPS, LOG_LEVEL
+  MAX_REQUESTS, MAX_REQUESTS_JITTER
+                              reciclar o worker após N requisições (0 = nunca)
+
+Logs: o supervisor é o único processo que grava LOG_DIR (a rotação não é segura entre
+processos); os workers enviam os registros por uma fila herdada no fork. No Windows (sem fork)
+cada worker do uvicorn precisaria do seu próprio LOG_DIR.
+
+Sinais do supervisor: SIGTERM/SIGINT param tudo com graça; SIGHUP reinicia os workers um a
+um (o novo só substitui o antigo depois de pronto); SIGTTIN/SIGTTOU adicionam/removem um worker.
+
+Vários workers: o SO_REUSEPORT não garante que os dois peers de uma sessão caiam no mesmo
+worker, então o estado de sessão é compartilhado. Códigos de acesso, permissões por sessão e
+presença (conexoes_sessoes) ficam no banco; chat, sinalização WebRTC e notificações passam
+pelo Redis pub/sub (app/cluster_bus.py), que exige REDIS_URL. Sem Redis, o launcher sobe um
+worker só e recusa WEB_CONCURRENCY > 1 (peers em workers diferentes não se veriam). Continuam
+por processo apenas caches e buffers (rosters, contadores de tráfego, limite de relatórios de
+mídia), que toleram isso.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from .logging_config import start_shared_listener, stop_shared_listener
+from .optional import is_installed
+
+logger = logging.getLogger("csremote.server")
+
+APP = "app.main:app"
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return default if value is None else value.lower() in ("1", "true", "yes")
+
+def _cpu_count() -> int:
+    # Respeita o conjunto de CPUs do container/cgroup quando disponível
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def shared_state_available() -> bool:
+    """Chat e sinalização entre workers dependem do Redis (ver o docstring)"""
+    return bool(os.getenv("REDIS_URL")) and is_installed("redis")
+
+def max_workers() -> Optional[int]:
+    """Limite de workers: nenhum com estado compartilhado, senão 1"""
+    return None if shared_state_available() else 1
+
+def _default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or (_cpu_count() if shared_state_available() else 1)
+
+@dataclass
+class Settings:
+    host: str = field(default_factory=lambda: os.getenv("HOST", "0.0.0.0"))
+    port: int = field(default_factory=lambda: int(os.getenv("PORT", "8000")))
+    workers: int = field(default_factory=_default_workers)
+    preload: bool = field(default_factory=lambda: _env_bool("APP_PRELOAD", False))
+    reuse_port: bool = field(default_factory=lambda: _env_bool("REUSE_PORT", hasattr(socket, "SO_REUSEPORT")))
+    graceful_timeout: int = field(default_factory=lambda: int(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    keepalive_timeout: int = field(default_factory=lambda: int(os.getenv("KEEPALIVE_TIMEOUT", "5")))
+    backlog: int = field(default_factory=lambda: int(os.getenv("BACKLOG", "2048")))
+    forwarded_allow_ips: str = field(default_factory=lambda: os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"))
+    log_level: str = field(default_factory=lambda: os.getenv("LOG_LEVEL", "info"))
+    max_requests: int = field(default_factory=lambda: int(os.getenv("MAX_REQUESTS", "0")))
+    max_requests_jitter: int = field(default_factory=lambda: int(os.getenv("MAX_REQUESTS_JITTER", "0")))
+    boot_timeout: int = field(default_factory=lambda: int(os.getenv("WORKER_BOOT_TIMEOUT", "60")))
+
+    def uvicorn_config(self, app) -> uvicorn.Config:
+        max_requests = None
+        if self.max_requests:
+            # Jitter: workers não reciclam todos ao mesmo tempo
+            max_requests = self.max_requests + random.randint(0, self.max_requests_jitter)
+        return uvicorn.Config(
+            app,
+            host=self.host,
+            port=self.port,
+            loop="uvloop" if is_installed("uvloop") else "asyncio",
+            http="httptools" if is_installed("httptools") else "h11",
+            ws="websockets",
+            proxy_headers=True,
+            forwarded_allow_ips=self.forwarded_allow_ips,
+            timeout_keep_alive=self.keepalive_timeout,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            limit_max_requests=max_requests,
+            backlog=self.backlog,
+            log_level=self.log_level,
+        )
+
+def create_socket(settings: Settings, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in settings.host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((settings.host, settings.port))
+    sock.listen(settings.backlog)
+    sock.set_inheritable(True)
+    return sock
+
+class WorkerServer(uvicorn.Server):
+    """Servidor uvicorn que avisa o supervisor quando está pronto para receber conexões"""
+
+    def __init__(self, config: uvicorn.Config, ready=None):
+        super().__init__(config)
+        self._ready = ready
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if self.started and self._ready is not None:
+            self._ready.set()
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        # Parar de aceitar e drenar os WebSockets antes que o uvicorn os derrube sem aviso
+        for server in getattr(self, "servers", []):
+            server.close()
+        from .shutdown import shutdown_coordinator
+        await shutdown_coordinator.drain()
+        await super().shutdown(sockets=sockets)
+
+def _run_worker(settings: Settings, app, sock: Optional[socket.socket], ready):
+    # O supervisor trata SIGHUP/SIGTTIN/SIGTTOU; o worker só responde a SIGTERM/SIGINT (uvicorn)
+    for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(sig, signal.SIG_IGN)
+    # Handlers herdados do supervisor engoliriam um SIGTERM recebido antes do uvicorn subir
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    if "app.database" in sys.modules:
+        # Preload: nenhuma conexão do pool do supervisor pode ser reutilizada após o fork
+        from .database import engine, read_engine
+        for eng in (engine, read_engine):
+            if eng is not None:
+                eng.dispose(close=False)
+    if sock is None:
+        sock = create_socket(settings, reuse_port=True)
+    WorkerServer(settings.uvicorn_config(app), ready).run(sockets=[sock])
+
+@dataclass
+class Worker:
+    process: multiprocessing.Process
+    ready: object
+    started_at: float
+
+class Supervisor:
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.workers: List[Worker] = []
+        self._ctx = multiprocessing.get_context("fork")
+        self._signals: List[int] = []
+        self._stopping = False
+        self._socket: Optional[socket.socket] = None
+        self._app = APP
+        self._crashes: List[float] = []
+
+    def spawn(self) -> Worker:
+        ready = self._ctx.Event()
+        process = self._ctx.Process(
+            target=_run_worker, args=(self.settings, self._app, self._socket, ready), name="csremote-worker"
+        )
+        process.start()
+        worker = Worker(process, ready, time.monotonic())
+        self.workers.append(worker)
+        logger.info(f"Started worker {process.pid}")
+        return worker
+
+    def stop_worker(self, worker: Worker, wait: bool = True):
+        if worker in self.workers:
+            self.workers.remove(worker)
+        if worker.process.is_alive():
+            os.kill(worker.process.pid, signal.SIGTERM)
+        if wait:
+            self._join(worker)
+
+    def _join(self, worker: Worker):
+        worker.process.join(self.settings.graceful_timeout + 5)
+        if worker.process.is_alive():
+            logger.warning(f"Worker {worker.process.pid} did not stop in time, killing it")
+            worker.process.kill()
+            worker.process.join()
+        self._worker_exited(worker.process.pid)
+
+    def _worker_exited(self, pid: int):
+        from .metrics import mark_process_dead
+        mark_process_dead(pid)
+
+    def rolling_restart(self):
+        """Substituir os workers um a um, sem nunca ficar sem capacidade"""
+        logger.info("Rolling restart")
+        for old in list(self.workers):
+            new = self.spawn()
+            if not new.ready.wait(self.settings.boot_timeout):
+                logger.error(f"Worker {new.process.pid} did not become ready, aborting rolling restart")
+                self.stop_worker(new)
+                return
+            self.stop_worker(old)
+
+    def _reap(self):
+        for worker in list(self.workers):
+            if worker.process.is_alive():
+                continue
+            self.workers.remove(worker)
+            self._worker_exited(worker.process.pid)
+            code = worker.process.exitcode
+            if code != 0:
+                logger.error(f"Worker {worker.process.pid} exited with code {code}")
+                self._crashes = [t for t in self._crashes if time.monotonic() - t < 60] + [time.monotonic()]
+            if self._stopping:
+                continue
+            if len(self._crashes) >= self.settings.workers * 3:
+                # Falha na inicialização (configuração, banco fora): não reiniciar em laço apertado
+                logger.error("Workers are crashing repeatedly, waiting before respawning")
+                time.sleep(5)
+            self.spawn()
+
+    def _on_signal(self, sig, frame):
+        self._signals.append(sig)
+
+    def _handle_signals(self):
+        while self._signals:
+            sig = self._signals.pop(0)
+            if sig in (signal.SIGTERM, signal.SIGINT):
+                self._stopping = True
+            elif sig == signal.SIGHUP:
+                self.rolling_restart()
+            elif sig == signal.SIGTTIN:
+                limit = max_workers()
+                if limit is not None and self.settings.workers >= limit:
+                    logger.warning(f"Ignoring SIGTTIN: at most {limit} worker(s) without REDIS_URL")
+                    continue
+                self.settings.workers += 1
+                self.spawn()
+            elif sig == signal.SIGTTOU and self.settings.workers > 1:
+                self.settings.workers -= 1
+                self.stop_worker(self.workers[0])
+
+    def run(self) -> int:
+        settings = self.settings
+        if settings.preload:
+            from .main import app
+            self._app = app
+        if not settings.reuse_port:
+            self._socket = create_socket(settings, reuse_port=False)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, self._on_signal)
+
+        logger.info(
+            f"Listening on {settings.host}:{settings.port} with {settings.workers} workers "
+            f"(preload={settings.preload}, reuse_port={settings.reuse_port})"
+        )
+        # Um único escritor dos arquivos de log: os workers herdam a fila no fork
+        start_shared_listener()
+        for _ in range(settings.workers):
+            self.spawn()
+        while not self._stopping:
+            self._handle_signals()
+            if not self._stopping:
+                self._reap()
+            time.sleep(0.2)
+
+        logger.info("Stopping workers")
+        # SIGTERM em todos de uma vez: cada um drena as próprias conexões em paralelo
+        workers = list(self.workers)
+        for worker in workers:
+            self.stop_worker(worker, wait=False)
+        for worker in workers:
+            self._join(worker)
+        if self._socket is not None:
+            self._socket.close()
+        stop_shared_listener()
+        return 0
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s")
+    settings = Settings()
+    limit = max_workers()
+    if limit is not None and settings.workers > limit:
+        logger.error(
+            f"WEB_CONCURRENCY={settings.workers} requires REDIS_URL (and the redis package): chat and "
+            f"signaling peers on different workers only reach each other through Redis"
+        )
+        return 2
+    if not hasattr(os, "fork"):
+        # Windows: sem fork/SO_REUSEPORT, usar o gerenciador de processos do próprio uvicorn
+        config = settings.uvicorn_config(APP)
+        config.workers = settings.workers
+        server = uvicorn.Server(config)
+        if settings.workers > 1:
+            from uvicorn.supervisors import Multiprocess
+            Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+        else:
+            server.run()
+        return 0
+    return Supervisor(settings).run()
@@ -0,0 +1,229 @@
+"""
+Vivacidade das sessões a partir das conexões de chat e sinalização.
+
+Cada worker conta os próprios peers em memória e publica a contagem na tabela
+conexoes_sessoes a cada varredura (heartbeat). Sessão sem peers neste worker por mais
+que o período de carência só é encerrada se nenhum outro worker publicou peers para ela
+recentemente; /admin/sessoes/ativas soma os workers pela mesma tabela.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import ConexaoSessao, SessaoRemota
+
+logger = logging.getLogger(__name__)
+
+SESSION_IDLE_GRACE_SECONDS = float(os.getenv("SESSION_IDLE_GRACE_SECONDS", "300"))
+SESSION_LIVENESS_SWEEP_SECONDS = float(os.getenv("SESSION_LIVENESS_SWEEP_SECONDS", "30"))
+# Heartbeat mais antigo que isso é de um worker que morreu ou travou
+SESSION_HEARTBEAT_TTL_SECONDS = float(os.getenv("SESSION_HEARTBEAT_TTL_SECONDS", str(3 * SESSION_LIVENESS_SWEEP_SECONDS)))
+SESSION_CLOSE_BATCH_SIZE = 500
+
+def _worker_id() -> str:
+    # pid + sufixo aleatório: um pid reaproveitado após restart não herda as linhas antigas
+    return f"{os.getpid()}:{uuid.uuid4().hex[:8]}@{socket.gethostname()}"[:64]
+
+def live_sessions(db: Session, session_ids: Iterable[int], ttl: float = SESSION_HEARTBEAT_TTL_SECONDS) -> Set[int]:
+    """Sessões (dentre session_ids) com peers publicados recentemente por algum worker"""
+    session_ids = list(session_ids)
+    if not session_ids:
+        return set()
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    return {
+        row[0] for row in db.query(ConexaoSessao.sessao_id)
+        .filter(ConexaoSessao.sessao_id.in_(session_ids), ConexaoSessao.heartbeat_em >= cutoff)
+        .distinct()
+    }
+
+class SessionLivenessTracker:
+    def __init__(self, session_factory=SessionLocal, grace_seconds: float = SESSION_IDLE_GRACE_SECONDS,
+                 sweep_interval: float = SESSION_LIVENESS_SWEEP_SECONDS,
+                 heartbeat_ttl: float = SESSION_HEARTBEAT_TTL_SECONDS):
+        self.session_factory = session_factory
+        self.grace_seconds = grace_seconds
+        self.sweep_interval = sweep_interval
+        self.heartbeat_ttl = heartbeat_ttl
+        # Renovado em start(): com preload o tracker é criado antes do fork
+        self.worker_id = _worker_id()
+        # Conexões abertas (chat + sinalização) por sessão; só sessões com peers
+        self.peers: Dict[int, int] = {}
+        self.last_activity: Dict[int, float] = {}
+        # Sessões que ficaram sem peers -> instante (monotonic) em que isso aconteceu
+        self.idle_since: Dict[int, float] = {}
+        self._on_closed = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def connected(self, session_id: int):
+        self.peers[session_id] = self.peers.get(session_id, 0) + 1
+        self.idle_since.pop(session_id, None)
+        self.touch(session_id)
+
+    def disconnected(self, session_id: int):
+        count = self.peers.get(session_id, 0) - 1
+        if count > 0:
+            self.peers[session_id] = count
+            return
+        self.peers.pop(session_id, None)
+        self.idle_since[session_id] = time.monotonic()
+
+    def touch(self, session_id: int):
+        self.last_activity[session_id] = time.time()
+
+    def forget(self, session_id: int):
+        """Sessão encerrada explicitamente: parar de acompanhar"""
+        self.peers.pop(session_id, None)
+        self.idle_since.pop(session_id, None)
+        self.last_activity.pop(session_id, None)
+
+    @property
+    def active_count(self) -> int:
+        """Sessões com peers neste worker"""
+        return len(self.peers)
+
+    def _snapshot(self) -> List[Tuple[int, int, datetime]]:
+        return [
+            (session_id, count, datetime.utcfromtimestamp(self.last_activity.get(session_id, time.time())))
+            for session_id, count in self.peers.items()
+        ]
+
+    def active_sessions(self, db: Session) -> List[dict]:
+        """Sessões com peers em qualquer worker: as deste da memória, as dos demais do heartbeat"""
+        sessoes = {
+            session_id: {"sessao_id": session_id, "conexoes": count, "ultima_atividade": ultima}
+            for session_id, count, ultima in self._snapshot()
+        }
+        cutoff = datetime.utcnow() - timedelta(seconds=self.heartbeat_ttl)
+        rows = db.query(ConexaoSessao.sessao_id, ConexaoSessao.conexoes, ConexaoSessao.ultima_atividade).filter(
+            ConexaoSessao.worker_id != self.worker_id, ConexaoSessao.heartbeat_em >= cutoff
+        )
+        for session_id, conexoes, ultima in rows:
+            sessao = sessoes.setdefault(session_id, {"sessao_id": session_id, "conexoes": 0, "ultima_atividade": ultima})
+            sessao["conexoes"] += conexoes
+            sessao["ultima_atividade"] = max(sessao["ultima_atividade"], ultima)
+        return [{**sessao, "ultima_atividade": sessao["ultima_atividade"].isoformat()} for sessao in sessoes.values()]
+
+    def _publish(self, snapshot: List[Tuple[int, int, datetime]]):
+        """Substituir as linhas deste worker pela contagem atual (heartbeat)"""
+        db = self.session_factory()
+        try:
+            agora = datetime.utcnow()
+            db.query(ConexaoSessao).filter(ConexaoSessao.worker_id == self.worker_id).delete(synchronize_session=False)
+            if snapshot:
+                db.execute(insert(ConexaoSessao), [
+                    {"worker_id": self.worker_id, "sessao_id": session_id, "conexoes": count,
+                     "ultima_atividade": ultima, "heartbeat_em": agora}
+                    for session_id, count, ultima in snapshot
+                ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error publishing session heartbeat: {e}")
+        finally:
+            db.close()
+
+    def _take_expired(self) -> List[int]:
+        cutoff = time.monotonic() - self.grace_seconds
+        expired = [session_id for session_id, since in self.idle_since.items() if since <= cutoff]
+        for session_id in expired:
+            del self.idle_since[session_id]
+            self.last_activity.pop(session_id, None)
+        return expired
+
+    def _close(self, session_ids: List[int]) -> List[Tuple[int, int, int]]:
+        """Encerrar em lotes as sessões ainda abertas; retorna (id, analista_id, cliente_id)"""
+        closed = []
+        db = self.session_factory()
+        try:
+            agora = datetime.utcnow()
+            for start in range(0, len(session_ids), SESSION_CLOSE_BATCH_SIZE):
+                chunk = session_ids[start:start + SESSION_CLOSE_BATCH_SIZE]
+                # Peers em outro worker (ou reconectados aqui durante a varredura): manter aberta
+                vivas = live_sessions(db, chunk, self.heartbeat_ttl)
+                chunk = [session_id for session_id in chunk if session_id not in vivas and session_id not in self.peers]
+                if not chunk:
+                    continue
+                rows = (
+                    db.query(SessaoRemota.id, SessaoRemota.analista_id, SessaoRemota.cliente_id)
+                    .filter(SessaoRemota.id.in_(chunk), SessaoRemota.termino.is_(None))
+                    .all()
+                )
+                if not rows:
+                    continue
+                db.query(SessaoRemota).filter(
+                    SessaoRemota.id.in_([row[0] for row in rows]), SessaoRemota.termino.is_(None)
+                ).update({SessaoRemota.termino: agora}, synchronize_session=False)
+                db.commit()
+                closed.extend(tuple(row) for row in rows)
+            return closed
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error closing idle sessions: {e}")
+            return closed
+        finally:
+            db.close()
+
+    def close_sessions(self, session_ids: List[int], timeout: float = 30) -> int:
+        """Encerrar a partir de uma thread (manutenção), com o mesmo hook da varredura
+
+        Sessões com peers em algum worker são mantidas abertas.
+        """
+        closed = self._close(list(session_ids))
+        if not closed:
+            return 0
+        if self._on_closed is None or self._loop is None:
+            logger.warning(f"Closed {len(closed)} sessions without running the on_closed hook")
+            return len(closed)
+        try:
+            asyncio.run_coroutine_threadsafe(self._on_closed(closed), self._loop).result(timeout)
+        except Exception as e:
+            logger.error(f"Error running on_closed for {len(closed)} sessions: {e}")
+        return len(closed)
+
+    async def sweep(self) -> int:
+        # Publicar antes de decidir: os outros workers consultam a mesma tabela
+        await asyncio.to_thread(self._publish, self._snapshot())
+        expired = self._take_expired()
+        if not expired:
+            return 0
+        closed = await asyncio.to_thread(self._close, expired)
+        if closed:
+            logger.info(f"Closed {len(closed)} idle sessions")
+            if self._on_closed is not None:
+                await self._on_closed(closed)
+        return len(closed)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Session liveness sweep failed: {e}")
+
+    def start(self, on_closed=None):
+        """on_closed: corrotina chamada com [(id, analista_id, cliente_id)] encerradas"""
+        self._on_closed = on_closed
+        self._loop = asyncio.get_running_loop()
+        if self._task is None:
+            self.worker_id = _worker_id()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+            # Os peers deste worker vão reconectar em outro: não deixar heartbeat para trás
+            await asyncio.to_thread(self._publish, [])
+
+session_liveness = SessionLivenessTracker()
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+
+from .models import Usuario, SessaoRemota
+
+class SessionRoster:
+    """Participantes de uma sessão remota (ids, nomes e papéis)"""
+
+    def __init__(self, sessao_id: int, analista_id: int, cliente_id: int, participants: Dict[int, dict]):
+        self.sessao_id = sessao_id
+        self.analista_id = analista_id
+        self.cliente_id = cliente_id
+        self.participants = participants
+
+    def is_member(self, usuario_id: int) -> bool:
+        return usuario_id in self.participants
+
+    def get(self, usuario_id: int) -> Optional[dict]:
+        return self.participants.get(usuario_id)
+
+class SessionRosterCache:
+    def __init__(self, max_sessions: int = 10000):
+        # Cache LRU: evita crescer sem limite caso uma sessão nunca seja encerrada
+        self.rosters: "OrderedDict[int, SessionRoster]" = OrderedDict()
+        self.max_sessions = max_sessions
+
+    def get(self, sessao_id: int, db: Session) -> Optional[SessionRoster]:
+        """Obter roster da sessão, consultando o banco apenas no primeiro acesso"""
+        roster = self.rosters.get(sessao_id)
+        if roster is not None:
+            self.rosters.move_to_end(sessao_id)
+            return roster
+
+        roster = self._load(sessao_id, db)
+        if roster is None:
+            return None
+
+        self.rosters[sessao_id] = roster
+        if len(self.rosters) > self.max_sessions:
+            self.rosters.popitem(last=False)
+        return roster
+
+    def _load(self, sessao_id: int, db: Session) -> Optional[SessionRoster]:
+        sessao = db.query(SessaoRemota.analista_id, SessaoRemota.cliente_id).filter(
+            SessaoRemota.id == sessao_id
+        ).first()
+        if not sessao:
+            return None
+
+        analista_id, cliente_id = sessao
+        usuarios = db.query(Usuario.id, Usuario.nome).filter(
+            Usuario.id.in_([analista_id, cliente_id])
+        ).all()
+        roles = {analista_id: "analista", cliente_id: "cliente"}
+        participants = {
+            usuario_id: {"id": usuario_id, "nome": nome, "tipo": roles[usuario_id]}
+            for usuario_id, nome in usuarios
+        }
+        return SessionRoster(sessao_id, analista_id, cliente_id, participants)
+
+    def invalidate(self, sessao_id: int):
+        """Descartar roster (ex.: ao encerrar a sessão)"""
+        self.rosters.pop(sessao_id, None)
+
+session_roster = SessionRosterCache()
@@ -0,0 +1,120 @@
+"""
+Desligamento gracioso: drenar as conexões WebSocket antes de o worker sair.
+
+Ordem: parar de aceitar sockets novos, avisar cada cliente quando reconectar (com jitter,
+para não voltarem todos juntos), esperar as mensagens de chat em processamento, gravar os
+buffers em memória (tráfego, auditoria) e só então fechar com 1012 (Service Restart).
+
+Com o launcher (python -m app) a drenagem roda antes de o uvicorn fechar as conexões; com
+o uvicorn direto, o evento de shutdown do FastAPI só chega depois disso e resta o flush.
+"""
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+import asyncio
+import json
+import logging
+import os
+import random
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "10"))
+RECONNECT_BASE_MS = int(os.getenv("RECONNECT_BASE_MS", "1000"))
+# Janela em que os clientes reconectam espalhados (deve cobrir a subida do novo worker)
+RECONNECT_JITTER_MS = int(os.getenv("RECONNECT_JITTER_MS", "10000"))
+# 1012 Service Restart: o cliente deve reconectar
+CLOSE_SERVICE_RESTART = 1012
+HINT_SEND_TIMEOUT = 1.0
+
+class ShutdownCoordinator:
+    def __init__(self, drain_timeout: float = DRAIN_TIMEOUT_SECONDS, reconnect_base_ms: int = RECONNECT_BASE_MS,
+                 reconnect_jitter_ms: int = RECONNECT_JITTER_MS):
+        self.drain_timeout = drain_timeout
+        self.reconnect_base_ms = reconnect_base_ms
+        self.reconnect_jitter_ms = reconnect_jitter_ms
+        self.draining = False
+        self._sockets: Dict[str, Callable[[], Iterable[WebSocket]]] = {}
+        self._flushes: Dict[str, Callable[[], Awaitable]] = {}
+        self._inflight = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._drain: Optional[asyncio.Future] = None
+
+    def register_sockets(self, name: str, source: Callable[[], Iterable[WebSocket]]):
+        """source: função que retorna as conexões abertas no momento"""
+        self._sockets[name] = source
+
+    def register_flush(self, name: str, flush: Callable[[], Awaitable]):
+        self._flushes[name] = flush
+
+    @contextmanager
+    def track(self):
+        """Marcar trabalho que não pode ser interrompido (mensagem de chat sendo gravada)"""
+        self._inflight += 1
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            if not self._inflight and self._idle is not None:
+                self._idle.set()
+
+    def reconnect_hint(self) -> dict:
+        return {
+            "type": "reconnect",
+            "reconnect_after_ms": self.reconnect_base_ms + random.randint(0, self.reconnect_jitter_ms)
+        }
+
+    async def _send_hint(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.send_text(json.dumps(self.reconnect_hint())), HINT_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=CLOSE_SERVICE_RESTART), HINT_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def reject(self, websocket: WebSocket, subprotocol: Optional[str] = None):
+        """Conexão nova durante a drenagem: só o aviso de reconexão e o fechamento"""
+        await websocket.accept(subprotocol=subprotocol)
+        await self._send_hint(websocket)
+        await self._close(websocket)
+
+    async def _wait_inflight(self, timeout: float):
+        if not self._inflight:
+            return
+        self._idle = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Shutdown drain timed out with {self._inflight} chat messages in flight")
+
+    async def _run_drain(self):
+        self.draining = True
+        sockets = [websocket for source in self._sockets.values() for websocket in list(source())]
+        logger.info(f"Draining {len(sockets)} WebSocket connections")
+        await asyncio.gather(*(self._send_hint(websocket) for websocket in sockets))
+        await self._wait_inflight(self.drain_timeout)
+        for name, flush in self._flushes.items():
+            try:
+                await flush()
+            except Exception as e:
+                logger.error(f"Error flushing {name} on shutdown: {e}")
+        await asyncio.gather(*(self._close(websocket) for websocket in sockets))
+
+    async def drain(self):
+        """Idempotente: o launcher e o evento de shutdown podem chamar"""
+        if self._drain is None:
+            self._drain = asyncio.ensure_future(self._run_drain())
+        await self._drain
+
+    def reset(self):
+        """Fim do ciclo de vida: o próximo startup volta a aceitar conexões"""
+        self.draining = False
+        self._drain = None
+        self._idle = None
+
+shutdown_coordinator = ShutdownCoordinator()
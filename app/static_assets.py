@@ -0,0 +1,163 @@
+"""
+Pipeline de arquivos estáticos: nomes com hash do conteúdo, versões gzip/brotli
+pré-comprimidas e Cache-Control immutable para os arquivos com hash.
+
+Pode rodar como etapa de build (python -m app.static_assets) ou na inicialização.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import stat
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+from .compression import accepts, parse_accept_encoding
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+# Subdiretório (dentro de static/) com os arquivos gerados
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+# Tipos que valem a pena comprimir; imagens e fontes woff2 já são comprimidas
+COMPRESSIBLE_EXTENSIONS = {".js", ".css", ".html", ".svg", ".json", ".map", ".txt", ".xml", ".ico"}
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _atomic_write(path: str, data: bytes):
+    # Vários workers podem gerar o mesmo arquivo ao mesmo tempo
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _fingerprinted_name(rel_path: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+def build_assets(static_dir: str) -> Dict[str, str]:
+    """Gerar static/dist/ e retornar o manifesto {caminho lógico: caminho com hash}"""
+    dist_root = os.path.join(static_dir, DIST_DIR)
+    manifest: Dict[str, str] = {}
+
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        if os.path.abspath(dirpath) == os.path.abspath(static_dir) and DIST_DIR in dirnames:
+            dirnames.remove(DIST_DIR)
+        for filename in filenames:
+            source = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = f"{DIST_DIR}/{_fingerprinted_name(rel_path, digest)}"
+            manifest[rel_path] = hashed
+
+            target = os.path.join(static_dir, hashed)
+            if os.path.exists(target):
+                # Mesmo hash: já gerado em um build anterior
+                continue
+            _atomic_write(target, data)
+
+            if os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+                _atomic_write(target + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _atomic_write(target + ".br", brotli.compress(data, quality=11))
+
+    _atomic_write(os.path.join(dist_root, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    _prune_dist(dist_root, manifest)
+    return manifest
+
+def _prune_dist(dist_root: str, manifest: Dict[str, str]):
+    """Apagar hashes de builds anteriores (e de arquivos removidos) que o manifesto não usa"""
+    keep = {MANIFEST_NAME}
+    for hashed in manifest.values():
+        rel_path = hashed[len(DIST_DIR) + 1:]
+        keep.update((rel_path, rel_path + ".gz", rel_path + ".br"))
+
+    for dirpath, dirnames, filenames in os.walk(dist_root, topdown=False):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, dist_root).replace(os.sep, "/")
+            # .tmp: escrita em andamento de outro worker
+            if rel_path in keep or filename.endswith(".tmp"):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if dirpath != dist_root:
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                pass
+
+class StaticAssets:
+    """Manifesto carregado em memória e resolução de URLs para os templates"""
+
+    def __init__(self, static_dir: str, url_prefix: str = "/static"):
+        self.static_dir = static_dir
+        self.url_prefix = url_prefix
+        self.manifest: Dict[str, str] = {}
+
+    def build(self):
+        if os.path.isdir(self.static_dir):
+            self.manifest = build_assets(self.static_dir)
+
+    def url(self, path: str) -> str:
+        """Helper Jinja: static_url('js/app.js') -> /static/dist/js/app.<hash>.js"""
+        path = path.lstrip("/")
+        return f"{self.url_prefix}/{self.manifest.get(path, path)}"
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles que entrega .br/.gz pré-gerados e marca os arquivos com hash como imutáveis"""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        rel_path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        if not rel_path.startswith(DIST_DIR + "/"):
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        accepted = parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if not accepts(accepted, encoding):
+                continue
+            try:
+                compressed_stat = os.stat(str(full_path) + suffix)
+            except OSError:
+                continue
+            if not stat.S_ISREG(compressed_stat.st_mode):
+                continue
+            response = FileResponse(
+                str(full_path) + suffix,
+                status_code=status_code,
+                stat_result=compressed_stat,
+                method=scope["method"],
+                # Tipo do arquivo original, não do .gz/.br
+                media_type=mimetypes.guess_type(str(full_path))[0] or "text/plain",
+                headers={"Content-Encoding": encoding}
+            )
+            break
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, method=scope["method"])
+
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+if __name__ == "__main__":
+    from pathlib import Path
+
+    static_dir = str(Path(__file__).resolve().parent.parent / "static")
+    for logical, hashed in sorted(build_assets(static_dir).items()):
+        print(f"{logical} -> {hashed}")
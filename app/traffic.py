@@ -0,0 +1,134 @@
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+from sqlalchemy import case, func, update
+
+from .database import SessionLocal
+from .models import SessaoRemota
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("TRAFFIC_FLUSH_INTERVAL_SECONDS", "10"))
+# Teto dos relatórios de mídia do cliente: taxa máxima (padrão 100 Mbit/s) vezes o tempo
+# desde o relatório anterior, limitado a uma janela
+MEDIA_MAX_BYTES_PER_SECOND = int(os.getenv("MEDIA_MAX_BYTES_PER_SECOND", str(100 * 1000 * 1000 // 8)))
+MEDIA_REPORT_MAX_WINDOW_SECONDS = float(os.getenv("MEDIA_REPORT_MAX_WINDOW_SECONDS", "60"))
+
+class TrafficCounter:
+    """Contabiliza bytes por sessão em memória e grava no banco periodicamente"""
+
+    def __init__(self, session_factory=SessionLocal, flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        # Incrementos e a troca dos dicionários ocorrem no event loop: não precisam de lock
+        self.bytes_in: Dict[int, int] = defaultdict(int)
+        self.bytes_out: Dict[int, int] = defaultdict(int)
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+        # Lote que falhou ao gravar; reaproveitado na próxima troca (só tocado no event loop)
+        self._failed: Dict[int, int] = {}
+
+    def add(self, session_id: int, bytes_in: int = 0, bytes_out: int = 0):
+        """Registrar tráfego recebido (in) e enviado (out) pelo servidor"""
+        if bytes_in:
+            self.bytes_in[session_id] += bytes_in
+        if bytes_out:
+            self.bytes_out[session_id] += bytes_out
+
+    def _take_pending(self) -> Dict[int, int]:
+        """Trocar os contadores por novos e devolver o total acumulado por sessão"""
+        bytes_in, self.bytes_in = self.bytes_in, defaultdict(int)
+        bytes_out, self.bytes_out = self.bytes_out, defaultdict(int)
+        failed, self._failed = self._failed, {}
+        pending = defaultdict(int, failed)
+        for session_id, total in bytes_in.items():
+            pending[session_id] += total
+        for session_id, total in bytes_out.items():
+            pending[session_id] += total
+        return pending
+
+    def _retry_later(self, pending: Dict[int, int]):
+        for session_id, total in pending.items():
+            self._failed[session_id] = self._failed.get(session_id, 0) + total
+
+    def flush(self) -> int:
+        """Gravar contadores pendentes com um único UPDATE; retorna sessões atualizadas"""
+        pending = self._take_pending()
+        if not self._write(pending):
+            self._retry_later(pending)
+            return 0
+        return len(pending)
+
+    def _write(self, pending: Dict[int, int]) -> bool:
+        """Executa na thread: não altera o estado do contador, só informa se gravou"""
+        if not pending:
+            return True
+
+        delta = case(pending, value=SessaoRemota.id, else_=0)
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(SessaoRemota)
+                .where(SessaoRemota.id.in_(list(pending)))
+                .values(trafego_bytes=func.coalesce(SessaoRemota.trafego_bytes, 0) + delta)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error flushing traffic counters, will retry: {e}")
+            return False
+        finally:
+            db.close()
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_pending()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def flush_pending(self) -> int:
+        """Gravar agora o que está pendente (troca e reenfileiramento no event loop, escrita na thread)"""
+        pending = self._take_pending()
+        if not await asyncio.to_thread(self._write, pending):
+            self._retry_later(pending)
+            return 0
+        return len(pending)
+
+    async def stop(self):
+        """Parar o flush periódico e gravar o que restou"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush_pending()
+
+traffic_counter = TrafficCounter()
+
+class MediaReportLimiter:
+    """Limita os bytes de mídia aceitos por (sessão, usuário) ao que cabe no intervalo"""
+
+    def __init__(self, max_bytes_per_second: int = MEDIA_MAX_BYTES_PER_SECOND,
+                 max_window: float = MEDIA_REPORT_MAX_WINDOW_SECONDS, max_entries: int = 10000):
+        self.max_bytes_per_second = max_bytes_per_second
+        self.max_window = max_window
+        self.max_entries = max_entries
+        self.last_report: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+
+    def allowed(self, session_id: int, user_id: int) -> int:
+        """Bytes aceitos neste relatório; registra o instante para o próximo"""
+        key = (session_id, user_id)
+        now = time.monotonic()
+        last = self.last_report.pop(key, None)
+        window = self.max_window if last is None else min(now - last, self.max_window)
+        self.last_report[key] = now
+        if len(self.last_report) > self.max_entries:
+            self.last_report.popitem(last=False)
+        return int(window * self.max_bytes_per_second)
+
+media_report_limiter = MediaReportLimiter()
@@ -0,0 +1,60 @@
+from typing import List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from .models import Usuario
+from .serialization import rows_to_dicts
+
+# Colunas expostas na listagem (nunca senha_hash)
+USER_FIELDS = ("nome", "email", "empresa", "cnpj", "id", "tipo_usuario", "administrador",
+               "email_confirmado", "criado_em", "atualizado_em")
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _prefix(db: Session, expr, prefix: str):
+    """expr começa com prefix, de forma que use o índice da expressão"""
+    condition = expr.like(_escape_like(prefix) + "%", escape="\\")
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite não usa índice para LIKE com lower(); o intervalo [prefix, prefix+1) usa
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        condition = condition & (expr >= prefix) & (expr < upper)
+    return condition
+
+def fetch_users(
+    db: Session,
+    tipo_usuario: Optional[str] = None,
+    administrador: Optional[bool] = None,
+    email_confirmado: Optional[bool] = None,
+    empresa: Optional[str] = None,
+    busca: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: int = 100
+) -> List[dict]:
+    """Usuários em ordem de id, após o cursor 'after' (keyset), com filtros e busca por prefixo"""
+    query = db.query(*[getattr(Usuario, campo) for campo in USER_FIELDS])
+    if tipo_usuario:
+        query = query.filter(Usuario.tipo_usuario == tipo_usuario)
+    if administrador is not None:
+        query = query.filter(Usuario.administrador == administrador)
+    if email_confirmado is not None:
+        query = query.filter(Usuario.email_confirmado == email_confirmado)
+    if empresa:
+        query = query.filter(Usuario.empresa == empresa)
+    order = Usuario.id
+    if busca and busca.strip():
+        termo = busca.strip().lower()
+        query = query.filter(or_(
+            _prefix(db, func.lower(Usuario.nome), termo),
+            _prefix(db, func.lower(Usuario.email), termo),
+            _prefix(db, Usuario.cnpj, busca.strip()),
+        ))
+        if db.get_bind().dialect.name == "sqlite":
+            # Sem isso o SQLite prefere varrer a tabela na ordem da PK em vez de usar os índices da busca
+            order = Usuario.id + 0
+    if after is not None:
+        query = query.filter(Usuario.id > after)
+
+    rows = query.order_by(order).limit(limit).all()
+    return rows_to_dicts(USER_FIELDS, rows)
@@ -4,47 +4,92 @@
 
 # app/webrtc.py
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List
+from typing import Dict, List, Optional
 import json
 import logging
 
+from .cluster_bus import cluster_bus
+from .traffic import traffic_counter
+from .metrics import SIGNALING_CONNECTIONS
+from .session_liveness import session_liveness
+
 logger = logging.getLogger(__name__)
 
+# Conexão substituída por outra do mesmo papel (reconexão ou segunda aba): não reconectar
+SIGNALING_REPLACED_CLOSE_CODE = 4009
+
 class WebRTCManager:
     def __init__(self):
         self.active_connections: Dict[int, Dict[str, WebSocket]] = {}
     
-    async def connect(self, websocket: WebSocket, session_id: int, user_type: str):
+    async def connect(self, websocket: WebSocket, session_id: int, user_type: str, subprotocol: Optional[str] = None):
         """Conectar WebSocket para sinalização WebRTC"""
-        await websocket.accept()
+        await websocket.accept(subprotocol=subprotocol)
         
         if session_id not in self.active_connections:
             self.active_connections[session_id] = {}
-        
+
+        previous = self.active_connections[session_id].get(user_type)
+        # Um socket por papel: o anterior sai do registro sem mexer nos contadores
         self.active_connections[session_id][user_type] = websocket
+        if previous is None:
+            SIGNALING_CONNECTIONS.inc()
+            session_liveness.connected(session_id)
+        else:
+            try:
+                await previous.close(code=SIGNALING_REPLACED_CLOSE_CODE)
+            except Exception:
+                pass
+        # O socket anterior desse papel pode estar em outro worker
+        await cluster_bus.publish("signaling_replaced", {"sessao_id": session_id, "user_type": user_type})
         logger.info(f"WebRTC connection established: session={session_id}, type={user_type}")
-    
-    def disconnect(self, session_id: int, user_type: str):
-        """Desconectar WebSocket"""
-        if session_id in self.active_connections:
-            if user_type in self.active_connections[session_id]:
-                del self.active_connections[session_id][user_type]
-            
-            if not self.active_connections[session_id]:
-                del self.active_connections[session_id]
+
+    async def close_replaced(self, event: dict):
+        """Outro worker registrou uma conexão nova para o papel: fechar a daqui"""
+        if event["worker_id"] == cluster_bus.worker_id:
+            return
+        websocket = self.active_connections.get(event["sessao_id"], {}).get(event["user_type"])
+        if websocket is not None:
+            try:
+                # O finally do handler remove o registro
+                await websocket.close(code=SIGNALING_REPLACED_CLOSE_CODE)
+            except Exception:
+                pass
+
+    def disconnect(self, session_id: int, user_type: str, websocket: WebSocket):
+        """Desconectar WebSocket (só se ainda for o registrado: o fechamento de um socket
+        substituído chega depois da conexão nova)"""
+        connections = self.active_connections.get(session_id)
+        if connections is None or connections.get(user_type) is not websocket:
+            return
+        del connections[user_type]
+        SIGNALING_CONNECTIONS.dec()
+        session_liveness.disconnected(session_id)
+        if not connections:
+            del self.active_connections[session_id]
     
     async def relay_signal(self, session_id: int, from_type: str, message: dict):
-        """Retransmitir sinal WebRTC entre analista e cliente"""
-        if session_id not in self.active_connections:
-            return
-        
+        """Retransmitir sinal WebRTC entre analista e cliente (o destinatário pode estar em outro worker)"""
         # Determinar destinatário
         to_type = "cliente" if from_type == "analista" else "analista"
-        
-        if to_type in self.active_connections[session_id]:
-            try:
-                await self.active_connections[session_id][to_type].send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error relaying WebRTC signal: {e}")
+        await cluster_bus.publish("signaling", {
+            "sessao_id": session_id, "to_type": to_type, "payload": json.dumps(message)
+        })
+
+    async def deliver_local(self, event: dict):
+        """Entregar um sinal ao socket do papel de destino, se ele estiver neste worker"""
+        session_id = event["sessao_id"]
+        websocket = self.active_connections.get(session_id, {}).get(event["to_type"])
+        if websocket is None:
+            return
+        try:
+            payload = event["payload"]
+            await websocket.send_text(payload)
+            traffic_counter.add(session_id, bytes_out=len(payload.encode()))
+            session_liveness.touch(session_id)
+        except Exception as e:
+            logger.error(f"Error relaying WebRTC signal: {e}")
 
 webrtc_manager = WebRTCManager()
+cluster_bus.subscribe("signaling", webrtc_manager.deliver_local)
+cluster_bus.subscribe("signaling_replaced", webrtc_manager.close_replaced)
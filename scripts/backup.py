@@ -1,112 +1,769 @@
 """
 Script de backup do banco de dados CSRemote
+
+Uso:
+  python scripts/backup.py [db] [--jobs N] [--no-verify] [--retention-days N]
+  python scripts/backup.py files [--source uploads] [--workers N] [--retention-days N]
+  python scripts/backup.py restore-files --dest DIR [--at 2024-05-01T03:00:00] [--workers N]
+
+Banco: DATABASE_URL (padrão do app: SQLite) ou DB_HOST/DB_PORT/DB_USER/DB_PASSWORD/DB_NAME.
+Destino: BACKUP_S3_BUCKET (BACKUP_S3_PREFIX; BACKUP_S3_ENDPOINT_URL para S3 compatível)
+ou, sem bucket, o diretório BACKUP_DIR (padrão: backups/).
+
+PostgreSQL: com --jobs 1, pg_dump -Fc vai direto do stdout para o upload multipart (nenhuma
+cópia local); com --jobs N > 1, pg_dump -Fd -j N grava em um diretório temporário que é
+enviado como tar em streaming. SQLite: snapshot pela API de backup online, comprimido
+(zstd, ou gzip sem o pacote zstandard) durante o envio.
+
+Cada backup grava <id>.json com os metadados (tamanho, sha256, verificação, tempos); a
+retenção usa esses metadados, não datas de arquivos locais.
+
+Arquivos (uploads/): incremental. Cada execução grava um manifesto com o estado completo
+(caminho, tamanho, mtime, sha256); só arquivos novos ou alterados desde o manifesto anterior
+são lidos e enviados, para um armazenamento por conteúdo (files/objects/<sha256>). A
+restauração usa o último manifesto até o instante pedido.
 """
+import argparse
+import datetime
+import gzip
+import hashlib
+import io
+import json
 import os
+import shutil
+import sqlite3
 import subprocess
-import datetime
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional
 try:
     import boto3
     HAS_BOTO3 = True
 except ImportError:
     boto3 = None
     HAS_BOTO3 = False
-from pathlib import Path
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
 
-def create_backup():
-    """Criar backup do banco PostgreSQL"""
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_filename = f"csremote_backup_{timestamp}.sql"
-    
-    # Configurações do banco
-    db_config = {
-        'host': os.getenv('DB_HOST', 'localhost'),
-        'port': os.getenv('DB_PORT', '5432'),
-        'user': os.getenv('DB_USER', 'csremote_user'),
-        'password': os.getenv('DB_PASSWORD', 'csremote_pass'),
-        'database': os.getenv('DB_NAME', 'csremote_db')
-    }
-    
-    # Comando pg_dump
-    cmd = [
-        'pg_dump',
-        f"--host={db_config['host']}",
-        f"--port={db_config['port']}",
-        f"--username={db_config['user']}",
-        f"--dbname={db_config['database']}",
-        '--verbose',
-        '--clean',
-        '--no-owner',
-        '--no-privileges',
-        f"--file={backup_filename}"
-    ]
-    
-    # Configurar senha via variável de ambiente
+load_dotenv()
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_S3_PREFIX = os.getenv("BACKUP_S3_PREFIX", "backups")
+BACKUP_RETENTION_DAYS = int(os.getenv("BACKUP_RETENTION_DAYS", "7"))
+# Mesmo vencidos, os últimos backups verificados nunca são removidos
+BACKUP_KEEP_MIN = int(os.getenv("BACKUP_KEEP_MIN", "3"))
+BACKUP_JOBS = int(os.getenv("BACKUP_JOBS", str(min(os.cpu_count() or 1, 4))))
+BACKUP_COMPRESS_LEVEL = int(os.getenv("BACKUP_COMPRESS_LEVEL", "6"))
+# Partes do upload multipart (mínimo do S3: 5 MiB)
+BACKUP_PART_SIZE = max(int(os.getenv("BACKUP_PART_SIZE_MB", "16")), 5) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Páginas copiadas por passo do backup online do SQLite (escritores não ficam bloqueados)
+SQLITE_BACKUP_PAGES = 4096
+UPLOADS_DIR = os.getenv("UPLOAD_DIR", "uploads")
+BACKUP_FILE_WORKERS = int(os.getenv("BACKUP_FILE_WORKERS", "8"))
+MIB = 1024 * 1024
+
+def database_url() -> str:
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    if os.getenv("DB_HOST") or os.getenv("DB_NAME"):
+        return (
+            f"postgresql://{os.getenv('DB_USER', 'csremote_user')}:{os.getenv('DB_PASSWORD', 'csremote_pass')}"
+            f"@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME', 'csremote_db')}"
+        )
+    return "sqlite:///./csremote.db"
+
+# --- Destinos -------------------------------------------------------------------------------
+
+class _HashingWriter:
+    """Conta bytes e calcula o sha256 do que é gravado no destino"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.raw.write(data)
+        self.size += len(data)
+        self.sha256.update(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+class _HashingReader:
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.sha256.update(data)
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+class _LocalWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".part")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, data) -> int:
+        return self._file.write(data)
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        # Só aparece com o nome final depois de completo
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+class LocalTarget:
+    """Diretório local (ou montado): também serve de substituto do S3 em testes"""
+
+    def __init__(self, directory: str = BACKUP_DIR):
+        self.root = Path(directory)
+
+    def describe(self) -> str:
+        return str(self.root)
+
+    def writer(self, key: str) -> _LocalWriter:
+        return _LocalWriter(self.root / key)
+
+    def open(self, key: str):
+        return open(self.root / key, "rb")
+
+    def put_json(self, key: str, obj: dict):
+        writer = self.writer(key)
+        writer.write(json.dumps(obj, indent=2).encode("utf-8"))
+        writer.close()
+
+    def get_json(self, key: str) -> dict:
+        with self.open(key) as f:
+            return json.load(f)
+
+    def put_file(self, key: str, path: Path):
+        writer = self.writer(key)
+        try:
+            with open(path, "rb") as f:
+                _copy(f, writer)
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def list(self, prefix: str) -> List[str]:
+        base = self.root / prefix
+        if not base.exists():
+            return []
+        return sorted(
+            path.relative_to(self.root).as_posix() for path in base.rglob("*")
+            if path.is_file() and not path.name.endswith(".part")
+        )
+
+    def delete(self, key: str):
+        (self.root / key).unlink(missing_ok=True)
+
+class _S3MultipartWriter:
+    """Upload multipart em streaming: só uma parte em memória por vez"""
+
+    def __init__(self, client, bucket: str, key: str, part_size: int = BACKUP_PART_SIZE):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+
+    def _upload_part(self, data: bytes):
+        number = len(self._parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=data
+        )
+        self._parts.append({"PartNumber": number, "ETag": response["ETag"]})
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def close(self):
+        # A última parte pode ser menor que o mínimo (e um objeto vazio ainda precisa de uma parte)
+        if self._buffer or not self._parts:
+            self._upload_part(bytes(self._buffer))
+            self._buffer = bytearray()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={"Parts": self._parts}
+        )
+
+    def abort(self):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+class S3Target:
+    def __init__(self, bucket: str, prefix: str = BACKUP_S3_PREFIX, endpoint_url: Optional[str] = None):
+        if not HAS_BOTO3:
+            raise RuntimeError("boto3 is required for S3 backups")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def describe(self) -> str:
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def writer(self, key: str) -> _S3MultipartWriter:
+        return _S3MultipartWriter(self.client, self.bucket, self._key(key))
+
+    def open(self, key: str):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+
+    def put_json(self, key: str, obj: dict):
+        self.client.put_object(
+            Bucket=self.bucket, Key=self._key(key), Body=json.dumps(obj, indent=2).encode("utf-8"),
+            ContentType="application/json"
+        )
+
+    def get_json(self, key: str) -> dict:
+        return json.loads(self.open(key).read())
+
+    def put_file(self, key: str, path: Path):
+        # Transferência gerenciada do boto3: multipart automático para arquivos grandes
+        self.client.upload_file(str(path), self.bucket, self._key(key))
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        full_prefix = self._key(prefix)
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=full_prefix):
+            for obj in page.get("Contents", []):
+                keys.append(obj["Key"][len(self.prefix) + 1:] if self.prefix else obj["Key"])
+        return sorted(keys)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+def default_target():
+    bucket = os.getenv("BACKUP_S3_BUCKET")
+    if bucket:
+        return S3Target(bucket, endpoint_url=os.getenv("BACKUP_S3_ENDPOINT_URL"))
+    return LocalTarget()
+
+# --- Compressão -----------------------------------------------------------------------------
+
+def _codec() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+def _compressing_writer(raw, codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=BACKUP_COMPRESS_LEVEL, threads=-1).stream_writer(raw, closefd=False)
+    return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=BACKUP_COMPRESS_LEVEL, mtime=0)
+
+def _decompressing_reader(raw, codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    return gzip.GzipFile(fileobj=raw, mode="rb")
+
+def _copy(src, dst) -> int:
+    total = 0
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            return total
+        dst.write(chunk)
+        total += len(chunk)
+
+# --- SQLite ---------------------------------------------------------------------------------
+
+def _sqlite_counts(path: str) -> Dict[str, int]:
+    conn = sqlite3.connect(path)
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {table: conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        conn.close()
+
+def _backup_sqlite(path: str, target, backup_id: str, meta: dict, workdir: str) -> str:
+    # Snapshot consistente sem parar o app; a cópia temporária só existe até o envio
+    snapshot = os.path.join(workdir, "snapshot.db")
+    start = time.perf_counter()
+    src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    dst = sqlite3.connect(snapshot)
+    try:
+        src.backup(dst, pages=SQLITE_BACKUP_PAGES)
+    finally:
+        dst.close()
+        src.close()
+    meta["tabelas"] = _sqlite_counts(snapshot)
+    meta["tempos"]["snapshot_s"] = round(time.perf_counter() - start, 3)
+
+    codec = _codec()
+    key = f"db/{backup_id}.db.{'zst' if codec == 'zstd' else 'gz'}"
+    start = time.perf_counter()
+    writer = target.writer(key)
+    try:
+        hashing = _HashingWriter(writer)
+        compressor = _compressing_writer(hashing, codec)
+        with open(snapshot, "rb") as f:
+            meta["bytes_origem"] = _copy(f, compressor)
+        compressor.close()
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    meta["tempos"]["upload_s"] = round(time.perf_counter() - start, 3)
+    meta.update(formato="sqlite", codec=codec, bytes=hashing.size, sha256=hashing.sha256.hexdigest())
+    os.remove(snapshot)
+    return key
+
+def _verify_sqlite(target, meta: dict, workdir: str):
+    restored = os.path.join(workdir, "restore.db")
+    reader = _HashingReader(target.open(meta["key"]))
+    try:
+        with open(restored, "wb") as f:
+            _copy(_decompressing_reader(reader, meta["codec"]), f)
+    except Exception as e:
+        raise RuntimeError(f"cannot decompress backup: {e}") from e
+    # Ler até o fim do objeto para o hash cobrir tudo o que foi gravado
+    _copy(reader, io.BytesIO())
+    if reader.sha256.hexdigest() != meta["sha256"]:
+        raise RuntimeError("checksum mismatch")
+    conn = sqlite3.connect(restored)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        raise RuntimeError(f"integrity_check: {result}")
+    counts = _sqlite_counts(restored)
+    if counts != meta["tabelas"]:
+        raise RuntimeError("row counts differ from the snapshot")
+    os.remove(restored)
+
+# --- PostgreSQL -----------------------------------------------------------------------------
+
+def _pg_args(url) -> List[str]:
+    args = []
+    if url.host:
+        args.append(f"--host={url.host}")
+    if url.port:
+        args.append(f"--port={url.port}")
+    if url.username:
+        args.append(f"--username={url.username}")
+    return args
+
+def _pg_env(url) -> dict:
     env = os.environ.copy()
-    env['PGPASSWORD'] = db_config['password']
-    
+    if url.password:
+        env["PGPASSWORD"] = str(url.password)
+    return env
+
+def _pg_counts(url, count: bool = True) -> Dict[str, Optional[int]]:
+    engine = create_engine(url.set(drivername="postgresql"))
     try:
-        subprocess.run(cmd, env=env, check=True)
-        print(f"✅ Backup criado: {backup_filename}")
-        return backup_filename
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Erro ao criar backup: {e}")
-        return None
+        with engine.connect() as conn:
+            tables = sorted(inspect(conn).get_table_names())
+            return {
+                table: conn.execute(text(f'SELECT count(*) FROM "{table}"')).scalar() if count else None
+                for table in tables
+            }
+    finally:
+        engine.dispose()
+
+def _backup_postgres(url, target, backup_id: str, meta: dict, workdir: str, jobs: int) -> str:
+    base = ["pg_dump", *_pg_args(url), f"--dbname={url.database}", "--no-owner", "--no-privileges",
+            f"--compress={BACKUP_COMPRESS_LEVEL}"]
+    env = _pg_env(url)
+
+    if jobs <= 1:
+        # Formato custom (já comprimido) direto do stdout para o destino
+        key = f"db/{backup_id}.dump"
+        start = time.perf_counter()
+        writer = target.writer(key)
+        proc = subprocess.Popen([*base, "--format=custom"], stdout=subprocess.PIPE, env=env)
+        try:
+            hashing = _HashingWriter(writer)
+            _copy(proc.stdout, hashing)
+            if proc.wait() != 0:
+                raise RuntimeError(f"pg_dump exited with {proc.returncode}")
+            writer.close()
+        except BaseException:
+            proc.kill()
+            writer.abort()
+            raise
+        meta["tempos"]["dump_s"] = round(time.perf_counter() - start, 3)
+        meta.update(formato="pg_custom", bytes=hashing.size, bytes_origem=hashing.size,
+                    sha256=hashing.sha256.hexdigest())
+        return key
+
+    # -j exige o formato diretório: uma tabela por arquivo, já comprimida pelo pg_dump
+    dump_dir = os.path.join(workdir, "dump")
+    start = time.perf_counter()
+    subprocess.run([*base, "--format=directory", f"--jobs={jobs}", f"--file={dump_dir}"], env=env, check=True)
+    meta["tempos"]["dump_s"] = round(time.perf_counter() - start, 3)
+
+    key = f"db/{backup_id}.tar"
+    start = time.perf_counter()
+    writer = target.writer(key)
+    try:
+        hashing = _HashingWriter(writer)
+        with tarfile.open(fileobj=hashing, mode="w|") as tar:
+            tar.add(dump_dir, arcname="dump")
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    meta["tempos"]["upload_s"] = round(time.perf_counter() - start, 3)
+    meta.update(formato="pg_directory", jobs=jobs, bytes=hashing.size, bytes_origem=hashing.size,
+                sha256=hashing.sha256.hexdigest())
+    shutil.rmtree(dump_dir)
+    return key
+
+def _verify_postgres(url, target, meta: dict, workdir: str, jobs: int):
+    reader = _HashingReader(target.open(meta["key"]))
+    if meta["formato"] == "pg_directory":
+        source = os.path.join(workdir, "restore")
+        with tarfile.open(fileobj=reader, mode="r|") as tar:
+            tar.extractall(source, filter="data")
+        source = os.path.join(source, "dump")
+    else:
+        # pg_restore -j precisa de arquivo com seek
+        source = os.path.join(workdir, "restore.dump")
+        with open(source, "wb") as f:
+            _copy(reader, f)
+    _copy(reader, io.BytesIO())
+    if reader.sha256.hexdigest() != meta["sha256"]:
+        raise RuntimeError("checksum mismatch")
 
-def upload_to_s3(filename):
-    """Upload do backup para S3"""
-    if not HAS_BOTO3:
-        print("⚠️  Biblioteca 'boto3' não está instalada; pulando upload para S3")
-        return False
+    scratch = f"{url.database}_verify_{int(time.time())}"
+    env = _pg_env(url)
+    subprocess.run(["createdb", *_pg_args(url), scratch], env=env, check=True)
     try:
-        s3_client = boto3.client('s3')
-        bucket_name = os.getenv('BACKUP_S3_BUCKET')
-        
-        if not bucket_name:
-            print("⚠️  Bucket S3 não configurado")
-            return False
-        
-        s3_key = f"backups/{filename}"
-        s3_client.upload_file(filename, bucket_name, s3_key)
-        print(f"✅ Upload para S3: s3://{bucket_name}/{s3_key}")
-        
-        # Remover arquivo local após upload
+        subprocess.run(
+            ["pg_restore", *_pg_args(url), f"--dbname={scratch}", f"--jobs={max(jobs, 1)}",
+             "--no-owner", "--no-privileges", "--exit-on-error", source],
+            env=env, check=True
+        )
+        counts = _pg_counts(url.set(database=scratch))
+    finally:
+        subprocess.run(["dropdb", *_pg_args(url), "--if-exists", scratch], env=env, check=False)
+    # O banco de origem continua recebendo escritas: comparar o esquema, registrar as contagens
+    if set(counts) != set(meta["tabelas"]):
+        raise RuntimeError("restored tables differ from the source")
+    meta["tabelas"] = counts
+
+# --- Orquestração ---------------------------------------------------------------------------
+
+def create_backup(target=None, url: Optional[str] = None, jobs: int = BACKUP_JOBS, verify: bool = True) -> dict:
+    """Gerar, enviar e (opcionalmente) verificar um backup; retorna os metadados gravados"""
+    target = target or default_target()
+    url = make_url(url or database_url())
+    created = datetime.datetime.now(datetime.timezone.utc)
+    backup_id = f"csremote_{created:%Y%m%dT%H%M%SZ}"
+    meta = {"id": backup_id, "criado_em": created.isoformat(), "banco": url.get_backend_name(),
+            "verificado": False, "tempos": {}}
+
+    start = time.perf_counter()
+    workdir = tempfile.mkdtemp(prefix="csremote_backup_")
+    try:
+        if url.get_backend_name() == "sqlite":
+            meta["key"] = _backup_sqlite(url.database, target, backup_id, meta, workdir)
+        else:
+            # Só os nomes: contar o banco de produção inteiro custaria mais que o dump
+            meta["tabelas"] = _pg_counts(url, count=False)
+            meta["key"] = _backup_postgres(url, target, backup_id, meta, workdir, jobs)
+        meta["tempos"]["backup_s"] = round(time.perf_counter() - start, 3)
+
+        if verify:
+            verify_start = time.perf_counter()
+            if url.get_backend_name() == "sqlite":
+                _verify_sqlite(target, meta, workdir)
+            else:
+                _verify_postgres(url, target, meta, workdir, jobs)
+            meta["verificado"] = True
+            meta["tempos"]["verify_s"] = round(time.perf_counter() - verify_start, 3)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if "key" in meta:
+            # Metadados por último: backup sem .json não é considerado pela retenção nem pela restauração
+            target.put_json(f"db/{backup_id}.json", meta)
+    return meta
+
+def report(meta: dict):
+    tempos = meta["tempos"]
+    elapsed = tempos.get("backup_s") or 1e-9
+    origem = meta.get("bytes_origem", meta["bytes"]) / MIB
+    print(f"📊 {origem:.1f} MiB lidos, {meta['bytes'] / MIB:.1f} MiB gravados em {elapsed:.1f}s "
+          f"({origem / elapsed:.1f} MiB/s)")
+    fases = ", ".join(f"{fase[:-2]} {segundos:.1f}s" for fase, segundos in tempos.items() if fase != "backup_s")
+    if fases:
+        print(f"   fases: {fases}")
+
+def cleanup_old_backups(target=None, retention_days: int = BACKUP_RETENTION_DAYS,
+                        keep_min: int = BACKUP_KEEP_MIN) -> List[str]:
+    """Remover backups vencidos pela data registrada nos metadados; retorna os ids removidos"""
+    target = target or default_target()
+    backups = sorted(
+        (target.get_json(key) for key in target.list("db/") if key.endswith(".json")),
+        key=lambda meta: meta["criado_em"], reverse=True
+    )
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days)
+    verificados = [meta for meta in backups if meta["verificado"]]
+    protegidos = {meta["id"] for meta in verificados[:keep_min]}
+    removidos = []
+    for meta in backups:
+        if meta["id"] in protegidos or datetime.datetime.fromisoformat(meta["criado_em"]) >= cutoff:
+            continue
+        target.delete(meta["key"])
+        target.delete(f"db/{meta['id']}.json")
+        removidos.append(meta["id"])
+        print(f"🗑️  Backup antigo removido: {meta['id']}")
+    return removidos
+
+# --- Arquivos enviados (uploads/) ------------------------------------------------------------
+
+MANIFEST_PREFIX = "files/manifests/"
+
+def _object_key(sha256: str) -> str:
+    return f"files/objects/{sha256[:2]}/{sha256}"
+
+def _hash_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def _manifest_time(manifest_id: str) -> datetime.datetime:
+    return datetime.datetime.strptime(manifest_id.split("_", 1)[1], "%Y%m%dT%H%M%S%fZ").replace(
+        tzinfo=datetime.timezone.utc
+    )
+
+def list_manifests(target) -> List[str]:
+    """Ids dos manifestos em ordem cronológica (o id carrega o instante)"""
+    return [
+        key[len(MANIFEST_PREFIX):-len(".json")] for key in target.list(MANIFEST_PREFIX) if key.endswith(".json")
+    ]
+
+def backup_files(target=None, source: str = UPLOADS_DIR, workers: int = BACKUP_FILE_WORKERS) -> dict:
+    """Enviar só o que mudou desde o último manifesto; retorna o novo manifesto"""
+    target = target or default_target()
+    root = Path(source)
+    created = datetime.datetime.now(datetime.timezone.utc)
+    start = time.perf_counter()
+    manifests = list_manifests(target)
+    previous = target.get_json(f"{MANIFEST_PREFIX}{manifests[-1]}.json") if manifests else None
+    anteriores = previous["arquivos"] if previous else {}
+    conhecidos = {entry["sha256"] for entry in anteriores.values()}
+    conhecidos_lock = threading.Lock()
+
+    arquivos = {}
+    pendentes = []
+    for path in sorted(p for p in root.rglob("*") if p.is_file()):
+        rel = path.relative_to(root).as_posix()
+        st = path.stat()
+        entry = anteriores.get(rel)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            # Inalterado: nem é relido
+            arquivos[rel] = entry
+        else:
+            pendentes.append((rel, path, st))
+
+    def enviar(item):
+        rel, path, st = item
+        sha256 = _hash_file(path)
+        with conhecidos_lock:
+            novo = sha256 not in conhecidos
+            conhecidos.add(sha256)
+        if novo:
+            target.put_file(_object_key(sha256), path)
+        atual = path.stat()
+        if (atual.st_size, atual.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+            # Alterado durante o envio: fica para a próxima execução
+            return rel, anteriores.get(rel), 0
+        return rel, {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}, st.st_size if novo else 0
+
+    enviados = 0
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for rel, entry, size in pool.map(enviar, pendentes):
+            if entry is not None:
+                arquivos[rel] = entry
+            enviados += size
+
+    manifest = {
+        "id": f"files_{created:%Y%m%dT%H%M%S%fZ}",
+        "criado_em": created.isoformat(),
+        "base": previous["id"] if previous else None,
+        "origem": str(root),
+        "arquivos": dict(sorted(arquivos.items())),
+        "alterados": len(pendentes),
+        "removidos": len(set(anteriores) - set(arquivos)),
+        "bytes_enviados": enviados,
+        "tempos": {"backup_s": round(time.perf_counter() - start, 3)},
+    }
+    # Manifesto por último: só referencia objetos que já estão no destino
+    target.put_json(f"{MANIFEST_PREFIX}{manifest['id']}.json", manifest)
+    return manifest
+
+def restore_files(dest: str, target=None, at: Optional[datetime.datetime] = None,
+                  workers: int = BACKUP_FILE_WORKERS) -> dict:
+    """Restaurar em dest o estado do último manifesto até `at` (padrão: o mais recente)"""
+    target = target or default_target()
+    manifests = list_manifests(target)
+    if at is not None:
+        manifests = [manifest_id for manifest_id in manifests if _manifest_time(manifest_id) <= at]
+    if not manifests:
+        raise RuntimeError("no file backup at or before the requested time")
+    manifest = target.get_json(f"{MANIFEST_PREFIX}{manifests[-1]}.json")
+    root = Path(dest)
+
+    def restaurar(item) -> int:
+        rel, entry = item
+        if rel.startswith("/") or ".." in rel.split("/"):
+            raise RuntimeError(f"invalid path in manifest: {rel}")
+        path = root / rel
+        if path.exists():
+            st = path.stat()
+            # Restauração retomada: arquivo já restaurado
+            if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+                return 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".part")
+        with closing(target.open(_object_key(entry["sha256"]))) as src:
+            reader = _HashingReader(src)
+            with open(tmp_path, "wb") as f:
+                _copy(reader, f)
+        if reader.sha256.hexdigest() != entry["sha256"]:
+            tmp_path.unlink()
+            raise RuntimeError(f"checksum mismatch for {rel}")
+        os.replace(tmp_path, path)
+        os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        return entry["size"]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        restaurados = sum(pool.map(restaurar, manifest["arquivos"].items()))
+    return {"id": manifest["id"], "arquivos": len(manifest["arquivos"]), "bytes": restaurados,
+            "tempos": {"restore_s": round(time.perf_counter() - start, 3)}}
+
+def cleanup_old_file_backups(target=None, retention_days: int = BACKUP_RETENTION_DAYS,
+                             keep_min: int = BACKUP_KEEP_MIN) -> List[str]:
+    """Remover manifestos vencidos e os objetos que nenhum manifesto restante referencia"""
+    target = target or default_target()
+    manifests = list_manifests(target)
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days)
+    vencidos = [
+        manifest_id for manifest_id in manifests[:max(len(manifests) - keep_min, 0)]
+        if _manifest_time(manifest_id) < cutoff
+    ]
+    if not vencidos:
+        return []
+    for manifest_id in vencidos:
+        target.delete(f"{MANIFEST_PREFIX}{manifest_id}.json")
+    referenciados = set()
+    for manifest_id in manifests[len(vencidos):]:
+        referenciados.update(
+            entry["sha256"] for entry in target.get_json(f"{MANIFEST_PREFIX}{manifest_id}.json")["arquivos"].values()
+        )
+    for key in target.list("files/objects/"):
+        if key.rsplit("/", 1)[-1] not in referenciados:
+            target.delete(key)
+    print(f"🗑️  {len(vencidos)} manifestos de arquivos antigos removidos")
+    return vencidos
+
+def _parse_at(value: str) -> datetime.datetime:
+    at = datetime.datetime.fromisoformat(value)
+    return at if at.tzinfo else at.replace(tzinfo=datetime.timezone.utc)
+
+def main_files(args) -> int:
+    target = default_target()
+    if args.command == "restore-files":
+        print(f"🔄 Restaurando arquivos de {target.describe()} em {args.dest}...")
         try:
-            os.remove(filename)
-        except OSError:
-            # não interromper se a remoção falhar
-            pass
-        return True
-    except Exception as e:
-        print(f"❌ Erro no upload S3: {e}")
-        return False
+            result = restore_files(args.dest, target, at=args.at, workers=args.workers)
+        except Exception as e:
+            print(f"❌ Erro ao restaurar arquivos: {e}")
+            return 1
+        elapsed = result["tempos"]["restore_s"] or 1e-9
+        print(f"✅ {result['arquivos']} arquivos do backup {result['id']}; {result['bytes'] / MIB:.1f} MiB "
+              f"baixados em {elapsed:.1f}s ({result['bytes'] / MIB / elapsed:.1f} MiB/s)")
+        return 0
+
+    print(f"🔄 Backup incremental de {args.source} em {target.describe()}...")
+    try:
+        manifest = backup_files(target, args.source, workers=args.workers)
     except Exception as e:
-        print(f"❌ Erro no upload S3: {e}")
-        return False
-        print(f"❌ Erro no upload S3: {e}")
-        return False
-        return True
-        
+        print(f"❌ Erro no backup de arquivos: {e}")
+        return 1
+    elapsed = manifest["tempos"]["backup_s"] or 1e-9
+    print(f"✅ Manifesto {manifest['id']}: {len(manifest['arquivos'])} arquivos, {manifest['alterados']} novos "
+          f"ou alterados, {manifest['removidos']} removidos")
+    print(f"📊 {manifest['bytes_enviados'] / MIB:.1f} MiB enviados em {elapsed:.1f}s "
+          f"({manifest['bytes_enviados'] / MIB / elapsed:.1f} MiB/s)")
+    cleanup_old_file_backups(target, args.retention_days)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Backup do CSRemote")
+    # Sem subcomando: backup do banco com os padrões (as opções ficam só no subcomando 'db')
+    parser.set_defaults(jobs=BACKUP_JOBS, no_verify=False, retention_days=BACKUP_RETENTION_DAYS)
+    sub = parser.add_subparsers(dest="command")
+    db = sub.add_parser("db", help="backup do banco de dados (padrão)")
+    db.add_argument("--jobs", type=int, default=BACKUP_JOBS, help="processos do pg_dump (PostgreSQL)")
+    db.add_argument("--no-verify", action="store_true", help="não restaurar em banco temporário")
+    db.add_argument("--retention-days", type=int, default=BACKUP_RETENTION_DAYS)
+    files = sub.add_parser("files", help="backup incremental dos arquivos enviados")
+    files.add_argument("--source", default=UPLOADS_DIR)
+    files.add_argument("--workers", type=int, default=BACKUP_FILE_WORKERS)
+    files.add_argument("--retention-days", type=int, default=BACKUP_RETENTION_DAYS)
+    restore = sub.add_parser("restore-files", help="restaurar arquivos a partir dos manifestos")
+    restore.add_argument("--dest", required=True, help="diretório de destino (de preferência vazio)")
+    restore.add_argument("--at", type=_parse_at, help="instante (ISO 8601, UTC se sem fuso); padrão: o mais recente")
+    restore.add_argument("--workers", type=int, default=BACKUP_FILE_WORKERS)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in ("files", "restore-files"):
+        return main_files(args)
+
+    target = default_target()
+    print(f"🔄 Iniciando backup do CSRemote em {target.describe()}...")
+    try:
+        meta = create_backup(target, jobs=args.jobs, verify=not args.no_verify)
     except Exception as e:
-        print(f"❌ Erro no upload S3: {e}")
-        return False
-
-def cleanup_old_backups():
-    """Limpar backups antigos (manter apenas últimos 7 dias)"""
-    backup_dir = Path(".")
-    cutoff_date = datetime.datetime.now() - datetime.timedelta(days=7)
-    
-    for backup_file in backup_dir.glob("csremote_backup_*.sql"):
-        if backup_file.stat().st_mtime < cutoff_date.timestamp():
-            backup_file.unlink()
-            print(f"🗑️  Backup antigo removido: {backup_file}")
+        print(f"❌ Erro ao criar backup: {e}")
+        return 1
+    print(f"✅ Backup criado: {meta['key']}" + (" (verificado)" if meta["verificado"] else ""))
+    report(meta)
+    cleanup_old_backups(target, args.retention_days)
+    print("✅ Processo de backup concluído!")
+    return 0
 
 if __name__ == "__main__":
-    print("🔄 Iniciando backup do CSRemote...")
-    
-    backup_file = create_backup()
-    if backup_file:
-        if os.getenv('BACKUP_S3_BUCKET'):
-            upload_to_s3(backup_file)
-        cleanup_old_backups()
-    
-    print("✅ Processo de backup concluído!")
\ No newline at end of file
+    sys.exit(main())
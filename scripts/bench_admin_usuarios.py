@@ -0,0 +1,84 @@
+"""
+Benchmark de /admin/usuarios: paginação keyset vs OFFSET, filtros e busca por prefixo
+em uma base sintética (padrão: 1 milhão de usuários, SQLite temporário).
+
+Uso: python scripts/bench_admin_usuarios.py [num_usuarios]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, Usuario
+from app.user_directory import fetch_users
+
+NOMES = "Ana Bruno Carla Daniel Eduarda Felipe Gabriela Henrique Isabela João Larissa Marcos".split()
+SOBRENOMES = "Silva Souza Oliveira Santos Lima Pereira Costa Almeida Ferreira Rodrigues".split()
+
+def popular(engine, total: int, lote: int = 50000):
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for inicio in range(0, total, lote):
+            conn.execute(insert(Usuario), [
+                {
+                    "nome": f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {i}",
+                    "email": f"usuario{i}@empresa{i % 5000}.com.br",
+                    "senha_hash": "x",
+                    "tipo_usuario": "analista" if i % 100 == 0 else "cliente",
+                    "administrador": i % 1000 == 0,
+                    "empresa": f"Empresa {i % 5000}",
+                    "cnpj": f"{i % 100:02d}.{i % 1000:03d}.{i:03d}/0001-{i % 97:02d}",
+                    "email_confirmado": i % 3 != 0,
+                }
+                for i in range(inicio, min(inicio + lote, total))
+            ])
+
+def medir(nome: str, fn, repeticoes: int = 20):
+    fn()  # aquecer cache de páginas
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = fn()
+    ms = (time.perf_counter() - inicio) / repeticoes * 1000
+    print(f"{nome:<45} {ms:>9.2f} ms  ({len(resultado)} linhas)")
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    caminho = os.path.join(tempfile.mkdtemp(), "bench_usuarios.db")
+    engine = create_engine(f"sqlite:///{caminho}")
+    Base.metadata.create_all(engine, tables=[Usuario.__table__])
+
+    inicio = time.perf_counter()
+    popular(engine, total)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"{total:,} usuários gerados em {time.perf_counter() - inicio:.1f}s\n")
+
+    db = sessionmaker(bind=engine)()
+    meio = total // 2
+
+    def offset_page():
+        return db.execute(text("SELECT id, nome, email FROM usuarios ORDER BY id LIMIT 100 OFFSET :o"), {"o": meio}).all()
+
+    medir("primeira página (keyset)", lambda: fetch_users(db))
+    medir(f"página no meio via OFFSET {meio:,}", offset_page)
+    medir("página no meio via keyset (after)", lambda: fetch_users(db, after=meio))
+    medir("tipo_usuario=analista", lambda: fetch_users(db, tipo_usuario="analista"))
+    medir("empresa='Empresa 42'", lambda: fetch_users(db, empresa="Empresa 42"))
+    medir("busca email 'usuario12345'", lambda: fetch_users(db, busca="usuario12345"))
+    medir("busca nome 'carla sou'", lambda: fetch_users(db, busca="carla sou"))
+    medir("busca CNPJ '42.042'", lambda: fetch_users(db, busca="42.042"))
+    medir("sem índice: LIKE '%usuario12345%'", lambda: db.execute(
+        text("SELECT id FROM usuarios WHERE lower(email) LIKE '%usuario12345%' LIMIT 100")).all(), repeticoes=3)
+
+    db.close()
+    engine.dispose()
+    os.remove(caminho)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark da busca no chat: LIKE '%...%' vs índice FTS5 (SQLite) em corpus sintético.
+
+Uso: python scripts/bench_chat_search.py [num_mensagens]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, Usuario, SessaoRemota
+from app.chat_search import search_messages
+
+PALAVRAS = (
+    "erro conexão banco timeout servidor impressora certificado senha usuário rede "
+    "firewall atualização backup arquivo relatório nota fiscal sistema lento travou "
+    "reiniciar configuração licença módulo estoque financeiro cadastro"
+).split()
+
+CONSULTAS = ["timeout servidor", "certificado", "nota fiscal", "ORA-12541"]
+
+def gerar_corpus(engine, total: int, sessoes: int = 1000):
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        Usuario(id=1, nome="Analista", email="a@x", senha_hash="x", tipo_usuario="analista"),
+        Usuario(id=2, nome="Cliente", email="c@x", senha_hash="x", tipo_usuario="cliente"),
+    ])
+    db.add_all([SessaoRemota(id=i, analista_id=1, cliente_id=2, codigo_acesso="BENCH") for i in range(1, sessoes + 1)])
+    db.commit()
+
+    rng = random.Random(42)
+    lote = []
+    for i in range(total):
+        texto = " ".join(rng.choices(PALAVRAS, k=rng.randint(4, 20)))
+        if i % 5000 == 0:
+            texto += " ORA-12541: TNS no listener"
+        lote.append({"s": rng.randint(1, sessoes), "m": texto})
+        if len(lote) == 10000:
+            db.execute(text("INSERT INTO mensagens_chat (sessao_id, usuario_id, mensagem, timestamp) "
+                            "VALUES (:s, 2, :m, CURRENT_TIMESTAMP)"), lote)
+            lote = []
+    if lote:
+        db.execute(text("INSERT INTO mensagens_chat (sessao_id, usuario_id, mensagem, timestamp) "
+                        "VALUES (:s, 2, :m, CURRENT_TIMESTAMP)"), lote)
+    db.commit()
+    return db
+
+def cronometrar(func, repeticoes: int = 5) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    caminho = os.path.join(tempfile.mkdtemp(), "bench_search.db")
+    engine = create_engine(f"sqlite:///{caminho}")
+    Base.metadata.create_all(bind=engine)
+
+    inicio = time.perf_counter()
+    db = gerar_corpus(engine, total)
+    print(f"Corpus: {total} mensagens inseridas (com indexação incremental) em {time.perf_counter() - inicio:.1f}s")
+
+    print(f"{'consulta':<20} {'LIKE (ms)':>10} {'FTS5 (ms)':>10}")
+    for consulta in CONSULTAS:
+        like = cronometrar(lambda: db.execute(
+            text("SELECT id FROM mensagens_chat WHERE mensagem LIKE :q ORDER BY id DESC LIMIT 20"),
+            {"q": f"%{consulta}%"}).fetchall())
+        fts = cronometrar(lambda: search_messages(db, consulta, limit=20))
+        print(f"{consulta:<20} {like:>10.2f} {fts:>10.2f}")
+
+    db.close()
+    os.remove(caminho)
@@ -0,0 +1,67 @@
+"""
+Benchmark da compressão de respostas JSON: bytes trafegados e custo de CPU por tamanho
+de resposta (payload semelhante à listagem de /admin/usuarios).
+
+Uso: python scripts/bench_compression.py [repeticoes]
+"""
+import json
+import os
+import sys
+import time
+import zlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.compression import brotli
+
+TAMANHOS = [10, 100, 1000, 10000]  # usuários por resposta
+
+def payload(total: int) -> bytes:
+    return json.dumps([
+        {
+            "id": i,
+            "nome": f"Usuário {i}",
+            "email": f"usuario{i}@empresa{i % 50}.com.br",
+            "tipo_usuario": "cliente" if i % 10 else "analista",
+            "empresa": f"Empresa {i % 50} Ltda",
+            "cnpj": f"{i:014d}",
+            "administrador": False,
+            "email_confirmado": i % 3 == 0,
+            "criado_em": "2026-01-15T10:30:00"
+        }
+        for i in range(total)
+    ]).encode()
+
+def medir(fn, data: bytes, repeticoes: int):
+    inicio = time.process_time()
+    for _ in range(repeticoes):
+        out = fn(data)
+    return len(out), (time.process_time() - inicio) / repeticoes * 1e6
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    codecs = [
+        ("gzip-1", lambda d: zlib.compress(d, 1)),
+        ("gzip-6", lambda d: zlib.compress(d, 6)),
+        ("gzip-9", lambda d: zlib.compress(d, 9)),
+    ]
+    if brotli is not None:
+        codecs += [
+            ("br-4", lambda d: brotli.compress(d, quality=4)),
+            ("br-11", lambda d: brotli.compress(d, quality=11)),
+        ]
+    else:
+        print("brotli não instalado: apenas gzip\n")
+
+    print(f"{'usuários':>9} {'original':>10} {'codec':>7} {'na rede':>10} {'razão':>7} {'CPU/resp':>12}")
+    for total in TAMANHOS:
+        data = payload(total)
+        for nome, fn in codecs:
+            n = max(1, repeticoes // (total // 100 + 1))
+            tamanho, micros = medir(fn, data, n)
+            print(f"{total:>9} {len(data):>10,} {nome:>7} {tamanho:>10,} {len(data) / tamanho:>6.1f}x {micros:>9,.0f} µs")
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark da inicialização de um worker: tempo de import de app.main (detalhado no estilo
+`python -X importtime`) e custo do bootstrap do esquema (create_all vs Alembic na head).
+
+Uso: python scripts/bench_startup.py [repeticoes] [--top N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Dependências opcionais que não devem ser importadas na inicialização
+PESADOS = ("boto3", "botocore", "redis")
+
+def _python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    # Processo novo a cada medição: nada em cache de sys.modules
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+def tempo_import(repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        _python("import app.main")
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+def importtime(top: int):
+    """Tempo próprio agregado por pacote raiz e os módulos com maior tempo cumulativo"""
+    saida = _python("import app.main", "-X", "importtime").stderr
+    por_pacote = defaultdict(int)
+    modulos = []
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, cumulativo, nome = linha[len("import time:"):].split("|")
+        nome = nome.strip()
+        por_pacote[nome.split(".")[0]] += int(proprio)
+        modulos.append((int(cumulativo), nome))
+
+    print(f"{'pacote (tempo próprio)':<40} {'ms':>9}")
+    for pacote, us in sorted(por_pacote.items(), key=lambda item: -item[1])[:top]:
+        print(f"{pacote:<40} {us / 1000:>9.1f}")
+    print(f"\n{'módulo (tempo cumulativo)':<40} {'ms':>9}")
+    for us, nome in sorted(modulos, reverse=True)[:top]:
+        print(f"{nome:<40} {us / 1000:>9.1f}")
+
+    carregados = [nome for nome in PESADOS if nome in por_pacote]
+    print(f"\nopcionais pesados carregados na inicialização: {', '.join(carregados) or 'nenhum'}")
+
+def bootstrap_esquema():
+    from sqlalchemy import create_engine
+    from app.database import Base, create_tables
+
+    caminho = os.path.join(tempfile.mkdtemp(), "bench_startup.db")
+    engine = create_engine(f"sqlite:///{caminho}")
+
+    def medir(nome: str, fn):
+        inicio = time.perf_counter()
+        fn()
+        print(f"{nome:<40} {(time.perf_counter() - inicio) * 1000:>9.1f}")
+
+    print(f"\n{'bootstrap do esquema':<40} {'ms':>9}")
+    medir("banco novo (create_all + stamp)", lambda: create_tables(engine))
+    medir("create_all em banco existente", lambda: Base.metadata.create_all(bind=engine))
+    medir("create_tables com Alembic na head", lambda: create_tables(engine))
+    engine.dispose()
+    os.remove(caminho)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("repeticoes", type=int, nargs="?", default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    print(f"import app.main (mediana de {args.repeticoes} processos): {tempo_import(args.repeticoes):.0f} ms\n")
+    importtime(args.top)
+    bootstrap_esquema()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark das páginas HTML: TemplateResponse a cada requisição vs página em memória
+(TemplateRenderer) e tempo de compilação a frio com e sem cache de bytecode.
+
+Uso: python scripts/bench_templates.py [requisicoes]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("TEMPLATE_CACHE_DIR", tempfile.mkdtemp(prefix="bench_jinja_"))
+
+from fastapi.templating import Jinja2Templates
+from starlette.requests import Request
+
+from app.rendering import TemplateRenderer
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+PAGINAS = ["index.html", "login.html", "cadastro.html"]
+
+def fake_request(if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+def medir(nome: str, fn, total: int):
+    inicio = time.perf_counter()
+    for _ in range(total):
+        fn()
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<42} {total / duracao:>12,.0f} req/s")
+
+def tempo_compilacao(usar_cache: bool) -> float:
+    inicio = time.perf_counter()
+    if usar_cache:
+        TemplateRenderer(TEMPLATES_DIR).precompile()
+    else:
+        env = Jinja2Templates(directory=TEMPLATES_DIR).env
+        for name in env.list_templates(extensions=["html"]):
+            env.get_template(name)
+    return (time.perf_counter() - inicio) * 1000
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print(f"Compilação a frio sem bytecode cache: {tempo_compilacao(False):.1f} ms")
+    tempo_compilacao(True)  # grava o bytecode
+    print(f"Compilação com bytecode cache:        {tempo_compilacao(True):.1f} ms\n")
+
+    antigo = Jinja2Templates(directory=TEMPLATES_DIR)
+    novo = TemplateRenderer(TEMPLATES_DIR)
+    novo.precompile()
+
+    for pagina in PAGINAS:
+        etag = novo.static_page(fake_request(), pagina).headers["etag"]
+        medir(f"{pagina} TemplateResponse", lambda: antigo.TemplateResponse(pagina, {"request": fake_request()}), total)
+        medir(f"{pagina} em memória", lambda: novo.static_page(fake_request(), pagina), total)
+        medir(f"{pagina} em memória (304)", lambda: novo.static_page(fake_request(etag), pagina), total)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Fixtures compartilhadas: banco de teste com um cliente e um analista"""
+import atexit
+import os
+import shutil
+import tempfile
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Tudo que os testes gravam (bancos, logs, spill, arquivo de sessões) fica fora da árvore
+# (os testes importam este módulo de novo como tests.conftest: reaproveitar o mesmo diretório)
+if "CSREMOTE_TEST_DIR" not in os.environ:
+    os.environ["CSREMOTE_TEST_DIR"] = tempfile.mkdtemp(prefix="csremote-tests-")
+    atexit.register(shutil.rmtree, os.environ["CSREMOTE_TEST_DIR"], ignore_errors=True)
+TEST_DIR = os.environ["CSREMOTE_TEST_DIR"]
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'csremote.db')}"
+os.environ["LOG_DIR"] = os.path.join(TEST_DIR, "logs")
+os.environ["AUDIT_SPILL_PATH"] = os.path.join(TEST_DIR, "logs", "audit_spill.jsonl")
+os.environ["MAINTENANCE_LOCK_PATH"] = os.path.join(TEST_DIR, "logs", "maintenance.lock")
+os.environ["ARCHIVE_DIR"] = os.path.join(TEST_DIR, "archive")
+
+from app.main import app
+from app.database import get_db, Base
+from app.models import Usuario
+from app.auth import get_password_hash
+from app.session_roster import session_roster
+
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+@pytest.fixture
+def setup_db():
+    Base.metadata.create_all(bind=engine)
+    session_roster.rosters.clear()
+    db = TestingSessionLocal()
+    db.add_all([
+        Usuario(nome="Cliente", email="cliente@example.com", senha_hash=get_password_hash("pass"),
+                tipo_usuario="cliente", administrador=False),
+        Usuario(nome="Analista", email="analista@ceosoftware.com.br", senha_hash=get_password_hash("pass"),
+                tipo_usuario="analista", administrador=False),
+    ])
+    db.commit()
+    db.close()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def login(email):
+    client = TestClient(app)
+    response = client.post("/token", data={"username": email, "password": "pass"})
+    return client, {"Authorization": f"Bearer {response.json()['access_token']}"}
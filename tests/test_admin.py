@@ -0,0 +1,140 @@
+import pytest
+from app.models import Usuario
+from app.session_roster import session_roster
+from tests.conftest import TestingSessionLocal, login
+
+@pytest.fixture
+def admin(setup_db):
+    db = TestingSessionLocal()
+    db.query(Usuario).filter(Usuario.email == "analista@ceosoftware.com.br").update({"administrador": True})
+    db.commit()
+    db.close()
+    return login("analista@ceosoftware.com.br")
+
+def test_listar_usuarios_fast_path(admin):
+    client, headers = admin
+    usuarios = client.get("/admin/usuarios", headers=headers).json()["usuarios"]
+    assert {u["email"] for u in usuarios} == {"cliente@example.com", "analista@ceosoftware.com.br"}
+    assert "senha_hash" not in usuarios[0]
+
+def test_listar_usuarios_filters_search_and_keyset(admin):
+    client, headers = admin
+    db = TestingSessionLocal()
+    db.add_all([
+        Usuario(nome=f"Cliente {i}", email=f"c{i}@acme.com", senha_hash="x", tipo_usuario="cliente",
+                empresa="ACME", cnpj=f"12.345.678/0001-{i:02d}")
+        for i in range(5)
+    ])
+    db.commit()
+    db.close()
+
+    page = client.get("/admin/usuarios", params={"empresa": "ACME", "limit": 3}, headers=headers).json()
+    assert len(page["usuarios"]) == 3
+    rest = client.get("/admin/usuarios", params={"empresa": "ACME", "limit": 3, "after": page["next_after"]},
+                      headers=headers).json()
+    assert len(rest["usuarios"]) == 2 and rest["next_after"] is None
+
+    busca = client.get("/admin/usuarios", params={"q": "C3@"}, headers=headers).json()["usuarios"]
+    assert [u["email"] for u in busca] == ["c3@acme.com"]
+    busca = client.get("/admin/usuarios", params={"q": "12.345.678/0001-04"}, headers=headers).json()["usuarios"]
+    assert [u["nome"] for u in busca] == ["Cliente 4"]
+    busca = client.get("/admin/usuarios", params={"q": "analis", "tipo_usuario": "analista"}, headers=headers).json()
+    assert [u["email"] for u in busca["usuarios"]] == ["analista@ceosoftware.com.br"]
+    assert client.get("/admin/usuarios", params={"q": "%"}, headers=headers).json()["usuarios"] == []
+
+def test_relatorio_e_minhas_sessoes(admin):
+    client, headers = admin
+    cliente, cliente_headers = login("cliente@example.com")
+    codigo = cliente.post("/cliente/gerar-codigo", headers=cliente_headers).json()["codigo"]
+    sessao_id = client.post("/analista/iniciar-sessao", json={"codigo_acesso": codigo}, headers=headers).json()["sessao_id"]
+    client.post(f"/sessao/{sessao_id}/encerrar", headers=headers)
+
+    relatorio = client.get("/admin/sessoes", headers=headers).json()
+    assert relatorio[0]["analista"] == "Analista" and relatorio[0]["cliente"] == "Cliente"
+    assert relatorio[0]["duracao_segundos"] >= 0
+
+    minhas = cliente.get("/sessoes/minhas", headers=cliente_headers).json()
+    assert minhas[0]["id"] == sessao_id
+    assert minhas[0]["codigo_acesso"] is None
+
+def test_estatisticas_from_daily_rollups(admin):
+    from datetime import datetime, timedelta
+    from app import analytics
+    from app.models import SessaoRemota
+
+    client, headers = admin
+    db = TestingSessionLocal()
+    cliente = db.query(Usuario).filter(Usuario.tipo_usuario == "cliente").first()
+    analista = db.query(Usuario).filter(Usuario.tipo_usuario == "analista").first()
+    cliente.empresa = "ACME"
+    inicio = datetime(2026, 10, 1, 9, 0)
+    db.add_all([
+        SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="X", inicio=inicio,
+                     termino=inicio + timedelta(minutes=minutos), trafego_bytes=1000)
+        for minutos in (4, 8, 50)
+    ])
+    db.add(SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="Y", inicio=inicio))
+    db.commit()
+
+    assert analytics.recompute(db, inicio.date(), inicio.date()) == 1
+    # Idempotente: recalcular substitui o grupo
+    assert analytics.recompute(db, inicio.date(), inicio.date()) == 1
+    db.close()
+
+    response = client.get("/admin/estatisticas", params={"inicio": "2026-10-01", "fim": "2026-10-31",
+                                                         "agrupar": "empresa"}, headers=headers)
+    [grupo] = response.json()["grupos"]
+    assert grupo["empresa"] == "ACME"
+    assert grupo["sessoes"] == 3
+    assert grupo["duracao_total_segundos"] == 62 * 60
+    assert grupo["duracao_p50_segundos"] == 600
+    assert grupo["duracao_max_segundos"] == 50 * 60
+    assert grupo["trafego_bytes"] == 3000
+
+def test_archived_sessions_stay_readable(setup_db, tmp_path, monkeypatch):
+    from datetime import datetime, timedelta
+    from app import archive
+    from app.models import MensagemChat, SessaoArquivada, SessaoRemota
+
+    monkeypatch.setattr(archive.archive_reader, "directory", str(tmp_path))
+    db = TestingSessionLocal()
+    cliente = db.query(Usuario).filter(Usuario.tipo_usuario == "cliente").first()
+    analista = db.query(Usuario).filter(Usuario.tipo_usuario == "analista").first()
+    antiga = datetime.utcnow() - timedelta(days=400)
+    sessoes = [SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="OLD",
+                            inicio=antiga, termino=antiga + timedelta(hours=1)) for _ in range(70)]
+    recente = SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="NEW")
+    db.add_all(sessoes + [recente])
+    db.commit()
+    alvo = sessoes[66].id
+    db.add_all([MensagemChat(sessao_id=alvo, usuario_id=cliente.id, mensagem=f"m{i}") for i in range(5)])
+    db.commit()
+    # Roster carregado antes do arquivamento
+    roster = session_roster.get(alvo, db)
+
+    # Teto por execução: o restante fica para a próxima
+    assert archive.archive_sessions(db, older_than_days=180, directory=str(tmp_path),
+                                    segment_sessions=30, max_sessions=40) == 40
+    assert len(list(tmp_path.glob("*.idx"))) == 2
+    assert archive.archive_sessions(db, older_than_days=180, directory=str(tmp_path)) == 30
+    assert alvo not in session_roster.rosters
+    assert db.query(SessaoRemota).count() == 1
+    assert db.query(MensagemChat).count() == 0
+    assert db.query(SessaoArquivada).count() == 70
+    db.close()
+
+    client, headers = login("cliente@example.com")
+    minhas = client.get("/sessoes/minhas", headers=headers).json()
+    assert len(minhas) == 71
+    historico = client.get(f"/sessao/{alvo}/mensagens", params={"limit": 3}, headers=headers).json()
+    assert [m["mensagem"] for m in historico["mensagens"]] == ["m2", "m3", "m4"]
+    assert historico["mensagens"][0]["usuario_nome"] == "Cliente"
+
+    outro, outro_headers = login("analista@ceosoftware.com.br")
+    assert outro.get(f"/sessao/{alvo}/mensagens", headers=outro_headers).status_code == 200
+
+    # Outro worker arquivou: o roster em cache neste continua, mas o histórico vem do arquivo
+    session_roster.rosters[alvo] = roster
+    historico = client.get(f"/sessao/{alvo}/mensagens", headers=headers).json()
+    assert len(historico["mensagens"]) == 5
+    assert alvo not in session_roster.rosters
@@ -6,9 +6,8 @@ from app.main import app
 from app.database import get_db, Base
 from app.models import Usuario
 from app.auth import get_password_hash
+from tests.conftest import SQLALCHEMY_DATABASE_URL
 
-# Banco de teste em memória
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,89 @@
+import datetime
+import importlib.util
+import sqlite3
+import pytest
+from pathlib import Path
+
+_spec = importlib.util.spec_from_file_location("backup", Path(__file__).resolve().parent.parent / "scripts" / "backup.py")
+backup = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(backup)
+
+def _sample_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE usuarios (id INTEGER PRIMARY KEY, nome TEXT)")
+    conn.executemany("INSERT INTO usuarios (nome) VALUES (?)", [(f"usuario {i}",) for i in range(500)])
+    conn.commit()
+    conn.close()
+
+def test_sqlite_backup_is_verified_from_the_target(tmp_path):
+    _sample_db(tmp_path / "app.db")
+    target = backup.LocalTarget(str(tmp_path / "destino"))
+    meta = backup.create_backup(target, url=f"sqlite:///{tmp_path / 'app.db'}")
+
+    assert meta["verificado"] and meta["tabelas"] == {"usuarios": 500}
+    assert target.get_json(f"db/{meta['id']}.json")["sha256"] == meta["sha256"]
+    assert not list((tmp_path / "destino").rglob("*.part"))
+
+def test_corrupted_backup_fails_verification(tmp_path):
+    _sample_db(tmp_path / "app.db")
+    target = backup.LocalTarget(str(tmp_path / "destino"))
+    meta = backup.create_backup(target, url=f"sqlite:///{tmp_path / 'app.db'}", verify=False)
+    with open(tmp_path / "destino" / meta["key"], "r+b") as f:
+        f.seek(-10, 2)
+        f.write(b"\0" * 10)
+    with pytest.raises(RuntimeError):
+        backup._verify_sqlite(target, meta, str(tmp_path))
+
+def test_retention_uses_metadata_and_keeps_latest_verified(tmp_path):
+    target = backup.LocalTarget(str(tmp_path))
+    agora = datetime.datetime.now(datetime.timezone.utc)
+    for dias, verificado in [(1, True), (10, True), (20, False), (30, True)]:
+        backup_id = f"b{dias}"
+        target.put_json(f"db/{backup_id}.db.gz", {})
+        target.put_json(f"db/{backup_id}.json", {
+            "id": backup_id, "key": f"db/{backup_id}.db.gz", "verificado": verificado,
+            "criado_em": (agora - datetime.timedelta(days=dias)).isoformat()
+        })
+
+    assert backup.cleanup_old_backups(target, retention_days=7, keep_min=2) == ["b20", "b30"]
+    assert target.list("db/") == ["db/b1.db.gz", "db/b1.json", "db/b10.db.gz", "db/b10.json"]
+
+def test_incremental_file_backup_and_point_in_time_restore(tmp_path):
+    uploads = tmp_path / "uploads"
+    (uploads / "1").mkdir(parents=True)
+    (uploads / "1" / "a.txt").write_bytes(b"primeira versao")
+    (uploads / "1" / "b.txt").write_bytes(b"sera removido")
+    (uploads / "1" / "copia.txt").write_bytes(b"sera removido")
+    target = backup.LocalTarget(str(tmp_path / "destino"))
+
+    primeiro = backup.backup_files(target, str(uploads), workers=4)
+    assert set(primeiro["arquivos"]) == {"1/a.txt", "1/b.txt", "1/copia.txt"}
+    # Conteúdo repetido vira um objeto só
+    assert len(target.list("files/objects/")) == 2
+
+    (uploads / "1" / "a.txt").write_bytes(b"segunda versao, maior")
+    (uploads / "1" / "b.txt").unlink()
+    (uploads / "2").mkdir()
+    (uploads / "2" / "c.pdf").write_bytes(b"%PDF novo")
+    segundo = backup.backup_files(target, str(uploads), workers=4)
+    assert segundo["base"] == primeiro["id"]
+    assert (segundo["alterados"], segundo["removidos"]) == (2, 1)
+    assert segundo["bytes_enviados"] == len(b"segunda versao, maior") + len(b"%PDF novo")
+
+    antes = backup.restore_files(str(tmp_path / "antes"), target, at=backup._manifest_time(primeiro["id"]))
+    assert antes["id"] == primeiro["id"]
+    assert (tmp_path / "antes" / "1" / "a.txt").read_bytes() == b"primeira versao"
+    assert (tmp_path / "antes" / "1" / "b.txt").exists()
+
+    backup.restore_files(str(tmp_path / "depois"), target)
+    assert (tmp_path / "depois" / "1" / "a.txt").read_bytes() == b"segunda versao, maior"
+    assert not (tmp_path / "depois" / "1" / "b.txt").exists()
+    assert (tmp_path / "depois" / "2" / "c.pdf").stat().st_mtime_ns == (uploads / "2" / "c.pdf").stat().st_mtime_ns
+
+def test_db_options_are_defined_once():
+    parser = backup.build_parser()
+    assert parser.parse_args(["db", "--jobs", "8", "--no-verify"]).jobs == 8
+    args = parser.parse_args([])
+    assert (args.command, args.jobs, args.no_verify) == (None, backup.BACKUP_JOBS, False)
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--jobs", "8", "db"])
@@ -0,0 +1,97 @@
+import asyncio
+from app.cluster_bus import CLUSTER_CHANNEL_PREFIX, ClusterBus
+
+class Broker:
+    """Redis em memória: cada publish chega a todas as assinaturas do canal"""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def pubsub(self):
+        return BrokerPubSub(self)
+
+    async def publish(self, channel, data):
+        for pubsub in list(self.subscribers):
+            if channel in pubsub.channels:
+                pubsub.queue.put_nowait({"type": "message", "channel": channel.encode(), "data": data})
+
+    async def close(self):
+        pass
+
+class BrokerPubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.channels = set()
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        self.channels.update(channels)
+        self.broker.subscribers.append(self)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def close(self):
+        self.broker.subscribers.remove(self)
+
+def _worker(broker, recebidos):
+    bus = ClusterBus("redis://teste")
+
+    async def handler(event):
+        recebidos.append(event)
+
+    bus.subscribe("chat", handler)
+    bus._client = broker
+    bus._listener = asyncio.create_task(bus._listen())
+    return bus
+
+def test_events_reach_every_worker():
+    async def cenario():
+        broker = Broker()
+        em_a, em_b = [], []
+        a, b = _worker(broker, em_a), _worker(broker, em_b)
+        try:
+            while a._redis is None or b._redis is None:
+                await asyncio.sleep(0)
+            await a.publish("chat", {"sessao_id": 1, "message": "oi"})
+            for _ in range(50):
+                await asyncio.sleep(0)
+            # Inclusive o próprio worker, que entrega aos seus sockets pelo canal
+            assert em_a == em_b == [{"sessao_id": 1, "message": "oi", "worker_id": a.worker_id}]
+            assert CLUSTER_CHANNEL_PREFIX + "chat" in broker.subscribers[0].channels
+        finally:
+            await a.stop()
+            await b.stop()
+
+    asyncio.run(cenario())
+
+def test_local_delivery_without_redis():
+    recebidos = []
+    bus = ClusterBus(None)
+
+    async def handler(event):
+        recebidos.append(event["message"])
+
+    bus.subscribe("chat", handler)
+    asyncio.run(bus.publish("chat", {"sessao_id": 1, "message": "oi"}))
+    assert recebidos == ["oi"]
+
+def test_signaling_socket_replaced_on_another_worker():
+    from app.cluster_bus import cluster_bus
+    from app.webrtc import SIGNALING_REPLACED_CLOSE_CODE, WebRTCManager
+
+    class FakeSocket:
+        closed = None
+
+        async def close(self, code):
+            self.closed = code
+
+    manager = WebRTCManager()
+    socket = FakeSocket()
+    manager.active_connections[5] = {"analista": socket}
+    # Aviso do próprio worker é ignorado (a substituição local já fechou o anterior)
+    asyncio.run(manager.close_replaced({"sessao_id": 5, "user_type": "analista", "worker_id": cluster_bus.worker_id}))
+    assert socket.closed is None
+    asyncio.run(manager.close_replaced({"sessao_id": 5, "user_type": "analista", "worker_id": "outro"}))
+    assert socket.closed == SIGNALING_REPLACED_CLOSE_CODE
@@ -0,0 +1,43 @@
+import gzip
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from fastapi.testclient import TestClient
+from app.compression import CompressionMiddleware
+
+def _client(**options):
+    routes = [
+        Route("/grande", lambda request: JSONResponse([{"nome": f"Usuário {i}"} for i in range(500)])),
+        Route("/pequeno", lambda request: JSONResponse({"ok": True})),
+        Route("/arquivo.zip", lambda request: Response(
+            b"PK" + b"\0" * 5000, media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="logs.zip"'}
+        )),
+    ]
+    app = Starlette(routes=routes)
+    app.add_middleware(CompressionMiddleware, **options)
+    return TestClient(app)
+
+def test_large_json_is_gzipped():
+    response = _client().get("/grande", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < 5000
+    assert response.json()[499]["nome"] == "Usuário 499"
+
+def test_small_and_binary_responses_are_untouched():
+    client = _client()
+    assert "content-encoding" not in client.get("/pequeno", headers={"Accept-Encoding": "gzip"}).headers
+    response = client.get("/arquivo.zip", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content.startswith(b"PK")
+
+def test_client_without_gzip_gets_identity():
+    response = _client().get("/grande", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+def test_minimum_size_comes_from_the_middleware():
+    # {"ok":true} tem 11 bytes: abaixo do padrão, acima do limite configurado
+    response = _client(minimum_size=10).get("/pequeno", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == {"ok": True}
@@ -0,0 +1,27 @@
+from sqlalchemy import create_engine, inspect, text
+from app.database import create_tables, migration_head
+
+def test_migration_head_is_latest_revision():
+    assert migration_head() == "011"
+
+def test_create_tables_stamps_new_database_and_skips_at_head(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'novo.db'}")
+    create_tables(engine)
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() == migration_head()
+        conn.execute(text("DROP TABLE auditoria"))
+
+    # Alembic na head: create_all não roda mais
+    create_tables(engine)
+    assert not inspect(engine).has_table("auditoria")
+    engine.dispose()
+
+def test_create_tables_upgrades_pre_migration_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigo.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE usuarios (id INTEGER PRIMARY KEY, nome VARCHAR(100))"))
+    create_tables(engine)
+    inspector = inspect(engine)
+    assert "email_confirmado" in {column["name"] for column in inspector.get_columns("usuarios")}
+    assert inspector.has_table("sessoes_remotas") and not inspector.has_table("alembic_version")
+    engine.dispose()
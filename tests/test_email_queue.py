@@ -0,0 +1,143 @@
+from datetime import datetime
+import pytest
+from app.email_queue import EmailWorker
+from app.email_utils import queue_email
+from app.models import EmailPendente
+from tests.conftest import TestingSessionLocal
+
+class FlakySender:
+    """Falha para destinatários 'falha*' e registra os envios bem-sucedidos"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, to_email, subject, body):
+        if to_email.startswith("falha"):
+            raise RuntimeError("Throttling: Maximum sending rate exceeded")
+        self.sent.append(to_email)
+
+def make_due(db):
+    db.query(EmailPendente).update({EmailPendente.proxima_tentativa: datetime.utcnow()})
+    db.commit()
+
+def test_worker_sends_retries_and_dead_letters(setup_db):
+    db = TestingSessionLocal()
+    queue_email(db, "ok@example.com", "Assunto", "<p>ok</p>")
+    queue_email(db, "falha@example.com", "Assunto", "<p>falha</p>")
+    db.commit()
+
+    sender = FlakySender()
+    worker = EmailWorker(session_factory=TestingSessionLocal, sender=sender, max_attempts=2)
+    assert worker.process_batch() == 2
+    assert sender.sent == ["ok@example.com"]
+
+    falha = db.query(EmailPendente).filter_by(destinatario="falha@example.com").one()
+    assert falha.status == "pendente"
+    assert falha.tentativas == 1
+    assert falha.proxima_tentativa > datetime.utcnow()
+    # Backoff: nada vencido ainda
+    assert worker.process_batch() == 0
+
+    make_due(db)
+    assert worker.process_batch() == 1
+    db.expire_all()
+    assert falha.status == "falhou"
+    assert "Throttling" in falha.ultimo_erro
+    assert db.query(EmailPendente).filter_by(destinatario="ok@example.com").one().status == "enviado"
+    db.close()
+
+def test_signup_queues_confirmation_email(setup_db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    response = TestClient(app).post("/cadastro/cliente", json={
+        "nome": "Novo", "email": "novo@example.com", "senha": "pass"
+    })
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    try:
+        email = db.query(EmailPendente).filter_by(destinatario="novo@example.com").one()
+        assert "/confirm_email?token=" in email.corpo
+        assert email.status == "pendente"
+    finally:
+        db.close()
+
+def test_ses_sender_against_moto(monkeypatch):
+    moto = pytest.importorskip("moto")
+    from app.email_utils import SesSender
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("EMAIL_FROM", "no-reply@example.com")
+    mock_ses = getattr(moto, "mock_aws", None) or moto.mock_ses
+    with mock_ses():
+        sender = SesSender()
+        sender.client.verify_email_identity(EmailAddress="no-reply@example.com")
+        sender.send("cliente@example.com", "Assunto", "<p>corpo</p>")
+        sender.send("cliente2@example.com", "Assunto", "<p>corpo</p>")
+        assert sender.client.get_send_quota()["SentLast24Hours"] == 2
+
+def test_failed_confirmation_enqueue_is_logged(setup_db, monkeypatch, caplog):
+    from fastapi.testclient import TestClient
+    from sqlalchemy.exc import OperationalError
+    import app.main
+
+    def broken_queue(db, usuario):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(app.main, "queue_confirmation_email", broken_queue)
+    response = TestClient(app.main.app).post("/cadastro/cliente", json={
+        "nome": "Novo", "email": "novo@example.com", "senha": "pass"
+    })
+    assert response.status_code == 200
+    assert any("confirmation email" in r.getMessage() and r.exc_info for r in caplog.records)
+
+def test_stop_waits_for_the_batch_in_flight(setup_db):
+    import asyncio
+    import threading
+    import time
+
+    class SlowSender(FlakySender):
+        def __init__(self):
+            super().__init__()
+            self.started = threading.Event()
+
+        def send(self, to_email, subject, body):
+            self.started.set()
+            time.sleep(0.3)
+            super().send(to_email, subject, body)
+
+    db = TestingSessionLocal()
+    queue_email(db, "lento@example.com", "Assunto", "<p>lento</p>")
+    db.commit()
+
+    sender = SlowSender()
+    worker = EmailWorker(session_factory=TestingSessionLocal, sender=sender)
+
+    async def cenario():
+        worker.start()
+        await asyncio.to_thread(sender.started.wait, 5)
+        await worker.stop()
+        # Ao retornar, o lote já terminou e foi gravado
+        assert sender.sent == ["lento@example.com"]
+        assert worker._executor is None
+
+    asyncio.run(cenario())
+    assert db.query(EmailPendente).filter_by(destinatario="lento@example.com").one().status == "enviado"
+    db.close()
+
+def test_ses_backend_without_boto3_fails_at_startup(monkeypatch):
+    import asyncio
+    import app.email_utils
+
+    monkeypatch.setenv("EMAIL_BACKEND", "ses")
+    monkeypatch.setattr(app.email_utils, "is_installed", lambda name: False)
+    worker = EmailWorker()
+
+    async def cenario():
+        worker.start()
+
+    with pytest.raises(RuntimeError, match="boto3"):
+        asyncio.run(cenario())
+    assert worker._task is None
@@ -0,0 +1,47 @@
+import json
+import logging
+import os
+from app.logging_config import setup_logging, shutdown_logging
+
+def test_exception_traceback_is_a_separate_field(tmp_path):
+    shutdown_logging()
+    setup_logging(str(tmp_path))
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logging.getLogger("teste").exception("Falha ao processar %s", "item")
+    finally:
+        shutdown_logging()
+
+    linhas = [json.loads(linha) for linha in (tmp_path / "csremote.log").read_text().splitlines()]
+    entry = next(e for e in linhas if e["logger"] == "teste")
+    assert entry["msg"] == "Falha ao processar item"
+    assert "ZeroDivisionError" in entry["exc_info"]
+
+def _worker_logs():
+    shutdown_logging()
+    setup_logging()
+    webrtc = logging.getLogger("app.webrtc")
+    assert webrtc.getEffectiveLevel() == logging.DEBUG
+    webrtc.info("do worker %s", os.getpid())
+    shutdown_logging()
+
+def test_workers_write_through_the_supervisor(tmp_path):
+    import multiprocessing
+    from app.logging_config import start_shared_listener, stop_shared_listener
+
+    shutdown_logging()
+    start_shared_listener(str(tmp_path))
+    try:
+        processos = [multiprocessing.get_context("fork").Process(target=_worker_logs) for _ in range(2)]
+        for processo in processos:
+            processo.start()
+        for processo in processos:
+            processo.join(10)
+            assert processo.exitcode == 0
+    finally:
+        stop_shared_listener()
+
+    linhas = [json.loads(linha) for linha in (tmp_path / "csremote.log").read_text().splitlines()]
+    assert {e["msg"] for e in linhas} == {f"do worker {p.pid}" for p in processos}
@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta
+from app.access_codes import claim_access_code, create_temporary_code, purge_expired_codes
+from app.maintenance import (
+    LeaderLock, MaintenanceScheduler, sweep_email_confirmations, sweep_session_permissions, sweep_stale_sessions
+)
+from app.models import CodigoAcessoTemporario, EmailConfirmation, PermissaoSessao, SessaoRemota, Usuario
+from app.permissions import Permission, permission_manager
+from app.session_liveness import SessionLivenessTracker
+from tests.conftest import TestingSessionLocal
+
+def _usuarios(db):
+    cliente = db.query(Usuario).filter(Usuario.tipo_usuario == "cliente").first()
+    analista = db.query(Usuario).filter(Usuario.tipo_usuario == "analista").first()
+    return cliente, analista
+
+def test_sweeps_close_stale_sessions_and_purge_tokens(setup_db):
+    db = TestingSessionLocal()
+    cliente, analista = _usuarios(db)
+    antiga = SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="A",
+                          inicio=datetime.utcnow() - timedelta(days=2))
+    recente = SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="B")
+    db.add_all([antiga, recente])
+    db.add_all([
+        EmailConfirmation(usuario_id=cliente.id, token="velho", expira_em=datetime.utcnow() - timedelta(days=30)),
+        EmailConfirmation(usuario_id=cliente.id, token="novo", expira_em=datetime.utcnow() + timedelta(hours=1)),
+    ])
+    db.commit()
+
+    assert sweep_stale_sessions(db, tracker=SessionLivenessTracker(session_factory=TestingSessionLocal)) == 1
+    assert sweep_email_confirmations(db) == 1
+    db.expire_all()
+    assert antiga.termino is not None and recente.termino is None
+    assert [c.token for c in db.query(EmailConfirmation)] == ["novo"]
+
+    permission_manager.set_session_permission(db, antiga.id, cliente.id, Permission.CONTROL_MOUSE, True)
+    permission_manager.set_session_permission(db, recente.id, cliente.id, Permission.CONTROL_MOUSE, True)
+    db.commit()
+    assert permission_manager.has_permission(db, "cliente", cliente.id, recente.id, Permission.CONTROL_MOUSE)
+    assert sweep_session_permissions(db) == 1
+    assert [p.sessao_id for p in db.query(PermissaoSessao)] == [recente.id]
+    permission_manager.clear_session(db, recente.id)
+    db.commit()
+    assert not permission_manager.has_permission(db, "cliente", cliente.id, recente.id, Permission.CONTROL_MOUSE)
+    db.close()
+
+def test_access_codes_are_shared_and_single_use(setup_db):
+    # Duas sessões de banco: como dois workers
+    db, outro = TestingSessionLocal(), TestingSessionLocal()
+    codigo = create_temporary_code(db, 1)["codigo"]
+    db.add(CodigoAcessoTemporario(codigo="EXPIRADO", cliente_id=1, usado=False,
+                                  expira_em=datetime.utcnow() - timedelta(minutes=1)))
+    db.commit()
+
+    assert claim_access_code(outro, "EXPIRADO") is None
+    assert claim_access_code(outro, codigo) == 1
+    outro.commit()
+    assert claim_access_code(db, codigo) is None
+
+    assert purge_expired_codes(db) == 1
+    assert [c.codigo for c in db.query(CodigoAcessoTemporario)] == [codigo]
+    db.close()
+    outro.close()
+
+def test_only_leader_runs_database_jobs(tmp_path):
+    lider = LeaderLock(str(tmp_path / "maintenance.lock"))
+    outro = LeaderLock(str(tmp_path / "maintenance.lock"))
+    assert lider.try_acquire()
+    assert not outro.try_acquire()
+
+    chamadas = []
+    scheduler = MaintenanceScheduler(session_factory=TestingSessionLocal, lock=outro)
+    scheduler.register("teste", lambda db: chamadas.append(db) or 1, interval=60)
+    assert scheduler.run_job(scheduler.jobs["teste"]) is None
+    assert chamadas == []
+
+    lider.release()
+    assert scheduler.run_job(scheduler.jobs["teste"]) == 1
+    outro.release()
+
+def test_liveness_closes_sessions_without_peers(setup_db):
+    import asyncio
+    from app.session_liveness import SessionLivenessTracker
+
+    db = TestingSessionLocal()
+    cliente, analista = _usuarios(db)
+    sessao = SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="C")
+    db.add(sessao)
+    db.commit()
+
+    tracker = SessionLivenessTracker(session_factory=TestingSessionLocal, grace_seconds=0)
+    tracker.connected(sessao.id)
+    tracker.connected(sessao.id)
+    tracker.disconnected(sessao.id)
+    assert tracker.active_count == 1
+    assert asyncio.run(tracker.sweep()) == 0
+
+    encerradas = []
+    async def on_closed(rows):
+        encerradas.extend(rows)
+    tracker._on_closed = on_closed
+    tracker.disconnected(sessao.id)
+    assert tracker.active_count == 0
+    assert asyncio.run(tracker.sweep()) == 1
+    assert encerradas == [(sessao.id, analista.id, cliente.id)]
+    db.expire_all()
+    assert sessao.termino is not None
+    db.close()
+
+def test_liveness_keeps_sessions_with_peers_on_another_worker(setup_db):
+    import asyncio
+    from app.session_liveness import SessionLivenessTracker
+
+    db = TestingSessionLocal()
+    cliente, analista = _usuarios(db)
+    sessao = SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="D")
+    db.add(sessao)
+    db.commit()
+
+    worker_a = SessionLivenessTracker(session_factory=TestingSessionLocal, grace_seconds=0)
+    worker_b = SessionLivenessTracker(session_factory=TestingSessionLocal, grace_seconds=0)
+    worker_a.connected(sessao.id)
+    worker_b.connected(sessao.id)
+    assert asyncio.run(worker_a.sweep()) == 0
+
+    # O peer do worker B sai; o do worker A continua conectado
+    worker_b.disconnected(sessao.id)
+    assert asyncio.run(worker_b.sweep()) == 0
+    db.expire_all()
+    assert sessao.termino is None
+    assert [s["conexoes"] for s in worker_b.active_sessions(db)] == [1]
+
+    worker_a.disconnected(sessao.id)
+    assert asyncio.run(worker_a.sweep()) == 1
+    assert worker_b.active_sessions(db) == []
+    db.close()
+
+def test_stale_sweep_keeps_live_sessions_and_runs_close_hook(setup_db):
+    import asyncio
+
+    db = TestingSessionLocal()
+    cliente, analista = _usuarios(db)
+    inicio = datetime.utcnow() - timedelta(days=2)
+    viva = SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="E", inicio=inicio)
+    abandonada = SessaoRemota(analista_id=analista.id, cliente_id=cliente.id, codigo_acesso="F", inicio=inicio)
+    db.add_all([viva, abandonada])
+    db.commit()
+
+    # Peer da sessão 'viva' conectado em outro worker
+    outro_worker = SessionLivenessTracker(session_factory=TestingSessionLocal)
+    outro_worker.connected(viva.id)
+    asyncio.run(outro_worker.sweep())
+
+    encerradas = []
+    async def on_closed(rows):
+        encerradas.extend(rows)
+
+    async def main():
+        tracker = SessionLivenessTracker(session_factory=TestingSessionLocal)
+        tracker.start(on_closed=on_closed)
+        try:
+            return await asyncio.to_thread(sweep_stale_sessions, db, tracker=tracker)
+        finally:
+            await tracker.stop()
+
+    assert asyncio.run(main()) == 1
+    assert encerradas == [(abandonada.id, analista.id, cliente.id)]
+    db.expire_all()
+    assert viva.termino is None and abandonada.termino is not None
+    db.close()
+
+def test_failing_leader_lock_does_not_kill_the_job():
+    class BrokenLock:
+        def try_acquire(self):
+            raise OSError("connection refused")
+
+        def release(self):
+            pass
+
+    scheduler = MaintenanceScheduler(session_factory=TestingSessionLocal, lock=BrokenLock())
+    scheduler.register("teste", lambda db: 1, interval=60)
+    assert scheduler.run_job(scheduler.jobs["teste"]) == 0
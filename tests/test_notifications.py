@@ -0,0 +1,115 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from tests.conftest import login
+
+def test_notifications_require_cookie(setup_db):
+    client = TestClient(app)
+    with pytest.raises(Exception):
+        with client.websocket_connect("/ws/notificacoes"):
+            pass
+
+def test_session_start_and_end_are_pushed(setup_db):
+    cliente, cliente_headers = login("cliente@example.com")
+    analista, analista_headers = login("analista@ceosoftware.com.br")
+
+    codigo = cliente.post("/cliente/gerar-codigo", headers=cliente_headers).json()["codigo"]
+
+    with cliente.websocket_connect("/ws/notificacoes") as ws:
+        response = analista.post("/analista/iniciar-sessao", json={"codigo_acesso": codigo},
+                                 headers=analista_headers)
+        sessao_id = response.json()["sessao_id"]
+        event = ws.receive_json()
+        assert event["event"] == "sessao_iniciada"
+        assert event["sessao_id"] == sessao_id
+
+        analista.post(f"/sessao/{sessao_id}/encerrar", headers=analista_headers)
+        event = ws.receive_json()
+        assert event["event"] == "sessao_encerrada"
+
+class FlakyPubSub:
+    """Primeira assinatura cai com erro de conexão; a segunda entrega uma notificação"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def subscribe(self, channel):
+        self.client.subscriptions += 1
+
+    async def listen(self):
+        if self.client.subscriptions == 1:
+            raise ConnectionError("Connection reset by peer")
+        yield {"type": "subscribe"}
+        yield {"type": "message", "data": '{"user_ids": [1], "message": "oi"}'}
+        await self.client.done.wait()
+
+    async def close(self):
+        pass
+
+class FlakyRedis:
+    def __init__(self):
+        self.subscriptions = 0
+        self.published = []
+        self.done = None
+
+    def pubsub(self):
+        return FlakyPubSub(self)
+
+    async def publish(self, channel, data):
+        self.published.append(data)
+
+    async def close(self):
+        pass
+
+def test_notification_subscription_reconnects(monkeypatch):
+    import asyncio
+    from app import notifications
+
+    class FakeSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send_text(self, text):
+            self.sent.append(text)
+
+    async def main():
+        monkeypatch.setattr(notifications, "NOTIFICATION_RECONNECT_MAX_SECONDS", 0)
+        manager = notifications.NotificationManager("redis://teste")
+        manager._client = FlakyRedis()
+        manager._client.done = asyncio.Event()
+        socket = FakeSocket()
+        manager.user_connections[1] = [socket]
+        real_sleep = asyncio.sleep
+        monkeypatch.setattr(notifications.asyncio, "sleep", lambda delay: real_sleep(0))
+        manager._listener = asyncio.create_task(manager._listen())
+        try:
+            for _ in range(50):
+                await real_sleep(0)
+                if socket.sent:
+                    break
+            # Reassinou depois da queda e voltou a publicar pelo Redis
+            assert manager._client.subscriptions == 2
+            assert socket.sent == ["oi"]
+            assert manager._redis is manager._client
+            await manager.publish([1], {"event": "x"})
+            assert len(manager._client.published) == 1
+        finally:
+            manager._client.done.set()
+            await manager.stop()
+
+    asyncio.run(main())
+
+def test_publish_falls_back_to_local_delivery_while_unsubscribed():
+    import asyncio
+    from app.notifications import NotificationManager
+
+    manager = NotificationManager("redis://teste")
+    manager._client = FlakyRedis()
+    delivered = []
+
+    async def deliver(user_ids, message):
+        delivered.append(user_ids)
+
+    manager._deliver_local = deliver
+    asyncio.run(manager.publish([7], {"event": "x"}))
+    assert delivered == [[7]] and manager._client.published == []
@@ -0,0 +1,78 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from tests.conftest import login
+
+def test_static_page_etag_and_not_modified(tmp_path):
+    # Renderer isolado: o startup completo do app gravaria em ./logs, static/dist e no banco real
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+    from app.rendering import STATIC_PAGES, TemplateRenderer
+
+    for name in STATIC_PAGES:
+        (tmp_path / name).write_text(f"<html><body>{name}</body></html>")
+    renderer = TemplateRenderer(str(tmp_path))
+    renderer.precompile()
+    client = TestClient(Starlette(routes=[Route("/login", lambda request: renderer.static_page(request, "login.html"))]))
+
+    response = client.get("/login")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "<html" in response.text.lower()
+
+    cached = client.get("/login", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+def test_dashboard_is_streamed(setup_db):
+    analista, headers = login("analista@ceosoftware.com.br")
+    response = analista.get("/dashboard", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+
+def test_fingerprinted_assets_are_precompressed_and_immutable(tmp_path):
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from app.static_assets import StaticAssets, PrecompressedStaticFiles
+
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.js").write_text("console.log('csremote');\n" * 100)
+    assets = StaticAssets(str(tmp_path))
+    assets.build()
+    url = assets.url("js/app.js")
+    assert url.startswith("/static/dist/js/app.") and url.endswith(".js")
+
+    client = TestClient(Starlette(routes=[Mount("/static", PrecompressedStaticFiles(directory=str(tmp_path)))]))
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "immutable" in response.headers["cache-control"]
+    assert response.text.startswith("console.log")
+
+    original = client.get("/static/js/app.js")
+    assert original.headers["cache-control"] == "no-cache"
+
+def test_refused_encodings_and_outdated_hashes(tmp_path):
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from app.static_assets import StaticAssets, PrecompressedStaticFiles
+
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.js").write_text("console.log('v1');\n" * 100)
+    assets = StaticAssets(str(tmp_path))
+    assets.build()
+    antigo = tmp_path / assets.manifest["js/app.js"]
+    # .br gerado à parte (o pacote brotli é opcional)
+    (tmp_path / (assets.manifest["js/app.js"] + ".br")).write_bytes(b"br")
+
+    client = TestClient(Starlette(routes=[Mount("/static", PrecompressedStaticFiles(directory=str(tmp_path)))]))
+    url = assets.url("js/app.js")
+    assert client.get(url, headers={"Accept-Encoding": "br"}).headers["content-encoding"] == "br"
+    assert client.get(url, headers={"Accept-Encoding": "br;q=0, gzip"}).headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in client.get(url, headers={"Accept-Encoding": "br;q=0, gzip;q=0"}).headers
+
+    (tmp_path / "js" / "app.js").write_text("console.log('v2');\n" * 100)
+    assets.build()
+    assert assets.manifest["js/app.js"] != antigo.relative_to(tmp_path).as_posix()
+    restantes = sorted(p.name for p in (tmp_path / "dist" / "js").iterdir())
+    novo = assets.manifest["js/app.js"].rsplit("/", 1)[1]
+    assert restantes == [novo, novo + ".gz"]
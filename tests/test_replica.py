@@ -0,0 +1,56 @@
+"""Roteamento de leitura com duas instâncias: test.db como primário e uma cópia como réplica"""
+import os
+import shutil
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import replica
+from app.main import app
+from app.models import Usuario
+from tests.conftest import TEST_DIR, TestingSessionLocal, login
+
+@pytest.fixture
+def read_replica(setup_db, monkeypatch, tmp_path):
+    db = TestingSessionLocal()
+    db.query(Usuario).filter(Usuario.email == "analista@ceosoftware.com.br").update({"administrador": True})
+    db.commit()
+    db.close()
+    # "Replicação" até este ponto: a réplica é uma cópia do primário
+    replica_path = tmp_path / "test_replica.db"
+    shutil.copyfile(os.path.join(TEST_DIR, "test.db"), replica_path)
+    engine = create_engine(f"sqlite:///{replica_path}", connect_args={"check_same_thread": False})
+    router = replica.ReplicaRouter(sessionmaker(bind=engine), engine, max_lag=5, check_interval=0)
+    monkeypatch.setattr(replica, "replica_router", router)
+    yield router
+    engine.dispose()
+
+def _emails(client, headers):
+    return {u["email"] for u in client.get("/admin/usuarios", headers=headers).json()["usuarios"]}
+
+def test_reads_go_to_replica_and_fall_back_when_lagging(read_replica):
+    _, headers = login("analista@ceosoftware.com.br")
+    db = TestingSessionLocal()
+    db.add(Usuario(nome="Novo", email="novo@example.com", senha_hash="x", tipo_usuario="cliente"))
+    db.commit()
+    db.close()
+
+    client = TestClient(app)
+    assert "novo@example.com" not in _emails(client, headers)
+
+    read_replica.measure_lag = lambda: 30.0
+    assert "novo@example.com" in _emails(client, headers)
+    read_replica.measure_lag = lambda: None
+    assert "novo@example.com" in _emails(client, headers)
+
+def test_client_reads_its_own_writes(read_replica):
+    analista, headers = login("analista@ceosoftware.com.br")
+    cliente, cliente_headers = login("cliente@example.com")
+    codigo = cliente.post("/cliente/gerar-codigo", headers=cliente_headers).json()["codigo"]
+    response = analista.post("/analista/iniciar-sessao", json={"codigo_acesso": codigo}, headers=headers)
+    assert replica.READ_YOUR_WRITES_COOKIE in response.cookies
+    sessao_id = response.json()["sessao_id"]
+
+    assert [s["id"] for s in analista.get("/sessoes/minhas", headers=headers).json()] == [sessao_id]
+    # Sem o cookie (outro navegador) a leitura vai à réplica, que ainda não tem a sessão
+    assert TestClient(app).get("/sessoes/minhas", headers=headers).json() == []
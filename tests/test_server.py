@@ -0,0 +1,78 @@
+import signal
+import urllib.request
+from app import server
+from app.server import Settings, Supervisor, create_socket, main
+
+async def hello_app(scope, receive, send):
+    """App mínimo: o teste exercita o supervisor, não o startup do CSRemote"""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    monkeypatch.setenv("PORT", "9000")
+    monkeypatch.setenv("APP_PRELOAD", "true")
+    monkeypatch.setenv("MAX_REQUESTS", "1000")
+    monkeypatch.setenv("MAX_REQUESTS_JITTER", "50")
+    settings = Settings()
+    assert (settings.workers, settings.port, settings.preload) == (1, 9000, True)
+
+    config = settings.uvicorn_config("app.main:app")
+    assert 1000 <= config.limit_max_requests <= 1050
+    assert config.timeout_graceful_shutdown == settings.graceful_timeout
+    assert (config.port, config.ws) == (9000, "websockets")
+
+def test_worker_count_follows_shared_state(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(server, "_cpu_count", lambda: 8)
+    # Sem Redis: chat e sinalização não atravessam workers, um só
+    assert Settings().workers == 1
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert main() == 2
+
+    supervisor = Supervisor(Settings(workers=1))
+    supervisor.spawn = lambda: supervisor.workers.append(object())
+    supervisor._signals.append(signal.SIGTTIN)
+    supervisor._handle_signals()
+    assert supervisor.settings.workers == 1 and supervisor.workers == []
+
+    # Com Redis: um worker por CPU e SIGTTIN liberado
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    monkeypatch.setattr(server, "is_installed", lambda name: True)
+    assert Settings().workers == 8
+    supervisor._signals.append(signal.SIGTTIN)
+    supervisor._handle_signals()
+    assert supervisor.settings.workers == 2 and len(supervisor.workers) == 1
+
+def test_sighup_replaces_the_worker_without_downtime():
+    settings = Settings(host="127.0.0.1", port=0, workers=1, reuse_port=False, graceful_timeout=5, boot_timeout=30)
+    supervisor = Supervisor(settings)
+    supervisor._app = hello_app
+    supervisor._socket = create_socket(settings, reuse_port=False)
+    url = f"http://127.0.0.1:{supervisor._socket.getsockname()[1]}/"
+    try:
+        antigo = supervisor.spawn()
+        assert antigo.ready.wait(30)
+        assert urllib.request.urlopen(url, timeout=5).read() == b"ok"
+
+        supervisor._signals.append(signal.SIGHUP)
+        supervisor._handle_signals()
+        assert len(supervisor.workers) == 1
+        novo = supervisor.workers[0]
+        assert novo is not antigo and not antigo.process.is_alive()
+        assert antigo.process.exitcode == 0
+        assert urllib.request.urlopen(url, timeout=5).read() == b"ok"
+    finally:
+        for worker in list(supervisor.workers):
+            supervisor.stop_worker(worker)
+        supervisor._socket.close()
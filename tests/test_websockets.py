@@ -0,0 +1,265 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app.main import app
+from app.models import Usuario
+from app.auth import get_password_hash
+from tests.conftest import TestingSessionLocal, login
+
+@pytest.fixture
+def sessao(setup_db):
+    db = TestingSessionLocal()
+    db.add(Usuario(nome="Outro", email="outro@example.com", senha_hash=get_password_hash("pass"),
+                   tipo_usuario="cliente", administrador=False))
+    db.commit()
+    db.close()
+
+    cliente, cliente_headers = login("cliente@example.com")
+    analista, analista_headers = login("analista@ceosoftware.com.br")
+    codigo = cliente.post("/cliente/gerar-codigo", headers=cliente_headers).json()["codigo"]
+    response = analista.post("/analista/iniciar-sessao", json={"codigo_acesso": codigo},
+                             headers=analista_headers)
+    return response.json()["sessao_id"], cliente, analista
+
+def test_chat_identity_comes_from_handshake(sessao):
+    sessao_id, cliente, _ = sessao
+    with cliente.websocket_connect(f"/ws/chat/{sessao_id}") as ws:
+        # usuario_id no frame é ignorado
+        ws.send_json({"usuario_id": 999, "mensagem": "olá"})
+        message = ws.receive_json()
+    assert message["usuario_nome"] == "Cliente"
+    assert message["mensagem"] == "olá"
+
+def test_chat_accepts_bearer_subprotocol(sessao):
+    sessao_id, _, _ = sessao
+    _, headers = login("analista@ceosoftware.com.br")
+    token = headers["Authorization"].split(" ", 1)[1]
+    with TestClient(app).websocket_connect(f"/ws/chat/{sessao_id}", subprotocols=["bearer", token]) as ws:
+        assert ws.accepted_subprotocol == "bearer"
+        ws.send_json({"mensagem": "oi"})
+        assert ws.receive_json()["usuario_nome"] == "Analista"
+
+def test_chat_rejects_anonymous_and_non_members(sessao):
+    sessao_id, _, _ = sessao
+    with pytest.raises(WebSocketDisconnect):
+        with TestClient(app).websocket_connect(f"/ws/chat/{sessao_id}"):
+            pass
+
+    outro, _ = login("outro@example.com")
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with outro.websocket_connect(f"/ws/chat/{sessao_id}"):
+            pass
+    assert exc.value.code == 4003
+
+def test_signaling_role_bound_from_roster(sessao):
+    sessao_id, cliente, analista = sessao
+    with analista.websocket_connect(f"/ws/signaling/{sessao_id}") as ws_analista:
+        with cliente.websocket_connect(f"/ws/signaling/{sessao_id}") as ws_cliente:
+            # Anunciar outro papel não altera o vínculo da conexão
+            ws_cliente.send_json({"user_type": "analista"})
+            ws_cliente.send_json({"type": "offer", "sdp": "x"})
+            assert ws_analista.receive_json() == {"type": "offer", "sdp": "x"}
+
+def test_signaling_reconnect_keeps_the_new_socket(sessao):
+    from app.session_liveness import session_liveness
+    from app.webrtc import SIGNALING_REPLACED_CLOSE_CODE, webrtc_manager
+
+    sessao_id, cliente, analista = sessao
+    with analista.websocket_connect(f"/ws/signaling/{sessao_id}") as antigo:
+        with analista.websocket_connect(f"/ws/signaling/{sessao_id}") as novo:
+            with pytest.raises(WebSocketDisconnect) as exc:
+                antigo.receive_json()
+            assert exc.value.code == SIGNALING_REPLACED_CLOSE_CODE
+            with cliente.websocket_connect(f"/ws/signaling/{sessao_id}") as ws_cliente:
+                # O fechamento do socket antigo não remove o novo
+                ws_cliente.send_json({"type": "offer", "sdp": "y"})
+                assert novo.receive_json() == {"type": "offer", "sdp": "y"}
+                assert session_liveness.peers[sessao_id] == 2
+    assert sessao_id not in webrtc_manager.active_connections
+    assert sessao_id not in session_liveness.peers
+
+def test_undecodable_frames_are_skipped_and_sockets_released(sessao):
+    from app.main import manager
+    from app.session_liveness import session_liveness
+    from app.webrtc import webrtc_manager
+
+    sessao_id, cliente, analista = sessao
+    with cliente.websocket_connect(f"/ws/chat/{sessao_id}") as chat:
+        with analista.websocket_connect(f"/ws/signaling/{sessao_id}") as ws_analista:
+            with cliente.websocket_connect(f"/ws/signaling/{sessao_id}") as ws_cliente:
+                chat.send_text("{não é json")
+                chat.send_json(["lista"])
+                chat.send_json({"mensagem": "segue"})
+                assert chat.receive_json()["mensagem"] == "segue"
+
+                ws_cliente.send_text("{")
+                ws_cliente.send_json({"type": "offer", "sdp": "z"})
+                assert ws_analista.receive_json() == {"type": "offer", "sdp": "z"}
+    assert sessao_id not in manager.active_connections
+    assert sessao_id not in webrtc_manager.active_connections
+    assert sessao_id not in session_liveness.peers
+
+def test_chat_stops_writing_once_the_session_ended(sessao):
+    from app.models import MensagemChat
+
+    sessao_id, cliente, analista = sessao
+    _, headers = login("analista@ceosoftware.com.br")
+    with cliente.websocket_connect(f"/ws/chat/{sessao_id}") as ws:
+        ws.send_json({"mensagem": "antes"})
+        assert ws.receive_json()["mensagem"] == "antes"
+        analista.post(f"/sessao/{sessao_id}/encerrar", headers=headers)
+        # Sessão encerrada pode estar sendo arquivada: a mensagem não é gravada
+        ws.send_json({"mensagem": "depois"})
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+        assert exc.value.code == 4004
+
+    db = TestingSessionLocal()
+    try:
+        assert [m for (m,) in db.query(MensagemChat.mensagem).filter(MensagemChat.sessao_id == sessao_id)] == ["antes"]
+    finally:
+        db.close()
+
+def test_chat_history_pagination_and_resume(sessao):
+    sessao_id, cliente, _ = sessao
+    _, headers = login("cliente@example.com")
+    with cliente.websocket_connect(f"/ws/chat/{sessao_id}") as ws:
+        for i in range(5):
+            ws.send_json({"mensagem": f"m{i}"})
+            ws.receive_json()
+
+    page = cliente.get(f"/sessao/{sessao_id}/mensagens?limit=3", headers=headers).json()
+    assert [m["mensagem"] for m in page["mensagens"]] == ["m2", "m3", "m4"]
+    older = cliente.get(f"/sessao/{sessao_id}/mensagens?limit=3&before={page['next_before']}",
+                        headers=headers).json()
+    assert [m["mensagem"] for m in older["mensagens"]] == ["m0", "m1"]
+    assert older["next_before"] is None
+
+    last_seen = page["mensagens"][0]["id"]
+    with cliente.websocket_connect(f"/ws/chat/{sessao_id}?last_id={last_seen}") as ws:
+        assert ws.receive_json()["mensagem"] == "m3"
+        assert ws.receive_json()["mensagem"] == "m4"
+
+def test_search_ranks_and_filters_by_analyst(sessao):
+    sessao_id, cliente, _ = sessao
+    with cliente.websocket_connect(f"/ws/chat/{sessao_id}") as ws:
+        for texto in ["Erro de conexão com o banco", "tudo certo", "o erro voltou: timeout na conexão"]:
+            ws.send_json({"mensagem": texto})
+            ws.receive_json()
+
+    analista, headers = login("analista@ceosoftware.com.br")
+    resultados = analista.get("/mensagens/busca?q=erro conexão", headers=headers).json()
+    assert len(resultados) == 2
+    assert all("<mark>" in r["trecho"] for r in resultados)
+    assert resultados[0]["sessao_id"] == sessao_id
+
+    _, cliente_headers = login("cliente@example.com")
+    assert cliente.get("/mensagens/busca?q=erro", headers=cliente_headers).status_code == 403
+
+def test_traffic_is_counted_and_flushed_in_batch(sessao):
+    from app.database import SessionLocal
+    from app.models import SessaoRemota
+    from app.traffic import traffic_counter
+    from tests.conftest import TestingSessionLocal
+
+    sessao_id, cliente, _ = sessao
+    traffic_counter._take_pending()
+    with cliente.websocket_connect(f"/ws/chat/{sessao_id}") as ws:
+        ws.send_json({"mensagem": "oi"})
+        ws.receive_json()
+    _, headers = login("cliente@example.com")
+    cliente.post(f"/sessao/{sessao_id}/trafego", json={"bytes_enviados": 1000}, headers=headers)
+
+    traffic_counter.session_factory = TestingSessionLocal
+    try:
+        assert traffic_counter.flush() == 1
+    finally:
+        traffic_counter.session_factory = SessionLocal
+
+    db = TestingSessionLocal()
+    try:
+        assert db.get(SessaoRemota, sessao_id).trafego_bytes > 1000
+    finally:
+        db.close()
+
+def test_active_sessions_follow_connections(sessao):
+    sessao_id, cliente, analista = sessao
+    db = TestingSessionLocal()
+    db.query(Usuario).filter(Usuario.email == "analista@ceosoftware.com.br").update({"administrador": True})
+    db.commit()
+    db.close()
+    _, headers = login("analista@ceosoftware.com.br")
+
+    with cliente.websocket_connect(f"/ws/chat/{sessao_id}"):
+        with analista.websocket_connect(f"/ws/signaling/{sessao_id}"):
+            ativas = analista.get("/admin/sessoes/ativas", headers=headers).json()
+            assert {"sessao_id": sessao_id, "conexoes": 2} in [
+                {k: s[k] for k in ("sessao_id", "conexoes")} for s in ativas["sessoes"]
+            ]
+    ativas = analista.get("/admin/sessoes/ativas", headers=headers).json()
+    assert sessao_id not in [s["sessao_id"] for s in ativas["sessoes"]]
+
+def test_shutdown_drain_hints_reconnect_and_closes(sessao):
+    from app.shutdown import CLOSE_SERVICE_RESTART, shutdown_coordinator
+
+    sessao_id, cliente, _ = sessao
+    flushes = shutdown_coordinator._flushes
+    gravados = []
+
+    async def flush():
+        gravados.append(True)
+
+    shutdown_coordinator._flushes = {"teste": flush}
+    try:
+        with cliente.websocket_connect(f"/ws/chat/{sessao_id}") as ws:
+            ws.portal.call(shutdown_coordinator.drain)
+            aviso = ws.receive_json()
+            assert aviso["type"] == "reconnect"
+            base = shutdown_coordinator.reconnect_base_ms
+            assert base <= aviso["reconnect_after_ms"] <= base + shutdown_coordinator.reconnect_jitter_ms
+            with pytest.raises(WebSocketDisconnect) as exc:
+                ws.receive_json()
+            assert exc.value.code == CLOSE_SERVICE_RESTART
+        assert gravados == [True]
+
+        # Conexões novas durante a drenagem só recebem o aviso
+        with cliente.websocket_connect(f"/ws/chat/{sessao_id}") as ws:
+            assert ws.receive_json()["type"] == "reconnect"
+            with pytest.raises(WebSocketDisconnect):
+                ws.receive_json()
+    finally:
+        shutdown_coordinator._flushes = flushes
+        shutdown_coordinator.reset()
+
+def test_media_reports_are_capped_and_rejected_after_end(sessao):
+    from app.traffic import media_report_limiter, traffic_counter
+
+    sessao_id, cliente, analista = sessao
+    _, headers = login("cliente@example.com")
+    traffic_counter._take_pending()
+    media_report_limiter.last_report.clear()
+
+    resposta = cliente.post(f"/sessao/{sessao_id}/trafego", json={"bytes_enviados": 10 * 1024 ** 3}, headers=headers)
+    assert resposta.status_code == 200
+    limite = int(media_report_limiter.max_window * media_report_limiter.max_bytes_per_second)
+    assert traffic_counter._take_pending()[sessao_id] == limite
+
+    _, analista_headers = login("analista@ceosoftware.com.br")
+    analista.post(f"/sessao/{sessao_id}/encerrar", headers=analista_headers)
+    resposta = cliente.post(f"/sessao/{sessao_id}/trafego", json={"bytes_enviados": 1000}, headers=headers)
+    assert resposta.status_code == 409
+    assert not traffic_counter._take_pending()
+
+def test_failed_traffic_flush_is_retried():
+    import asyncio
+    from app.traffic import TrafficCounter
+
+    class BrokenCounter(TrafficCounter):
+        def _write(self, pending):
+            return False
+
+    counter = BrokenCounter()
+    counter.add(1, bytes_in=10)
+    assert asyncio.run(counter.flush_pending()) == 0
+    counter.add(1, bytes_out=5)
+    assert counter._take_pending() == {1: 15}